@@ -2,68 +2,290 @@
 Convert SEC HTML filings to clean Markdown format
 Handles XBRL HTML files from SEC EDGAR
 """
+import os
 import sys
 import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from bs4 import BeautifulSoup
-import html2text
+from lxml import etree
 
 sys.stdout.reconfigure(encoding='utf-8')
 
-def convert_html_to_markdown(html_file_path, output_md_path):
+# Runs of 3+ newlines, collapsed to a single blank line in the markdown output
+BLANK_LINES_RE = re.compile(r'\n{3,}')
+
+# Markdown emitter tag classes (lxml's HTML parser lowercases tag names)
+BLOCK_TAGS = {
+    'html', 'body', 'div', 'p', 'center', 'blockquote', 'pre', 'section',
+    'ul', 'ol', 'li', 'dl', 'dt', 'dd', 'br', 'hr', 'table', 'tr',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+}
+HEADING_LEVELS = {f'h{level}': level for level in range(1, 7)}
+CELL_TAGS = {'td', 'th'}
+# Content never written out: document head, scripts, styles, hidden XBRL facts
+SKIP_TAGS = {'head', 'title', 'script', 'style', 'ix:hidden', 'ix:header'}
+
+# Any whitespace run (including &nbsp;) collapses to one space, as a browser renders it
+WHITESPACE_RE = re.compile(r'\s+')
+
+# Opening tag of a hidden XBRL block; everything up to its closing tag is cut
+# from the byte stream before lxml sees it
+HIDDEN_START_RE = re.compile(rb'<ix:(hidden|header)\b', re.IGNORECASE)
+# Bytes held back between reads so a tag split across two reads is still matched
+TAG_OVERLAP = 32
+
+
+class HiddenXbrlFilter:
     """
-    Convert SEC HTML filing to Markdown format
+    Binary file wrapper that drops <ix:hidden>/<ix:header> blocks while reading
 
-    Args:
-        html_file_path: Path to HTML file
-        output_md_path: Path for output Markdown file
+    Inline XBRL filings can carry megabytes of hidden facts. Slicing them out of
+    the raw bytes means the parser never builds (and the emitter never walks)
+    those subtrees, instead of parsing them only to skip them.
     """
-    print(f"\n[Processing] {Path(html_file_path).name}")
 
-    # Read HTML file
-    with open(html_file_path, 'r', encoding='utf-8', errors='ignore') as f:
-        html_content = f.read()
+    def __init__(self, raw, chunk_size=1 << 20):
+        self.raw = raw
+        self.chunk_size = chunk_size
+        self.pending = b''       # Unscanned bytes (tail of the previous read)
+        self.ready = b''         # Filtered bytes not yet handed to the parser
+        self.closing = None      # Closing-tag regex while inside a hidden block
+        self.eof = False
+
+    def _fill(self):
+        """Read one chunk from the raw file and move its visible bytes to ready"""
+        chunk = self.raw.read(self.chunk_size)
+        self.eof = not chunk
+        data = self.pending + chunk
+        kept = []
+
+        while True:
+            if self.closing is not None:
+                match = self.closing.search(data)
+                if match is None:
+                    # Still inside the hidden block: discard all but the overlap
+                    data = b'' if self.eof else data[-TAG_OVERLAP:]
+                    break
+                data = data[match.end():]
+                self.closing = None
+            else:
+                match = HIDDEN_START_RE.search(data)
+                if match is None:
+                    cut = len(data) if self.eof else max(0, len(data) - TAG_OVERLAP)
+                    kept.append(data[:cut])
+                    data = data[cut:]
+                    break
+                kept.append(data[:match.start()])
+                self.closing = re.compile(rb'</ix:' + match.group(1) + rb'\s*>', re.IGNORECASE)
+                data = data[match.end():]
+
+        self.pending = data
+        self.ready += b''.join(kept)
+
+    def read(self, size=-1):
+        # Never return b'' before the end of the file: the parser reads that as EOF
+        while not self.eof and (size < 0 or len(self.ready) < size):
+            self._fill()
+        if size < 0:
+            size = len(self.ready)
+        out, self.ready = self.ready[:size], self.ready[size:]
+        return out
+
+
+class MarkdownEmitter:
+    """
+    Streaming HTML -> Markdown converter built on lxml.etree.iterparse
+
+    Markdown is emitted as elements open and close, and each finished subtree
+    is freed immediately, so memory stays flat no matter how large the filing
+    is. Covers the tag set SEC filings use: paragraphs/divs, headings, lists,
+    links and (mostly financial) tables, which become pipe tables.
+    """
+
+    def __init__(self):
+        self.lines = []          # Finished markdown lines
+        self.inline = []         # Text pieces of the block being built
+        self.prefix = ''         # Heading / list marker for the current block
+        self.skip_depth = 0      # > 0 while inside a SKIP_TAGS element
+        self.links = set()       # <a> elements whose text was opened with '['
+        self.table_depth = 0     # Nested tables are flattened into the outer cell
+        self.table_rows = 0      # Rows written for the current outer table
+        self.row = None          # Finished cell strings of the open row
+        self.row_elem = None
+        self.cell = None         # Text pieces of the open cell
+        self.cell_elem = None
+
+    def _text(self, text):
+        """Route character data to the open table cell or the current block"""
+        if text and not self.skip_depth:
+            (self.cell if self.cell is not None else self.inline).append(text)
+
+    def _flush(self):
+        """Close the current block as one markdown line followed by a blank line"""
+        if self.cell is not None:
+            # Block boundaries inside a table cell only separate words
+            self.cell.append(' ')
+            return
+
+        text = WHITESPACE_RE.sub(' ', ''.join(self.inline)).strip()
+        self.inline = []
+        if text:
+            self.lines.append(self.prefix + text)
+            self.lines.append('')
+        self.prefix = ''
+
+    def _emit_row(self):
+        """Write the open table row as a pipe-table line (spacer rows are dropped)"""
+        cells = self.row
+        self.row = self.row_elem = None
+        if not any(cells):
+            return
 
-    # Parse with BeautifulSoup
-    soup = BeautifulSoup(html_content, 'html.parser')
+        self.lines.append('| ' + ' | '.join(cells) + ' |')
+        if self.table_rows == 0:
+            self.lines.append('|' + ' --- |' * len(cells))
+        self.table_rows += 1
 
-    # Remove hidden XBRL metadata sections
-    for hidden in soup.find_all(['ix:hidden', 'ix:header'], recursive=True):
-        hidden.decompose()
+    def _preceding_text(self, elem):
+        """Text between the previous sibling (or the parent's start tag) and elem"""
+        previous = elem.getprevious()
+        if previous is not None:
+            return previous.tail
+        parent = elem.getparent()
+        return parent.text if parent is not None else None
 
-    # Remove script and style tags
-    for tag in soup.find_all(['script', 'style']):
-        tag.decompose()
+    def _start(self, elem):
+        tag = elem.tag
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+            return
+        if self.skip_depth:
+            return
 
-    # Configure html2text converter
-    h = html2text.HTML2Text()
-    h.ignore_links = False
-    h.ignore_images = True
-    h.ignore_emphasis = False
-    h.body_width = 0  # Don't wrap lines
-    h.unicode_snob = True
-    h.skip_internal_links = True
+        if tag == 'table':
+            self.table_depth += 1
+            if self.table_depth == 1:
+                self._flush()
+                self.table_rows = 0
+        elif tag == 'tr' and self.table_depth == 1:
+            self.row, self.row_elem = [], elem
+        elif tag in CELL_TAGS and self.row is not None and self.cell is None:
+            self.cell, self.cell_elem = [], elem
+        elif tag in BLOCK_TAGS:
+            self._flush()
+            if tag in HEADING_LEVELS:
+                self.prefix = '#' * HEADING_LEVELS[tag] + ' '
+            elif tag == 'li':
+                self.prefix = '- '
+            elif tag == 'hr':
+                self.lines.extend(['* * *', ''])
+        elif tag == 'a':
+            href = elem.get('href')
+            if href and not href.startswith('#'):
+                self.links.add(elem)
+                self._text('[')
 
-    # Convert to markdown
-    markdown_content = h.handle(str(soup))
+    def _end(self, elem):
+        tag = elem.tag
+        if tag in SKIP_TAGS:
+            self.skip_depth -= 1
+            return
+        if self.skip_depth:
+            return
+
+        if elem in self.links:
+            self.links.discard(elem)
+            self._text(f"]({elem.get('href')})")
+
+        if tag == 'table':
+            self.table_depth -= 1
+            if self.table_depth == 0:
+                self.lines.append('')
+        elif elem is self.cell_elem:
+            text = WHITESPACE_RE.sub(' ', ''.join(self.cell)).strip()
+            self.row.append(text.replace('|', '\\|'))
+            self.cell = self.cell_elem = None
+        elif elem is self.row_elem:
+            self._emit_row()
+        elif tag in BLOCK_TAGS:
+            self._flush()
+
+    def handle(self, source):
+        """
+        Convert an HTML file (path or binary file object) to a markdown string
+
+        Args:
+            source: HTML source, decoded as UTF-8
+
+        Returns:
+            Markdown text
+        """
+        events = ('start', 'end', 'comment', 'pi')
+        for event, elem in etree.iterparse(source, events=events, html=True, encoding='utf-8'):
+            if event in ('start', 'comment', 'pi'):
+                self._text(self._preceding_text(elem))
+                if event == 'start':
+                    self._start(elem)
+                    continue
+            else:
+                # Closing: the last run of text inside elem (after its last child)
+                last_child = elem[-1] if len(elem) else None
+                self._text(last_child.tail if last_child is not None else elem.text)
+                self._end(elem)
+
+            # elem is fully written: free its subtree and any earlier siblings,
+            # keeping the tail (read when the next sibling opens)
+            if event == 'end':
+                elem.clear(keep_tail=True)
+            parent = elem.getparent()
+            if parent is not None:
+                while elem.getprevious() is not None:
+                    del parent[0]
+
+        self._flush()
+        return '\n'.join(self.lines) + '\n'
+
+def convert_html_to_markdown(html_file_path, output_md_path, verbose=True):
+    """
+    Convert SEC HTML filing to Markdown format
+
+    Args:
+        html_file_path: Path to HTML file
+        output_md_path: Path for output Markdown file
+        verbose: Print per-file progress (disabled inside worker processes)
+    """
+    if verbose:
+        print(f"\n[Processing] {Path(html_file_path).name}")
+
+    # Stream-parse straight from disk, cutting hidden XBRL blocks out of the
+    # byte stream, and emit markdown as elements close
+    with open(html_file_path, 'rb') as f:
+        markdown_content = MarkdownEmitter().handle(HiddenXbrlFilter(f))
 
     # Clean up the markdown
     # Remove excessive blank lines (more than 2 in a row)
-    markdown_content = re.sub(r'\n{3,}', '\n\n', markdown_content)
-
-    # Clean up table formatting
-    # html2text creates pipe tables, which is what we want
+    markdown_content = BLANK_LINES_RE.sub('\n\n', markdown_content)
 
     # Write output
     with open(output_md_path, 'w', encoding='utf-8') as f:
         f.write(markdown_content)
 
-    print(f"  [OK] Converted to Markdown")
-    print(f"  [Output] {output_md_path}")
-    print(f"  [Size] {len(markdown_content):,} characters")
+    if verbose:
+        print(f"  [OK] Converted to Markdown")
+        print(f"  [Output] {output_md_path}")
+        print(f"  [Size] {len(markdown_content):,} characters")
 
     return True
 
+def _convert_one(args):
+    """Worker entry point: convert one (html_file, output_path) pair"""
+    html_file, output_path = args
+    try:
+        convert_html_to_markdown(html_file, output_path, verbose=False)
+        return html_file.name, None
+    except Exception as e:
+        return html_file.name, str(e)
+
 def main():
     """Convert all HTML files in downloads folder to Markdown"""
 
@@ -92,18 +314,21 @@ def main():
         print(f"  - {file.name}")
     print()
 
-    # Convert each file
-    success_count = 0
-    for html_file in html_files:
-        # Generate output filename
-        output_filename = html_file.stem + ".md"
-        output_path = output_dir / output_filename
+    # Convert files in parallel - each file is independent and CPU-bound
+    jobs = [(html_file, output_dir / (html_file.stem + ".md")) for html_file in html_files]
+    workers = os.cpu_count() or 1
+    chunksize = max(1, len(jobs) // (4 * workers))
 
-        try:
-            if convert_html_to_markdown(html_file, output_path):
+    print(f"Converting with {workers} worker processes...")
+
+    success_count = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for name, error in executor.map(_convert_one, jobs, chunksize=chunksize):
+            if error is None:
                 success_count += 1
-        except Exception as e:
-            print(f"  [ERROR] Failed to convert {html_file.name}: {e}")
+                print(f"  [OK] {name}")
+            else:
+                print(f"  [ERROR] Failed to convert {name}: {error}")
 
     print("\n" + "="*80)
     print(f"COMPLETED: {success_count}/{len(html_files)} files converted successfully")
@@ -119,13 +344,12 @@ def main():
 if __name__ == '__main__':
     # Check if required libraries are available
     try:
-        import bs4
-        import html2text
+        import lxml
     except ImportError as e:
         print("[ERROR] Required library not found:")
         print(f"  {e}")
         print("\nPlease install required libraries:")
-        print("  pip install beautifulsoup4 html2text")
+        print("  pip install lxml")
         sys.exit(1)
 
     main()
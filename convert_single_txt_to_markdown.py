@@ -2,75 +2,121 @@
 Convert a single SEC .txt file (with embedded HTML) to Markdown
 KEEPS SEC-HEADER metadata intact
 """
+import mmap
 import sys
 import re
 from pathlib import Path
-from bs4 import BeautifulSoup
 import html2text
 
 sys.stdout.reconfigure(encoding='utf-8')
 
-def extract_sec_header(txt_content):
-    """Extract SEC header from .txt file"""
-    header_start = txt_content.find('<SEC-HEADER>')
-    header_end = txt_content.find('</SEC-HEADER>')
+# Runs of 3+ newlines, collapsed to a single blank line in the markdown output
+BLANK_LINES_RE = re.compile(r'\n{3,}')
+
+# Blocks dropped before markdown conversion: hidden XBRL facts/header, scripts, styles.
+# Stripped from the raw bytes before decoding, so megabytes of hidden XBRL facts are
+# never decoded or parsed, and html2text parses the filing exactly once.
+HIDDEN_BLOCKS_RE = re.compile(
+    rb'<(ix:hidden|ix:header|script|style)\b[^>]*>.*?</\1\s*>',
+    re.DOTALL | re.IGNORECASE
+)
+
+# SEC container markers, located together in one scan over the file bytes
+MARKERS_RE = re.compile(rb'</?SEC-HEADER>|</?TEXT>')
+MARKER_COUNT = 4
+
+def _decode(raw):
+    """Decode a byte slice the way text-mode open() would (utf-8, universal newlines)"""
+    return raw.decode('utf-8', errors='ignore').replace('\r\n', '\n')
+
+def find_markers(txt_content):
+    """
+    Find the first offset of each SEC container marker in a single linear scan
+
+    Stops as soon as all four markers have been seen (usually the end of the
+    first document), so the rest of the file is never touched.
+    """
+    offsets = {}
+    for match in MARKERS_RE.finditer(txt_content):
+        offsets.setdefault(match.group(), match.start())
+        if len(offsets) == MARKER_COUNT:
+            break
+    return offsets
+
+def extract_sec_header(txt_content, markers=None):
+    """Extract SEC header from .txt file (bytes or mmap)"""
+    if markers is None:
+        markers = find_markers(txt_content)
+    header_start = markers.get(b'<SEC-HEADER>', -1)
+    header_end = markers.get(b'</SEC-HEADER>', -1)
 
     if header_start == -1 or header_end == -1:
         return None
 
     # Include the tags
     header = txt_content[header_start:header_end + 13]
-    return header
+    return _decode(header)
 
-def extract_html_from_sec_txt(txt_content):
-    """Extract HTML content from SEC .txt file format"""
+def extract_html_bytes(txt_content, markers=None):
+    """Extract the raw (undecoded) bytes between <TEXT> tags (bytes or mmap)"""
+    if markers is None:
+        markers = find_markers(txt_content)
     # Find HTML between <TEXT> tags
-    text_start = txt_content.find('<TEXT>')
-    text_end = txt_content.find('</TEXT>')
+    text_start = markers.get(b'<TEXT>', -1)
+    text_end = markers.get(b'</TEXT>', -1)
 
     if text_start == -1 or text_end == -1:
         print("[ERROR] Could not find <TEXT> tags in file")
         return None
 
-    html_content = txt_content[text_start + 6:text_end].strip()
+    return txt_content[text_start + 6:text_end]
+
+def extract_html_from_sec_txt(txt_content, markers=None):
+    """Extract HTML content from SEC .txt file format (bytes or mmap)"""
+    html_bytes = extract_html_bytes(txt_content, markers)
+    if html_bytes is None:
+        return None
+
+    html_content = _decode(html_bytes).strip()
     return html_content
 
 def convert_txt_to_markdown(txt_file_path, output_md_path):
     """Convert SEC .txt file to Markdown, preserving SEC header"""
     print(f"\n[Processing] {Path(txt_file_path).name}")
 
-    # Read entire file
-    with open(txt_file_path, 'r', encoding='utf-8', errors='ignore') as f:
-        txt_content = f.read()
+    if Path(txt_file_path).stat().st_size == 0:
+        print("[ERROR] File is empty")
+        return False
 
-    # Extract SEC header
-    print("  [Step 1] Extracting SEC-HEADER metadata...")
-    sec_header = extract_sec_header(txt_content)
+    # Memory-map the file so only the header and <TEXT> slices get decoded
+    with open(txt_file_path, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        # Locate header and <TEXT> boundaries in one pass
+        markers = find_markers(mm)
 
-    if sec_header:
-        print(f"  [Found] SEC-HEADER ({len(sec_header):,} chars)")
-    else:
-        print("  [Warning] No SEC-HEADER found")
+        # Extract SEC header
+        print("  [Step 1] Extracting SEC-HEADER metadata...")
+        sec_header = extract_sec_header(mm, markers)
 
-    # Extract HTML from .txt file
-    print("  [Step 2] Extracting HTML from <TEXT> tags...")
-    html_content = extract_html_from_sec_txt(txt_content)
+        if sec_header:
+            print(f"  [Found] SEC-HEADER ({len(sec_header):,} chars)")
+        else:
+            print("  [Warning] No SEC-HEADER found")
 
-    if not html_content:
-        return False
+        # Extract HTML from .txt file
+        print("  [Step 2] Extracting HTML from <TEXT> tags...")
+        html_bytes = extract_html_bytes(mm, markers)
 
-    print(f"  [Step 3] Parsing HTML ({len(html_content):,} chars)...")
+    if not html_bytes:
+        return False
 
-    # Parse with BeautifulSoup
-    soup = BeautifulSoup(html_content, 'html.parser')
+    print(f"  [Step 3] Stripping hidden XBRL blocks ({len(html_bytes):,} bytes)...")
 
-    # Remove hidden XBRL metadata
-    for hidden in soup.find_all(['ix:hidden', 'ix:header'], recursive=True):
-        hidden.decompose()
+    # Remove hidden XBRL metadata, scripts and styles, then decode what is left
+    html_content = _decode(HIDDEN_BLOCKS_RE.sub(b'', html_bytes)).strip()
 
-    # Remove script and style tags
-    for tag in soup.find_all(['script', 'style']):
-        tag.decompose()
+    if not html_content:
+        return False
 
     print("  [Step 4] Converting HTML to Markdown...")
 
@@ -84,10 +130,10 @@ def convert_txt_to_markdown(txt_file_path, output_md_path):
     h.skip_internal_links = True
 
     # Convert to markdown
-    markdown_content = h.handle(str(soup))
+    markdown_content = h.handle(html_content)
 
     # Clean up excessive blank lines
-    markdown_content = re.sub(r'\n{3,}', '\n\n', markdown_content)
+    markdown_content = BLANK_LINES_RE.sub('\n\n', markdown_content)
 
     print("  [Step 5] Combining SEC header + Markdown content...")
 
@@ -10,8 +10,11 @@ This script will:
 Usage: python deploy_and_run_chunking.py
 """
 
+import io
+import os
 import subprocess
 import sys
+import tarfile
 import time
 from datetime import datetime
 from pathlib import Path
@@ -21,9 +24,45 @@ EC2_HOST = "35.175.134.36"
 EC2_USER = "kabe"
 SSH_KEY = r"C:\Users\kabec\.ssh\sec_ai_key"
 
+# Reuse one multiplexed SSH connection for every command instead of paying a
+# TCP + key-exchange handshake per call. The Windows OpenSSH port has no
+# ControlMaster support, so there each call still opens its own connection.
+SSH_MULTIPLEX = os.name != 'nt'
+SSH_CONTROL_OPTS = [
+    "-o", "ControlMaster=auto",
+    "-o", "ControlPath=/tmp/ssh-%r@%h:%p",
+    "-o", "ControlPersist=10m",
+] if SSH_MULTIPLEX else []
+
+# Echoed between commands batched by run_ssh_script
+SECTION_MARKER = "===SECTION:"
+
+def ssh_base_cmd():
+    """ssh argv prefix (key, multiplexing options, user@host) shared by every call."""
+    return ["ssh", "-i", SSH_KEY, *SSH_CONTROL_OPTS, f"{EC2_USER}@{EC2_HOST}"]
+
+def start_ssh_master(timeout=30):
+    """Open the background control-master connection later commands reuse."""
+    if not SSH_MULTIPLEX:
+        return False
+    try:
+        # The backgrounded master keeps whatever stdout/stderr it inherits; pipes
+        # would make run() wait for it to exit, so they go to /dev/null
+        result = subprocess.run(ssh_base_cmd()[:1] + ["-N", "-f"] + ssh_base_cmd()[1:],
+                                stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL, timeout=timeout)
+        return result.returncode == 0
+    except (subprocess.TimeoutExpired, OSError):
+        return False
+
+def stop_ssh_master():
+    """Close the control-master connection (ControlPersist would expire it anyway)."""
+    if SSH_MULTIPLEX:
+        subprocess.run(ssh_base_cmd()[:1] + ["-O", "exit"] + ssh_base_cmd()[1:], capture_output=True)
+
 def run_ssh_command(command, timeout=300, show_output=False):
     """Run a command on EC2 via SSH."""
-    ssh_cmd = ["ssh", "-i", SSH_KEY, f"{EC2_USER}@{EC2_HOST}", command]
+    ssh_cmd = ssh_base_cmd() + [command]
 
     try:
         if show_output:
@@ -49,6 +88,81 @@ def run_ssh_command(command, timeout=300, show_output=False):
     except Exception as e:
         return f"Error: {str(e)}"
 
+def run_ssh_script(commands, timeout=60):
+    """
+    Run several independent commands in one SSH session (a single `bash -s`).
+
+    Each command's output is preceded by a section marker printed on the remote
+    side, so one round-trip replaces a connection per command. The marker starts
+    with a newline so it lands on its own line even after output without a
+    trailing newline (that extra newline is stripped again when splitting), and
+    each command reads /dev/null so it cannot consume the rest of the script.
+
+    Args:
+        commands: dict of {name: shell command}
+
+    Returns:
+        dict: {name: output} - every name maps to the error message on failure
+    """
+    script = "".join(
+        f"printf '\\n%s\\n' '{SECTION_MARKER}{name}'\n{{ {command}\n}} </dev/null\n"
+        for name, command in commands.items()
+    )
+    ssh_cmd = ssh_base_cmd() + ["bash -s"]
+
+    try:
+        result = subprocess.run(ssh_cmd, input=script, capture_output=True, text=True,
+                                timeout=timeout, encoding='utf-8', errors='replace')
+    except subprocess.TimeoutExpired:
+        return dict.fromkeys(commands, "Command timed out")
+    except Exception as e:
+        return dict.fromkeys(commands, f"Error: {str(e)}")
+    if result.returncode == 255:
+        # ssh itself failed (connection/auth); remote command failures return other codes
+        return dict.fromkeys(commands, f"Error: {result.stderr}")
+
+    outputs = dict.fromkeys(commands, "")
+    name = None
+    for line in result.stdout.splitlines(keepends=True):
+        if line.startswith(SECTION_MARKER):
+            if name in outputs:
+                outputs[name] = outputs[name][:-1]  # newline printed ahead of this marker
+            name = line[len(SECTION_MARKER):].strip()
+        elif name in outputs:
+            outputs[name] += line
+    return outputs
+
+def upload_files(local_files, remote_dir, timeout=60):
+    """
+    Upload files to EC2 as a single gzipped tar stream over one SSH connection.
+
+    Relative paths are preserved under remote_dir (e.g. src/Dockerfile -> remote_dir/src/Dockerfile).
+
+    Returns:
+        tuple: (uploaded_files, error) - error is None on success
+    """
+    archive = io.BytesIO()
+    uploaded = []
+    with tarfile.open(fileobj=archive, mode='w:gz') as tar:
+        for local_file in local_files:
+            if not Path(local_file).exists():
+                print(f"[SKIP] {local_file} not found")
+                continue
+            tar.add(local_file, arcname=Path(local_file).as_posix())
+            uploaded.append(local_file)
+
+    ssh_cmd = ssh_base_cmd() + [f"tar xzf - -C {remote_dir}"]
+
+    try:
+        result = subprocess.run(ssh_cmd, input=archive.getvalue(), capture_output=True, timeout=timeout)
+        if result.returncode != 0:
+            return uploaded, result.stderr.decode(errors='replace')
+        return uploaded, None
+    except subprocess.TimeoutExpired:
+        return uploaded, "Upload timed out"
+    except Exception as e:
+        return uploaded, str(e)
+
 def print_section(title):
     """Print a formatted section header."""
     print("\n" + "=" * 80)
@@ -64,126 +178,124 @@ def main():
 
     # Step 1: Test connection
     print_section("STEP 1: Testing Connection")
-    test = run_ssh_command("echo 'Connected'")
-    if "Error" in test:
-        print(f"[FAIL] Cannot connect: {test}")
-        sys.exit(1)
-    print("[OK] SSH connection successful")
-
-    # Step 2: Create project directory on EC2
-    print_section("STEP 2: Setting Up Project Directory")
-    project_dir = "/app/home/kabe/edgar_anomaly_detection"
-
-    print(f"Creating {project_dir}...")
-    run_ssh_command(f"mkdir -p {project_dir}/src/data {project_dir}/src/models {project_dir}/src/pipeline")
-
-    # Step 3: Upload files via rsync (if available) or scp
-    print_section("STEP 3: Uploading Project Files")
-
-    files_to_upload = [
-        ("requirements.txt", f"{project_dir}/"),
-        ("docker-compose.chunking.yml", f"{project_dir}/"),
-        ("src/Dockerfile", f"{project_dir}/src/"),
-        ("src/__init__.py", f"{project_dir}/src/"),
-        ("src/data/__init__.py", f"{project_dir}/src/data/"),
-        ("src/data/text_processor.py", f"{project_dir}/src/data/"),
-    ]
-
-    print("Uploading files via SCP...")
-    for local_file, remote_path in files_to_upload:
-        if not Path(local_file).exists():
-            print(f"[SKIP] {local_file} not found")
-            continue
-
-        scp_cmd = [
-            "scp", "-i", SSH_KEY,
-            local_file,
-            f"{EC2_USER}@{EC2_HOST}:{remote_path}"
-        ]
-
-        try:
-            result = subprocess.run(scp_cmd, capture_output=True, timeout=30)
-            if result.returncode == 0:
-                print(f"[OK] {local_file}")
-            else:
-                print(f"[FAIL] {local_file}: {result.stderr.decode()}")
-        except Exception as e:
-            print(f"[FAIL] {local_file}: {e}")
-
-    # Step 4: Verify Docker is installed
-    print_section("STEP 4: Verifying Docker Installation")
-    docker_check = run_ssh_command("docker --version")
-    print(docker_check)
-
-    docker_compose_check = run_ssh_command("docker-compose --version || docker compose version")
-    print(docker_compose_check)
-
-    # Step 5: Build Docker image
-    print_section("STEP 5: Building Docker Image")
-    print("This may take 3-5 minutes (installing dependencies)...\n")
-
-    build_success = run_ssh_command(
-        f"cd {project_dir} && docker build -t edgar-chunking -f src/Dockerfile .",
-        timeout=600,
-        show_output=True
-    )
-
-    if not build_success:
-        print("\n[FAIL] Docker build failed")
-        sys.exit(1)
+    if start_ssh_master():
+        print("[OK] SSH control master started (commands share one connection)")
 
-    print("\n[OK] Docker image built successfully")
-
-    # Step 6: Create output directory
-    print_section("STEP 6: Preparing Output Directory")
-    run_ssh_command("mkdir -p /app/data/processed/2024/QTR1")
-    print("[OK] Output directory ready: /app/data/processed/2024/QTR1")
-
-    # Step 7: Run chunking container
-    print_section("STEP 7: Running Chunking Container")
-    print("Processing 2024 Q1 (~6,337 files)...")
-    print("Estimated time: 10-15 minutes\n")
-
-    start_time = time.time()
-
-    # Run with docker-compose
-    run_success = run_ssh_command(
-        f"cd {project_dir} && docker-compose -f docker-compose.chunking.yml run --rm chunking",
-        timeout=1800,
-        show_output=True
-    )
-
-    elapsed = time.time() - start_time
-
-    if not run_success:
-        print(f"\n[WARN] Container exited with errors (check output above)")
-    else:
-        print(f"\n[OK] Processing completed in {elapsed/60:.1f} minutes")
-
-    # Step 8: Verify output
-    print_section("STEP 8: Verifying Output")
-
-    file_count = run_ssh_command("find /app/data/processed/2024/QTR1/ -name '*.json' | wc -l")
-    print(f"JSON files created: {file_count.strip()}")
-
-    dir_size = run_ssh_command("du -sh /app/data/processed/2024/QTR1/")
-    print(f"Output size: {dir_size.strip()}")
-
-    # Sample output
-    print("\nSample output file (first 40 lines):")
-    sample = run_ssh_command("find /app/data/processed/2024/QTR1/ -name '*.json' 2>/dev/null | head -1 | xargs head -40 2>/dev/null || echo 'No files found'")
-    print(sample)
-
-    # Step 9: Cleanup
-    print_section("STEP 9: Cleanup (Optional)")
-    print("Docker image remains on EC2 for future use")
-    print(f"To remove: ssh and run 'docker rmi edgar-chunking'")
+    # Every exit (sys.exit and exceptions included) closes the control master
+    try:
+        test = run_ssh_command("echo 'Connected'")
+        if "Error" in test:
+            print(f"[FAIL] Cannot connect: {test}")
+            sys.exit(1)
+        print("[OK] SSH connection successful")
+
+        # Step 2: Create project directory on EC2
+        print_section("STEP 2: Setting Up Project Directory")
+        project_dir = "/app/home/kabe/edgar_anomaly_detection"
+
+        print(f"Creating {project_dir}...")
+        run_ssh_command(f"mkdir -p {project_dir}/src/data {project_dir}/src/models {project_dir}/src/pipeline")
+
+        # Step 3: Upload files
+        print_section("STEP 3: Uploading Project Files")
+
+        # Paths are relative to the project root and keep their layout under project_dir
+        files_to_upload = [
+            "requirements.txt",
+            "docker-compose.chunking.yml",
+            "src/Dockerfile",
+            "src/__init__.py",
+            "src/data/__init__.py",
+            "src/data/text_processor.py",
+        ]
 
-    print_section("DEPLOYMENT COMPLETE")
-    print(f"Total time: {elapsed/60:.1f} minutes")
-    print(f"Output: /app/data/processed/2024/QTR1/")
-    print(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print("=" * 80)
+        # One tar stream over one SSH connection instead of an scp handshake per file
+        print("Uploading files via tar over SSH...")
+        uploaded, error = upload_files(files_to_upload, project_dir)
+        for local_file in uploaded:
+            print(f"[{'FAIL' if error else 'OK'}] {local_file}")
+        if error:
+            print(f"[FAIL] Upload failed: {error}")
+
+        # Step 4: Verify Docker is installed
+        print_section("STEP 4: Verifying Docker Installation")
+        versions = run_ssh_script({
+            "docker": "docker --version 2>&1",
+            "compose": "docker-compose --version 2>&1 || docker compose version 2>&1",
+        })
+        print(versions["docker"])
+        print(versions["compose"])
+
+        # Step 5: Build Docker image
+        print_section("STEP 5: Building Docker Image")
+        print("This may take 3-5 minutes (installing dependencies)...\n")
+
+        build_success = run_ssh_command(
+            f"cd {project_dir} && docker build -t edgar-chunking -f src/Dockerfile .",
+            timeout=600,
+            show_output=True
+        )
+
+        if not build_success:
+            print("\n[FAIL] Docker build failed")
+            sys.exit(1)
+
+        print("\n[OK] Docker image built successfully")
+
+        # Step 6: Create output directory
+        print_section("STEP 6: Preparing Output Directory")
+        run_ssh_command("mkdir -p /app/data/processed/2024/QTR1")
+        print("[OK] Output directory ready: /app/data/processed/2024/QTR1")
+
+        # Step 7: Run chunking container
+        print_section("STEP 7: Running Chunking Container")
+        print("Processing 2024 Q1 (~6,337 files)...")
+        print("Estimated time: 10-15 minutes\n")
+
+        start_time = time.time()
+
+        # Run with docker-compose
+        run_success = run_ssh_command(
+            f"cd {project_dir} && docker-compose -f docker-compose.chunking.yml run --rm chunking",
+            timeout=1800,
+            show_output=True
+        )
+
+        elapsed = time.time() - start_time
+
+        if not run_success:
+            print(f"\n[WARN] Container exited with errors (check output above)")
+        else:
+            print(f"\n[OK] Processing completed in {elapsed/60:.1f} minutes")
+
+        # Step 8: Verify output
+        print_section("STEP 8: Verifying Output")
+
+        # All three checks in one SSH round-trip
+        output = run_ssh_script({
+            "file_count": "(find /app/data/processed/2024/QTR1/ -name '*.json' | wc -l) 2>&1",
+            "dir_size": "du -sh /app/data/processed/2024/QTR1/ 2>&1",
+            "sample": "find /app/data/processed/2024/QTR1/ -name '*.json' 2>/dev/null | head -1 | xargs head -40 2>/dev/null || echo 'No files found'",
+        })
+        print(f"JSON files created: {output['file_count'].strip()}")
+        print(f"Output size: {output['dir_size'].strip()}")
+
+        # Sample output
+        print("\nSample output file (first 40 lines):")
+        print(output["sample"])
+
+        # Step 9: Cleanup
+        print_section("STEP 9: Cleanup (Optional)")
+        print("Docker image remains on EC2 for future use")
+        print(f"To remove: ssh and run 'docker rmi edgar-chunking'")
+
+        print_section("DEPLOYMENT COMPLETE")
+        print(f"Total time: {elapsed/60:.1f} minutes")
+        print(f"Output: /app/data/processed/2024/QTR1/")
+        print(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        print("=" * 80)
+    finally:
+        stop_ssh_master()
 
 if __name__ == "__main__":
     main()
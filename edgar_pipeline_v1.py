@@ -9,7 +9,9 @@ requirements: ollama, chromadb, sentence_transformers, tiktoken
 """
 from typing import List, Union, Generator, Iterator
 
+import numpy as np
 import requests
+import torch
 import chromadb
 from sentence_transformers import SentenceTransformer
 
@@ -21,17 +23,31 @@ class Pipeline:
         # The identifier must be an alphanumeric string that can include underscores or hyphens. It cannot contain spaces, special characters, slashes, or backslashes.
         # self.id = "custom_edgar_pipeline"
         self.name = "Custom Edgar Pipeline"
-        pass
+
+        # The model is loaded once in on_startup; the ChromaDB collection is
+        # opened on the first pipe() call. Both are reused by every later call
+        self.model = None
+        self.collection = None
+        self.session = None
 
     async def on_startup(self):
         # This function is called when the server is started.
         print(f"on_startup:{__name__}")
-        pass
+
+        # Load the embedding model once, not per request
+        self.model = SentenceTransformer('sentence-transformers/multi-qa-mpnet-base-dot-v1')
+        if torch.cuda.is_available():
+            # FP16 halves single-query encode latency; ranking is unaffected
+            self.model = self.model.half().to('cuda')
+
+        # Keep-alive connection to Ollama
+        self.session = requests.Session()
 
     async def on_shutdown(self):
         # This function is called when the server is stopped.
         print(f"on_shutdown:{__name__}")
-        pass
+        if self.session is not None:
+            self.session.close()
 
     def pipe(
         self, user_message: str, model_id: str, messages: List[dict], body: dict
@@ -48,16 +64,17 @@ class Pipeline:
             print(f"# Orig Message: {user_message}")
             print("######################################")
         
-        model = SentenceTransformer('sentence-transformers/multi-qa-mpnet-base-dot-v1')
-        embed = model.encode(user_message)
-        
-        # chromadb
-        client = chromadb.HttpClient(host="host.docker.internal", port=8000)
-        # Create or get collection for your documents
-        collection = client.get_or_create_collection(name="test")
+        # Chroma expects float32 vectors, so cast back from the FP16 model output
+        embed = self.model.encode(user_message, convert_to_numpy=True).astype(np.float32)
         
+        # Connect to ChromaDB on first use, so the pipeline still loads while
+        # ChromaDB is down; until it is up only the requests fail (and retry)
+        if self.collection is None:
+            client = chromadb.HttpClient(host="host.docker.internal", port=8000)
+            self.collection = client.get_or_create_collection(name="test")
+
         # search documents
-        results = collection.query(
+        results = self.collection.query(
             query_embeddings=[embed],
             n_results=5,
             include=['documents', 'metadatas', 'distances']
@@ -77,7 +94,7 @@ Answer:"""
         body['messages'][0]['content'] = prompt
     
         try:
-            r = requests.post(
+            r = self.session.post(
                 url=f"{OLLAMA_BASE_URL}/v1/chat/completions",
                 json={**body, "model": MODEL},
                 stream=True,
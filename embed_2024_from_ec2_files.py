@@ -4,20 +4,28 @@ Embed All 2024 SEC Filings - Using Existing EC2 Files
 Reads from existing processed JSON files on EC2 and generates embeddings.
 
 Input: /app/data/processed/2024/QTR*/*.json (26,000 individual files)
-Output: /app/data/embeddings/2024/ (parquet files)
+Output: /app/data/embeddings/2024/ (embeddings.f16.npy + metadata/retrieval parquet files)
 
 Model: multi-qa-mpnet-base-dot-v1 (768-dim)
 Device: CUDA GPU (automatic detection)
 
 Usage:
     python /app/embed_2024_from_ec2_files.py
+
+    # CPU-only hosts: ONNX Runtime with int8 dynamic quantization
+    EMBED_BACKEND=onnx python /app/embed_2024_from_ec2_files.py
 """
 
-import json
+import multiprocessing
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import numpy as np
-import pandas as pd
+import orjson
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 from sentence_transformers import SentenceTransformer
 from tqdm import tqdm
 import torch
@@ -28,162 +36,317 @@ PROCESSED_DIR = Path('/app/data/processed/2024')
 OUTPUT_DIR = Path('/app/data/embeddings/2024')
 MODEL_NAME = 'sentence-transformers/multi-qa-mpnet-base-dot-v1'
 BATCH_SIZE = 128  # For GPU
-
-print("=" * 80)
-print("EMBED ALL 2024 SEC FILINGS - FROM EXISTING EC2 FILES")
-print("=" * 80)
-
-# Check GPU
-print(f"\n[GPU CHECK]")
-print(f"  CUDA available: {torch.cuda.is_available()}")
-if torch.cuda.is_available():
-    print(f"  GPU: {torch.cuda.get_device_name(0)}")
-    print(f"  GPU Memory: {torch.cuda.get_device_properties(0).total_memory / 1e9:.2f} GB")
-else:
-    print("  WARNING: No GPU detected, will use CPU (slower)")
-
-# Step 1: Find all JSON files
-print(f"\n[1/4] Finding JSON files in {PROCESSED_DIR}...")
-json_files = []
-for qtr in ['QTR1', 'QTR2', 'QTR3', 'QTR4']:
-    qtr_path = PROCESSED_DIR / qtr
-    if qtr_path.exists():
-        files = list(qtr_path.glob('*.json'))
-        json_files.extend(files)
-        print(f"  {qtr}: {len(files):,} files")
-
-print(f"\n[OK] Found {len(json_files):,} JSON files")
-
-# Step 2: Load and extract chunks
-print(f"\n[2/4] Loading chunks from JSON files...")
-texts_for_embedding = []
-texts_for_retrieval = []
-metadata_list = []
-
-for json_file in tqdm(json_files, desc="Loading files"):
+LOAD_WORKERS = os.cpu_count() or 1  # Processes for JSON parsing
+ENCODE_WINDOW = 100_000  # Chunk texts materialized as Python strings at a time
+VALIDATE_BLOCK_ROWS = 8192  # 8192 x 768 float16 = 12 MB of the output read per validation step
+
+# Inference backend: 'torch' (FP16 on GPU) or 'onnx' (int8 ONNX Runtime, CPU)
+EMBED_BACKEND = os.getenv('EMBED_BACKEND', 'torch')
+ONNX_MODEL_DIR = Path('/app/models/multi-qa-mpnet-base-dot-v1-onnx')
+ONNX_QUANTIZATION = 'avx512_vnni'
+ONNX_MODEL_FILE = f'onnx/model_qint8_{ONNX_QUANTIZATION}.onnx'
+
+# Dense (N, 768) float16 matrix, memory-mapped at retrieval time
+EMBEDDINGS_PATH = OUTPUT_DIR / 'embeddings.f16.npy'
+
+# Intermediate on-disk chunk store (Arrow IPC file, memory-mapped for encoding)
+CHUNKS_PATH = OUTPUT_DIR / 'chunks.arrow'
+CHUNK_SCHEMA = pa.schema([
+    ('text', pa.string()),
+    ('file_name', pa.string()),
+    ('chunk_id', pa.int64()),
+    ('company', pa.string()),
+    ('form_type', pa.string()),
+    ('filing_date', pa.string()),
+    ('cik', pa.string()),
+    ('chunk_index', pa.int64()),
+    ('core_tokens', pa.int64()),
+])
+
+
+def load_onnx_int8_model():
+    """
+    Load the model on ONNX Runtime with int8 dynamic quantization.
+
+    The ONNX export and quantization run once and are cached in ONNX_MODEL_DIR.
+    Validate recall@k against the torch model before switching a full run over.
+    """
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    if not (ONNX_MODEL_DIR / ONNX_MODEL_FILE).exists():
+        print(f"[INFO] Exporting {MODEL_NAME} to ONNX + int8 ({ONNX_QUANTIZATION})...")
+        onnx_model = SentenceTransformer(MODEL_NAME, backend='onnx')
+        onnx_model.save_pretrained(str(ONNX_MODEL_DIR))
+        export_dynamic_quantized_onnx_model(onnx_model, ONNX_QUANTIZATION, str(ONNX_MODEL_DIR))
+        print(f"[OK] Quantized model cached: {ONNX_MODEL_DIR / ONNX_MODEL_FILE}")
+
+    return SentenceTransformer(
+        str(ONNX_MODEL_DIR),
+        backend='onnx',
+        model_kwargs={'file_name': ONNX_MODEL_FILE}
+    )
+
+
+def load_filing(json_file):
+    """
+    Parse one processed filing JSON (runs in a worker process).
+
+    Only the fields used for embedding/metadata are sent back, keeping IPC small.
+
+    Returns:
+        tuple: (file_metadata, columns, error)
+            - columns: (texts, chunk_ids, token_counts) - one list per field
+            - error: None on success, otherwise the exception message
+    """
     try:
-        with open(json_file, 'r', encoding='utf-8') as f:
-            filing = json.load(f)
-
-        # Get metadata from top level
-        file_metadata = filing.get('metadata', {})
-        file_name = file_metadata.get('filename', json_file.name)
-
-        for chunk in filing.get('chunks', []):
-            # Text to embed and retrieve (same, since context_summary is None)
-            chunk_text = chunk['text']
-            texts_for_embedding.append(chunk_text)
-            texts_for_retrieval.append(chunk_text)
-
-            # Metadata
-            metadata = {
-                'file_name': file_name,
-                'chunk_id': chunk['chunk_id'],
-                'company': file_metadata.get('company_name', 'Unknown'),
-                'form_type': file_metadata.get('form_type', 'Unknown'),
-                'filing_date': file_metadata.get('filing_date', 'Unknown'),
-                'cik': file_metadata.get('cik', 'Unknown'),
-                'chunk_index': chunk['chunk_id'],
-                'core_tokens': chunk.get('token_count', 0)
-            }
-            metadata_list.append(metadata)
-
+        filing = orjson.loads(json_file.read_bytes())
+        chunks = filing.get('chunks', [])
+        columns = (
+            [chunk['text'] for chunk in chunks],
+            [chunk['chunk_id'] for chunk in chunks],
+            [chunk.get('token_count', 0) for chunk in chunks],
+        )
+        return filing.get('metadata', {}), columns, None
     except Exception as e:
-        print(f"\n[WARN] Failed to load {json_file.name}: {e}")
-        continue
-
-total_chunks = len(texts_for_embedding)
-print(f"\n[OK] Extracted {total_chunks:,} chunks from {len(json_files):,} filings")
-print(f"  Avg chunks per filing: {total_chunks / len(json_files):.1f}")
-
-# Step 3: Generate embeddings
-print(f"\n[3/4] Generating embeddings...")
-print(f"  Model: {MODEL_NAME}")
-print(f"  Batch size: {BATCH_SIZE}")
-if torch.cuda.is_available():
-    print(f"  Using GPU - Expected time: 30-60 minutes")
-else:
-    print(f"  Using CPU - Expected time: 2-3 hours")
-print()
-
-# Load model
-print(f"[INFO] Loading embedding model...")
-model = SentenceTransformer(MODEL_NAME)
-print(f"[OK] Model loaded")
-print(f"  Dimensions: {model.get_sentence_embedding_dimension()}")
-print(f"  Max sequence length: {model.max_seq_length}")
-print(f"  Device: {model.device}\n")
-
-# Generate embeddings
-embeddings = model.encode(
-    texts_for_embedding,
-    batch_size=BATCH_SIZE,
-    show_progress_bar=True,
-    convert_to_numpy=True,
-    normalize_embeddings=True,
-    device=None  # Auto-detect GPU
-)
-
-print(f"\n[OK] Embeddings generated")
-print(f"  Shape: {embeddings.shape}")
-print(f"  Expected: ({total_chunks:,}, 768)")
-
-# Validation
-assert embeddings.shape[0] == total_chunks, "Mismatch in embedding count!"
-assert embeddings.shape[1] == 768, "Incorrect embedding dimensions!"
-assert not np.isnan(embeddings).any(), "NaN values found!"
-assert not np.isinf(embeddings).any(), "Inf values found!"
-
-norms = np.linalg.norm(embeddings, axis=1)
-assert np.allclose(norms, 1.0, atol=1e-6), "Embeddings not normalized!"
-
-print(f"[OK] Validation passed")
-print(f"  L2 norm: {norms.mean():.6f} (should be ~1.0)")
-
-# Step 4: Save embeddings and metadata
-print(f"\n[4/4] Saving to {OUTPUT_DIR}...")
-OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-
-# Save embeddings
-embeddings_df = pd.DataFrame(embeddings)
-embeddings_path = OUTPUT_DIR / 'embeddings.parquet'
-embeddings_df.to_parquet(embeddings_path, index=False)
-embeddings_size_mb = embeddings_path.stat().st_size / (1024 * 1024)
-print(f"[OK] Embeddings saved: {embeddings_path.name} ({embeddings_size_mb:,.2f} MB)")
-
-# Save metadata
-metadata_df = pd.DataFrame(metadata_list)
-metadata_path = OUTPUT_DIR / 'metadata.parquet'
-metadata_df.to_parquet(metadata_path, index=False)
-metadata_size_mb = metadata_path.stat().st_size / (1024 * 1024)
-print(f"[OK] Metadata saved: {metadata_path.name} ({metadata_size_mb:,.2f} MB)")
-
-# Save retrieval texts
-retrieval_df = pd.DataFrame({'text': texts_for_retrieval})
-retrieval_path = OUTPUT_DIR / 'retrieval_texts.parquet'
-retrieval_df.to_parquet(retrieval_path, index=False)
-retrieval_size_mb = retrieval_path.stat().st_size / (1024 * 1024)
-print(f"[OK] Retrieval texts saved: {retrieval_path.name} ({retrieval_size_mb:,.2f} MB)")
-
-# Summary
-print("\n" + "=" * 80)
-print("EMBEDDING COMPLETE")
-print("=" * 80)
-
-print(f"\nStatistics:")
-print(f"  Total filings: {len(json_files):,}")
-print(f"  Total chunks: {total_chunks:,}")
-print(f"  Embedding dimensions: 768")
-print(f"  Total size: {embeddings_size_mb + metadata_size_mb + retrieval_size_mb:,.2f} MB")
-print(f"  Device used: {model.device}")
-
-print(f"\nOutput files:")
-print(f"  {OUTPUT_DIR / 'embeddings.parquet'}")
-print(f"  {OUTPUT_DIR / 'metadata.parquet'}")
-print(f"  {OUTPUT_DIR / 'retrieval_texts.parquet'}")
-
-print(f"\nNext steps:")
-print(f"  1. Test RAG: python -m src.pipeline.rag_query --embeddings /app/data/embeddings/2024")
-print(f"  2. Run ground truth evaluation")
-
-print("\n" + "=" * 80)
+        return None, None, str(e)
+
+
+def main():
+    """Load the processed filings, embed every chunk, and save embeddings and metadata"""
+    print("=" * 80)
+    print("EMBED ALL 2024 SEC FILINGS - FROM EXISTING EC2 FILES")
+    print("=" * 80)
+
+    # Check GPU
+    print(f"\n[GPU CHECK]")
+    print(f"  CUDA available: {torch.cuda.is_available()}")
+    if torch.cuda.is_available():
+        print(f"  GPU: {torch.cuda.get_device_name(0)}")
+        print(f"  GPU Memory: {torch.cuda.get_device_properties(0).total_memory / 1e9:.2f} GB")
+    else:
+        print("  WARNING: No GPU detected, will use CPU (slower)")
+
+    # Step 1: Find all JSON files
+    print(f"\n[1/4] Finding JSON files in {PROCESSED_DIR}...")
+    json_files = []
+    for qtr in ['QTR1', 'QTR2', 'QTR3', 'QTR4']:
+        qtr_path = PROCESSED_DIR / qtr
+        if qtr_path.exists():
+            files = list(qtr_path.glob('*.json'))
+            json_files.extend(files)
+            print(f"  {qtr}: {len(files):,} files")
+
+    print(f"\n[OK] Found {len(json_files):,} JSON files")
+
+    # Step 2: Load and extract chunks, streaming one record batch per filing to disk
+    print(f"\n[2/4] Loading chunks from JSON files...")
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    # Parse JSON in worker processes (fork: workers inherit this module's functions)
+    print(f"  Workers: {LOAD_WORKERS}")
+    print(f"  Chunk store: {CHUNKS_PATH}")
+    with ProcessPoolExecutor(max_workers=LOAD_WORKERS, mp_context=multiprocessing.get_context('fork')) as executor, \
+            pa.ipc.new_file(str(CHUNKS_PATH), CHUNK_SCHEMA) as chunk_writer:
+        results = executor.map(load_filing, json_files, chunksize=64)
+
+        for json_file, (file_metadata, columns, error) in tqdm(zip(json_files, results), total=len(json_files), desc="Loading files"):
+            if error is not None:
+                print(f"\n[WARN] Failed to load {json_file.name}: {error}")
+                continue
+
+            # Get metadata from top level
+            file_name = file_metadata.get('filename', json_file.name)
+
+            texts, chunk_ids, token_counts = columns
+            num_chunks = len(texts)
+            if num_chunks == 0:
+                continue
+
+            # One column per field (no per-row dicts); filing-level values repeat per chunk.
+            # Text to embed and retrieve is the same, since context_summary is None
+            chunk_writer.write_batch(pa.RecordBatch.from_pydict({
+                'text': texts,
+                'file_name': [file_name] * num_chunks,
+                'chunk_id': chunk_ids,
+                'company': [file_metadata.get('company_name', 'Unknown')] * num_chunks,
+                'form_type': [file_metadata.get('form_type', 'Unknown')] * num_chunks,
+                'filing_date': [file_metadata.get('filing_date', 'Unknown')] * num_chunks,
+                'cik': [file_metadata.get('cik', 'Unknown')] * num_chunks,
+                'chunk_index': chunk_ids,
+                'core_tokens': token_counts,
+            }, schema=CHUNK_SCHEMA))
+
+    # Memory-map the chunk store: columns are read straight from the page cache
+    chunks_source = pa.memory_map(str(CHUNKS_PATH), 'r')
+    chunks_table = pa.ipc.open_file(chunks_source).read_all()
+
+    total_chunks = chunks_table.num_rows
+    print(f"\n[OK] Extracted {total_chunks:,} chunks from {len(json_files):,} filings")
+    print(f"  Avg chunks per filing: {total_chunks / len(json_files):.1f}")
+
+    # Step 3: Generate embeddings
+    print(f"\n[3/4] Generating embeddings...")
+    print(f"  Model: {MODEL_NAME}")
+    print(f"  Batch size: {BATCH_SIZE}")
+    print(f"  Backend: {EMBED_BACKEND}")
+    if torch.cuda.is_available():
+        print(f"  Using GPU - Expected time: 30-60 minutes")
+    else:
+        print(f"  Using CPU - Expected time: 2-3 hours")
+    print()
+
+    # Load model
+    print(f"[INFO] Loading embedding model...")
+    if EMBED_BACKEND == 'onnx':
+        model = load_onnx_int8_model()
+        precision = 'int8'
+    else:
+        model = SentenceTransformer(MODEL_NAME)
+        precision = 'fp32'
+        if torch.cuda.is_available():
+            # FP16 weights halve memory bandwidth and use tensor cores; dot-product
+            # retrieval is insensitive to the lost precision
+            model = model.half()
+            precision = 'fp16'
+    print(f"[OK] Model loaded")
+    print(f"  Dimensions: {model.get_sentence_embedding_dimension()}")
+    print(f"  Max sequence length: {model.max_seq_length}")
+    print(f"  Device: {model.device}")
+    print(f"  Precision: {precision}\n")
+
+    # Deduplicate identical chunk texts (boilerplate repeated across filings) so each
+    # unique string is encoded once; large_string avoids 2 GB offset overflow
+    text_column = chunks_table.column('text').cast(pa.large_string())
+    unique_texts = pc.unique(text_column)
+    unique_index = pc.index_in(text_column, value_set=unique_texts).to_numpy()
+    num_unique = len(unique_texts)
+    print(f"[INFO] Unique chunk texts: {num_unique:,} of {total_chunks:,} ({(1 - num_unique / total_chunks) * 100:.1f}% duplicates skipped)")
+
+    # Sort unique texts by length so every batch pads to a similar sequence length
+    length_order = np.argsort(pc.utf8_length(unique_texts).to_numpy(), kind='stable')
+
+    # Stored as float16 - half the parquet size and half the I/O at retrieval time
+    unique_embeddings = np.empty((num_unique, model.get_sentence_embedding_dimension()), dtype=np.float16)
+
+    # With more than one GPU, shard batches across a worker process per device;
+    # a single GPU (or the CPU ONNX backend) keeps the in-process encode path
+    gpu_count = torch.cuda.device_count() if EMBED_BACKEND != 'onnx' else 0
+    pool = None
+    if gpu_count > 1:
+        target_devices = [f'cuda:{i}' for i in range(gpu_count)]
+        print(f"[INFO] Multi-GPU encoding on {gpu_count} devices: {', '.join(target_devices)}")
+        pool = model.start_multi_process_pool(target_devices=target_devices)
+
+    # Encode one window of length-sorted texts at a time; only that window is
+    # materialized as Python strings, and results scatter back to unique order
+    for start in tqdm(range(0, num_unique, ENCODE_WINDOW), desc="Encoding windows"):
+        window = length_order[start:start + ENCODE_WINDOW]
+        window_texts = unique_texts.take(pa.array(window)).to_pylist()
+
+        if pool is not None:
+            unique_embeddings[window] = model.encode_multi_process(
+                window_texts,
+                pool,
+                batch_size=BATCH_SIZE,
+                normalize_embeddings=True
+            )
+            continue
+
+        # Keep batch outputs on the device and copy the whole window to host once,
+        # instead of a GPU -> numpy round-trip after every batch
+        window_tensor = model.encode(
+            window_texts,
+            batch_size=BATCH_SIZE,
+            show_progress_bar=False,
+            output_value='sentence_embedding',
+            convert_to_tensor=True,
+            normalize_embeddings=True,
+            device=None  # Auto-detect GPU
+        )
+        unique_embeddings[window] = window_tensor.to(torch.float16).cpu().numpy()
+        del window_tensor
+
+    if pool is not None:
+        model.stop_multi_process_pool(pool)
+
+    # Expand back to one row per chunk (rows must line up with metadata), writing
+    # straight into the memory-mapped output .npy instead of an in-RAM copy
+    embeddings = np.lib.format.open_memmap(
+        EMBEDDINGS_PATH, mode='w+', dtype=np.float16, shape=(total_chunks, unique_embeddings.shape[1])
+    )
+    np.take(unique_embeddings, unique_index, axis=0, out=embeddings, mode='clip')
+    del unique_embeddings, unique_texts
+
+    print(f"\n[OK] Embeddings generated")
+    print(f"  Shape: {embeddings.shape}")
+    print(f"  Expected: ({total_chunks:,}, 768)")
+
+    # Validation, one block of the memory-mapped output at a time: only the
+    # (rows,) squared norms are materialized, accumulated in float32 (float16
+    # storage is accurate to ~1e-3). NaN/Inf propagate into the squared norms,
+    # so one finite check covers both.
+    assert embeddings.shape[0] == total_chunks, "Mismatch in embedding count!"
+    assert embeddings.shape[1] == 768, "Incorrect embedding dimensions!"
+    squared_norms = np.empty(len(embeddings), dtype=np.float32)
+    for start in range(0, len(embeddings), VALIDATE_BLOCK_ROWS):
+        block = embeddings[start:start + VALIDATE_BLOCK_ROWS]
+        squared_norms[start:start + VALIDATE_BLOCK_ROWS] = np.einsum('ij,ij->i', block, block, dtype=np.float32)
+    assert np.isfinite(squared_norms).all(), "NaN/Inf values found!"
+
+    norms = np.sqrt(squared_norms)
+    assert np.allclose(norms, 1.0, atol=1e-3), "Embeddings not normalized!"
+
+    print(f"[OK] Validation passed")
+    print(f"  L2 norm: {norms.mean():.6f} (should be ~1.0)")
+
+    # Step 4: Save embeddings and metadata
+    print(f"\n[4/4] Saving to {OUTPUT_DIR}...")
+
+    # Embeddings were written in place to the memory-mapped .npy; flush to disk
+    embeddings.flush()
+    embeddings_size_mb = EMBEDDINGS_PATH.stat().st_size / (1024 * 1024)
+    print(f"[OK] Embeddings saved: {EMBEDDINGS_PATH.name} ({embeddings_size_mb:,.2f} MB)")
+
+    # Save metadata (every chunk-store column except the text)
+    metadata_path = OUTPUT_DIR / 'metadata.parquet'
+    pq.write_table(chunks_table.drop_columns(['text']), metadata_path)
+    metadata_size_mb = metadata_path.stat().st_size / (1024 * 1024)
+    print(f"[OK] Metadata saved: {metadata_path.name} ({metadata_size_mb:,.2f} MB)")
+
+    # Save retrieval texts
+    retrieval_path = OUTPUT_DIR / 'retrieval_texts.parquet'
+    pq.write_table(chunks_table.select(['text']), retrieval_path)
+    retrieval_size_mb = retrieval_path.stat().st_size / (1024 * 1024)
+    print(f"[OK] Retrieval texts saved: {retrieval_path.name} ({retrieval_size_mb:,.2f} MB)")
+
+    # Intermediate chunk store is no longer needed
+    del chunks_table, text_column
+    chunks_source.close()
+    CHUNKS_PATH.unlink()
+
+    # Summary
+    print("\n" + "=" * 80)
+    print("EMBEDDING COMPLETE")
+    print("=" * 80)
+
+    print(f"\nStatistics:")
+    print(f"  Total filings: {len(json_files):,}")
+    print(f"  Total chunks: {total_chunks:,}")
+    print(f"  Embedding dimensions: 768")
+    print(f"  Total size: {embeddings_size_mb + metadata_size_mb + retrieval_size_mb:,.2f} MB")
+    print(f"  Device used: {model.device}")
+
+    print(f"\nOutput files:")
+    print(f"  {EMBEDDINGS_PATH}")
+    print(f"  {OUTPUT_DIR / 'metadata.parquet'}")
+    print(f"  {OUTPUT_DIR / 'retrieval_texts.parquet'}")
+
+    print(f"\nNext steps:")
+    print(f"  1. Test RAG: python -m src.pipeline.rag_query --embeddings /app/data/embeddings/2024")
+    print(f"  2. Run ground truth evaluation")
+
+    print("\n" + "=" * 80)
+
+
+if __name__ == '__main__':
+    main()
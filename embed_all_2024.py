@@ -1,10 +1,10 @@
 """
 Embed All 2024 SEC Filings
 
-Generates embeddings for all 26,014 filings from processed_2024_500tok_contextual.json
+Generates embeddings for all 26,014 filings from processed_2024_500tok_contextual.jsonl.zst
 and saves them in parquet format for RAG querying.
 
-Input: notebooks/prototyping/output/processed_2024_500tok_contextual.json
+Input: notebooks/prototyping/output/processed_2024_500tok_contextual.jsonl.zst
 Output: data/embeddings/2024/ (embeddings.parquet + metadata.parquet)
 
 Model: multi-qa-mpnet-base-dot-v1 (768-dim, optimized for Q&A)
@@ -13,16 +13,18 @@ Usage:
     python embed_all_2024.py
 """
 
-import json
+import io
+import orjson
 import sys
 from pathlib import Path
 import numpy as np
 import pandas as pd
+import pyarrow as pa
 from sentence_transformers import SentenceTransformer
 from tqdm import tqdm
 
 # Configuration
-INPUT_FILE = Path('notebooks/prototyping/output/processed_2024_500tok_contextual.json')
+INPUT_FILE = Path('notebooks/prototyping/output/processed_2024_500tok_contextual.jsonl.zst')
 OUTPUT_DIR = Path('data/embeddings/2024')
 MODEL_NAME = 'sentence-transformers/multi-qa-mpnet-base-dot-v1'
 BATCH_SIZE = 32
@@ -37,8 +39,9 @@ if not INPUT_FILE.exists():
     print(f"[ERROR] Input file not found: {INPUT_FILE}")
     sys.exit(1)
 
-with open(INPUT_FILE, 'r', encoding='utf-8') as f:
-    filings = json.load(f)
+# zstd-compressed JSON Lines: one filing per line
+with io.BufferedReader(pa.input_stream(INPUT_FILE, compression='zstd')) as f:
+    filings = [orjson.loads(line) for line in f if line.strip()]
 
 print(f"[OK] Loaded {len(filings):,} filings")
 
@@ -50,24 +53,27 @@ metadata_list = []
 
 for filing in tqdm(filings, desc="Processing filings"):
     file_name = filing['file_name']
+    chunks = filing['chunks']  # One list per field
+    chunk_metadata = filing['chunk_metadata']  # Shared by every chunk of the filing
+    context_header = filing['context_header']  # Stored once, prepended per chunk
 
-    for chunk in filing['chunks']:
-        # Text to embed (extended with context)
-        texts_for_embedding.append(chunk['text_for_embedding'])
+    # Text to embed (document header + extended chunk)
+    texts_for_embedding.extend(context_header + text for text in chunks['extended_text'])
 
-        # Text to store for retrieval (core chunk)
-        texts_for_retrieval.append(chunk['text'])
+    # Text to store for retrieval (core chunk)
+    texts_for_retrieval.extend(chunks['text'])
 
-        # Metadata
+    # Metadata
+    for chunk_index, core_tokens in enumerate(chunks['core_tokens']):
         metadata = {
             'file_name': file_name,
-            'chunk_id': chunk['chunk_id'],
-            'company': chunk['metadata']['company'],
-            'form_type': chunk['metadata']['form_type'],
-            'filing_date': chunk['metadata']['filing_date'],
-            'cik': chunk['metadata']['cik'],
-            'chunk_index': chunk['metadata']['chunk_index'],
-            'core_tokens': chunk['metadata']['core_tokens']
+            'chunk_id': chunk_index,
+            'company': chunk_metadata['company'],
+            'form_type': chunk_metadata['form_type'],
+            'filing_date': chunk_metadata['filing_date'],
+            'cik': chunk_metadata['cik'],
+            'chunk_index': chunk_index,
+            'core_tokens': core_tokens
         }
         metadata_list.append(metadata)
 
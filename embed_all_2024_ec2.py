@@ -1,11 +1,11 @@
 """
 Embed All 2024 SEC Filings - EC2 GPU Version
 
-Generates embeddings for all 26,014 filings from processed_2024_500tok_contextual.json
+Generates embeddings for all 26,014 filings from processed_2024_500tok_contextual.jsonl.zst
 and saves them in parquet format for RAG querying.
 
 **EC2 PATHS:**
-Input: /app/data/processed/2024_filings/processed_2024_500tok_contextual.json
+Input: /app/data/processed/2024_filings/processed_2024_500tok_contextual.jsonl.zst
 Output: /app/data/embeddings/2024/
 
 Model: multi-qa-mpnet-base-dot-v1 (768-dim, optimized for Q&A)
@@ -13,175 +13,385 @@ Device: CUDA GPU (automatic detection)
 
 Usage (inside Docker):
     python /app/embed_all_2024_ec2.py
+
+    # ONNX Runtime on CUDA with an FP16-optimized graph (needs onnxruntime-gpu)
+    EMBED_BACKEND=onnx python /app/embed_all_2024_ec2.py
 """
 
-import json
+import io
+import os
+import queue
+import threading
+
+# Rust fast tokenizer uses all cores; must be set before tokenizers is imported
+os.environ.setdefault('TOKENIZERS_PARALLELISM', 'true')
+
+import orjson
 import sys
 from pathlib import Path
 import numpy as np
-import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from sentence_transformers import SentenceTransformer
 from tqdm import tqdm
 import torch
 
 # Configuration - EC2 PATHS
-INPUT_FILE = Path('/app/data/processed/2024_filings/processed_2024_500tok_contextual.json')
+INPUT_FILE = Path('/app/data/processed/2024_filings/processed_2024_500tok_contextual.jsonl.zst')
 OUTPUT_DIR = Path('/app/data/embeddings/2024')
 MODEL_NAME = 'sentence-transformers/multi-qa-mpnet-base-dot-v1'
-BATCH_SIZE = 128  # Increased for GPU
-
-print("=" * 80)
-print("EMBED ALL 2024 SEC FILINGS - EC2 GPU VERSION")
-print("=" * 80)
-
-# Check GPU availability
-print(f"\n[GPU CHECK]")
-print(f"  CUDA available: {torch.cuda.is_available()}")
-if torch.cuda.is_available():
-    print(f"  GPU: {torch.cuda.get_device_name(0)}")
-    print(f"  GPU Memory: {torch.cuda.get_device_properties(0).total_memory / 1e9:.2f} GB")
-else:
-    print("  WARNING: No GPU detected, will use CPU (slow!)")
-
-# Step 1: Load processed filings
-print(f"\n[1/4] Loading processed filings from {INPUT_FILE}...")
-if not INPUT_FILE.exists():
-    print(f"[ERROR] Input file not found: {INPUT_FILE}")
-    sys.exit(1)
-
-with open(INPUT_FILE, 'r', encoding='utf-8') as f:
-    filings = json.load(f)
-
-print(f"[OK] Loaded {len(filings):,} filings")
-
-# Step 2: Extract chunks for embedding
-print(f"\n[2/4] Extracting chunks...")
-texts_for_embedding = []
-texts_for_retrieval = []
-metadata_list = []
-
-for filing in tqdm(filings, desc="Processing filings"):
-    file_name = filing['file_name']
-
-    for chunk in filing['chunks']:
-        # Text to embed (extended with context)
-        texts_for_embedding.append(chunk['text_for_embedding'])
-
-        # Text to store for retrieval (core chunk)
-        texts_for_retrieval.append(chunk['text'])
-
-        # Metadata
-        metadata = {
-            'file_name': file_name,
-            'chunk_id': chunk['chunk_id'],
-            'company': chunk['metadata']['company'],
-            'form_type': chunk['metadata']['form_type'],
-            'filing_date': chunk['metadata']['filing_date'],
-            'cik': chunk['metadata']['cik'],
-            'chunk_index': chunk['metadata']['chunk_index'],
-            'core_tokens': chunk['metadata']['core_tokens']
-        }
-        metadata_list.append(metadata)
-
-total_chunks = len(texts_for_embedding)
-print(f"\n[OK] Extracted {total_chunks:,} chunks")
-print(f"  Avg chunks per filing: {total_chunks / len(filings):.1f}")
-
-# Step 3: Generate embeddings
-print(f"\n[3/4] Generating embeddings...")
-print(f"  Model: {MODEL_NAME}")
-print(f"  Batch size: {BATCH_SIZE}")
-if torch.cuda.is_available():
-    print(f"  Using GPU - Expected time: 30-60 minutes")
-else:
-    print(f"  Using CPU - Expected time: 8-10 hours")
-print()
-
-# Load model
-print(f"[INFO] Loading embedding model...")
-model = SentenceTransformer(MODEL_NAME)
-print(f"[OK] Model loaded")
-print(f"  Dimensions: {model.get_sentence_embedding_dimension()}")
-print(f"  Max sequence length: {model.max_seq_length}")
-print(f"  Device: {model.device}\n")
-
-# Generate embeddings with progress bar
-embeddings = model.encode(
-    texts_for_embedding,
-    batch_size=BATCH_SIZE,
-    show_progress_bar=True,
-    convert_to_numpy=True,
-    normalize_embeddings=True,  # Important for dot-product similarity
-    device=None  # Auto-detect GPU
-)
-
-print(f"\n[OK] Embeddings generated")
-print(f"  Shape: {embeddings.shape}")
-print(f"  Expected: ({total_chunks:,}, 768)")
-
-# Validation
-assert embeddings.shape[0] == total_chunks, "Mismatch in embedding count!"
-assert embeddings.shape[1] == 768, "Incorrect embedding dimensions!"
-assert not np.isnan(embeddings).any(), "NaN values found!"
-assert not np.isinf(embeddings).any(), "Inf values found!"
-
-norms = np.linalg.norm(embeddings, axis=1)
-assert np.allclose(norms, 1.0, atol=1e-6), "Embeddings not normalized!"
-
-print(f"[OK] Validation passed")
-print(f"  L2 norm: {norms.mean():.6f} (should be ~1.0)")
-
-# Step 4: Save embeddings and metadata
-print(f"\n[4/4] Saving to {OUTPUT_DIR}...")
-OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-
-# Save embeddings as parquet
-embeddings_df = pd.DataFrame(embeddings)
-embeddings_path = OUTPUT_DIR / 'embeddings.parquet'
-embeddings_df.to_parquet(embeddings_path, index=False)
-
-embeddings_size_mb = embeddings_path.stat().st_size / (1024 * 1024)
-print(f"[OK] Embeddings saved: {embeddings_path.name}")
-print(f"  Size: {embeddings_size_mb:,.2f} MB")
-
-# Save metadata as parquet
-metadata_df = pd.DataFrame(metadata_list)
-metadata_path = OUTPUT_DIR / 'metadata.parquet'
-metadata_df.to_parquet(metadata_path, index=False)
-
-metadata_size_mb = metadata_path.stat().st_size / (1024 * 1024)
-print(f"[OK] Metadata saved: {metadata_path.name}")
-print(f"  Size: {metadata_size_mb:,.2f} MB")
-
-# Save retrieval texts as parquet (for RAG queries)
-retrieval_df = pd.DataFrame({'text': texts_for_retrieval})
-retrieval_path = OUTPUT_DIR / 'retrieval_texts.parquet'
-retrieval_df.to_parquet(retrieval_path, index=False)
-
-retrieval_size_mb = retrieval_path.stat().st_size / (1024 * 1024)
-print(f"[OK] Retrieval texts saved: {retrieval_path.name}")
-print(f"  Size: {retrieval_size_mb:,.2f} MB")
-
-# Summary
-print("\n" + "=" * 80)
-print("EMBEDDING COMPLETE")
-print("=" * 80)
-
-print(f"\nStatistics:")
-print(f"  Total filings: {len(filings):,}")
-print(f"  Total chunks: {total_chunks:,}")
-print(f"  Embedding dimensions: 768")
-print(f"  Total size: {embeddings_size_mb + metadata_size_mb + retrieval_size_mb:,.2f} MB")
-print(f"  Device used: {model.device}")
-
-print(f"\nOutput files:")
-print(f"  {OUTPUT_DIR / 'embeddings.parquet'}")
-print(f"  {OUTPUT_DIR / 'metadata.parquet'}")
-print(f"  {OUTPUT_DIR / 'retrieval_texts.parquet'}")
-
-print(f"\nNext steps:")
-print(f"  1. Test RAG queries with: python -m src.pipeline.rag_query --embeddings /app/data/embeddings/2024")
-print(f"  2. Run ground truth evaluation")
-print(f"  3. Compare with baseline results")
-
-print("\n" + "=" * 80)
+BATCH_SIZE = 256  # FP16 on GPU leaves room for larger batches
+MAX_SEQ_LENGTH = 512  # Chunks are ~500 tokens; caps padding per batch
+TOKENIZE_BATCH = 10_000  # Texts tokenized per call when measuring lengths
+ENCODE_CHUNK_SIZE = 50_000  # Texts encoded and written to parquet per shard
+
+# Inference backend: 'torch' (FP16 PyTorch) or 'onnx' (ONNX Runtime CUDA, O4 = fused FP16 graph)
+EMBED_BACKEND = os.getenv('EMBED_BACKEND', 'torch')
+ONNX_MODEL_DIR = Path('/app/models/multi-qa-mpnet-base-dot-v1-onnx')
+ONNX_OPTIMIZATION = 'O4'
+ONNX_MODEL_FILE = f'onnx/model_{ONNX_OPTIMIZATION}.onnx'
+
+# Metadata is accumulated column-by-column (one list per field) rather than as
+# one dict per chunk; low-cardinality string columns are dictionary-encoded
+METADATA_SCHEMA = pa.schema([
+    ('file_name', pa.string()),
+    ('chunk_id', pa.int32()),
+    ('company', pa.string()),
+    ('form_type', pa.string()),
+    ('filing_date', pa.string()),
+    ('cik', pa.string()),
+    ('chunk_index', pa.int32()),
+    ('core_tokens', pa.int32()),
+])
+DICTIONARY_COLUMNS = ['file_name', 'company', 'form_type', 'filing_date', 'cik']
+
+
+def load_onnx_fp16_model():
+    """
+    Load the model on ONNX Runtime (CUDA) with an O4-optimized FP16 graph.
+
+    O4 fuses attention/GELU/LayerNorm kernels and converts weights to FP16.
+    The export runs once and is cached in ONNX_MODEL_DIR.
+    """
+    from sentence_transformers import export_optimized_onnx_model
+
+    model_kwargs = {'provider': 'CUDAExecutionProvider'}
+    if not (ONNX_MODEL_DIR / ONNX_MODEL_FILE).exists():
+        print(f"[INFO] Exporting {MODEL_NAME} to ONNX + {ONNX_OPTIMIZATION} optimization...")
+        onnx_model = SentenceTransformer(MODEL_NAME, backend='onnx', model_kwargs=model_kwargs)
+        onnx_model.save_pretrained(str(ONNX_MODEL_DIR))
+        export_optimized_onnx_model(onnx_model, ONNX_OPTIMIZATION, str(ONNX_MODEL_DIR))
+        print(f"[OK] Optimized model cached: {ONNX_MODEL_DIR / ONNX_MODEL_FILE}")
+
+    return SentenceTransformer(
+        str(ONNX_MODEL_DIR),
+        backend='onnx',
+        model_kwargs={**model_kwargs, 'file_name': ONNX_MODEL_FILE}
+    )
+
+
+def write_shards(writer, shard_queue, errors):
+    """
+    Writer thread: drain encoded shards from shard_queue into the parquet file.
+
+    Runs while the main thread encodes the next shard, so disk I/O overlaps
+    GPU compute. A None item ends the thread; a write failure is recorded in
+    errors and the queue is still drained so the encoder never blocks.
+    """
+    schema = writer.schema
+    embedding_dim = schema.field(0).type.list_size
+    while (shard := shard_queue.get()) is not None:
+        if errors:
+            continue
+        try:
+            values = pa.array(shard.astype(np.float16).reshape(-1), type=pa.float16())
+            writer.write_table(
+                pa.table({'emb': pa.FixedSizeListArray.from_arrays(values, embedding_dim)}, schema=schema),
+                row_group_size=4096
+            )
+        except Exception as e:
+            errors.append(e)
+
+
+def main():
+    """Stream the processed filings, embed every chunk, and save embeddings and metadata"""
+    print("=" * 80)
+    print("EMBED ALL 2024 SEC FILINGS - EC2 GPU VERSION")
+    print("=" * 80)
+
+    # Check GPU availability (probed once; reused for model placement and encode)
+    HAS_CUDA = torch.cuda.is_available()
+    DEVICE = 'cuda' if HAS_CUDA else 'cpu'
+    print(f"\n[GPU CHECK]")
+    print(f"  CUDA available: {HAS_CUDA}")
+    if HAS_CUDA:
+        print(f"  GPU: {torch.cuda.get_device_name(0)}")
+        print(f"  GPU Memory: {torch.cuda.get_device_properties(0).total_memory / 1e9:.2f} GB")
+    else:
+        print("  WARNING: No GPU detected, will use CPU (slow!)")
+
+    # Step 1 + 2: Stream processed filings and extract chunks for embedding
+    # The input is zstd-compressed JSON Lines (one filing per line), decompressed and
+    # parsed one filing at a time, so the full document is never held in memory next
+    # to the extracted lists
+    print(f"\n[1/4] Streaming processed filings from {INPUT_FILE}...")
+    if not INPUT_FILE.exists():
+        print(f"[ERROR] Input file not found: {INPUT_FILE}")
+        sys.exit(1)
+
+    print(f"\n[2/4] Extracting chunks...")
+    texts_for_embedding = []
+    texts_for_retrieval = []
+    metadata_columns = {column: [] for column in METADATA_SCHEMA.names}
+    num_filings = 0
+
+    with io.BufferedReader(pa.input_stream(INPUT_FILE, compression='zstd')) as f:
+        for line in tqdm(f, desc="Processing filings"):
+            if not line.strip():
+                continue
+            filing = orjson.loads(line)
+            num_filings += 1
+
+            # Chunks are stored column-wise, so each field is extended once per
+            # filing; filing-level values repeat once per chunk
+            chunks = filing['chunks']
+            chunk_metadata = filing['chunk_metadata']
+            context_header = filing['context_header']
+            num_chunks = filing['num_chunks']
+
+            # Text to embed (document header + extended chunk) and core text for retrieval
+            texts_for_embedding.extend(context_header + text for text in chunks['extended_text'])
+            texts_for_retrieval.extend(chunks['text'])
+
+            # Metadata
+            metadata_columns['file_name'].extend([filing['file_name']] * num_chunks)
+            metadata_columns['chunk_id'].extend(range(num_chunks))
+            metadata_columns['company'].extend([chunk_metadata['company']] * num_chunks)
+            metadata_columns['form_type'].extend([chunk_metadata['form_type']] * num_chunks)
+            metadata_columns['filing_date'].extend([chunk_metadata['filing_date']] * num_chunks)
+            metadata_columns['cik'].extend([chunk_metadata['cik']] * num_chunks)
+            metadata_columns['chunk_index'].extend(range(num_chunks))
+            metadata_columns['core_tokens'].extend(chunks['core_tokens'])
+
+    total_chunks = len(texts_for_embedding)
+    print(f"\n[OK] Extracted {total_chunks:,} chunks from {num_filings:,} filings")
+    print(f"  Avg chunks per filing: {total_chunks / num_filings:.1f}")
+
+    # Step 3: Generate embeddings
+    print(f"\n[3/4] Generating embeddings...")
+    print(f"  Model: {MODEL_NAME}")
+    print(f"  Batch size: {BATCH_SIZE}")
+    print(f"  Backend: {EMBED_BACKEND}")
+    if HAS_CUDA:
+        print(f"  Using GPU - Expected time: 30-60 minutes")
+    else:
+        print(f"  Using CPU - Expected time: 8-10 hours")
+    print()
+
+    # Load model
+    print(f"[INFO] Loading embedding model...")
+    if EMBED_BACKEND == 'onnx' and not HAS_CUDA:
+        # The O4 FP16 graph only runs on CUDA
+        print(f"[WARN] EMBED_BACKEND=onnx needs a GPU, falling back to torch")
+    if EMBED_BACKEND == 'onnx' and HAS_CUDA:
+        model = load_onnx_fp16_model()
+        precision = 'fp16 (onnx O4)'
+        encode_device = None  # ONNX Runtime runs on its own execution provider
+    else:
+        model = SentenceTransformer(MODEL_NAME, device=DEVICE)
+        precision = 'fp32'
+        encode_device = DEVICE
+        if HAS_CUDA:
+            # FP16 weights run on tensor cores at half the memory traffic; normalized
+            # dot-product retrieval is insensitive to the lost precision
+            model = model.half().to(DEVICE)
+            precision = 'fp16'
+    model.max_seq_length = MAX_SEQ_LENGTH
+    print(f"[OK] Model loaded")
+    print(f"  Dimensions: {model.get_sentence_embedding_dimension()}")
+    print(f"  Max sequence length: {model.max_seq_length}")
+    print(f"  Device: {model.device}")
+    print(f"  Precision: {precision}")
+    print(f"  Fast tokenizer: {model.tokenizer.is_fast}\n")
+    if not model.tokenizer.is_fast:
+        print(f"[WARN] Slow Python tokenizer loaded - install 'tokenizers' for the Rust fast tokenizer")
+
+    # Deduplicate identical texts (boilerplate repeated across filings): map every
+    # chunk to the id of its first identical text so each unique text is encoded once
+    unique_ids = {}
+    text_ids = np.fromiter(
+        (unique_ids.setdefault(text, len(unique_ids)) for text in texts_for_embedding),
+        dtype=np.int64,
+        count=total_chunks
+    )
+    unique_texts = list(unique_ids)
+    del unique_ids
+    num_unique = len(unique_texts)
+    print(f"[INFO] Unique chunk texts: {num_unique:,} of {total_chunks:,} ({(1 - num_unique / total_chunks) * 100:.1f}% duplicates skipped)")
+
+    # Sort by token length so each batch pads to a similar sequence length
+    # (the fast tokenizer is multi-threaded; input ids are discarded per slice)
+    print(f"[INFO] Measuring token lengths...")
+    token_lengths = np.empty(num_unique, dtype=np.int32)
+    for start in range(0, num_unique, TOKENIZE_BATCH):
+        token_lengths[start:start + TOKENIZE_BATCH] = model.tokenizer(
+            unique_texts[start:start + TOKENIZE_BATCH],
+            padding=False,
+            return_length=True,
+            truncation=True,
+            max_length=MAX_SEQ_LENGTH
+        )['length']
+    # Primary key token length, secondary key text id: duplicates end up adjacent
+    length_order = np.lexsort((text_ids, token_lengths[text_ids]))
+    print(f"  Mean tokens per unique chunk: {token_lengths.mean():.0f}\n")
+
+    # Embeddings are streamed to parquet shard by shard (one FixedSizeList<float16>
+    # column), so the full (N, 768) matrix is never held in memory. Rows are written
+    # in length order; metadata and retrieval texts are written in the same order.
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    embedding_dim = model.get_sentence_embedding_dimension()
+    embeddings_schema = pa.schema([('emb', pa.list_(pa.float16(), embedding_dim))])
+    embeddings_path = OUTPUT_DIR / 'embeddings.parquet'
+
+    gpu_count = torch.cuda.device_count() if EMBED_BACKEND != 'onnx' else 0
+    pool = None
+    if gpu_count > 1:
+        # One worker process per GPU; each shard is split evenly across them
+        target_devices = [f'cuda:{i}' for i in range(gpu_count)]
+        print(f"[INFO] Multi-GPU encoding on {gpu_count} devices: {', '.join(target_devices)}")
+        pool = model.start_multi_process_pool(target_devices=target_devices)
+
+    rows_written = 0
+    rows_encoded = 0
+    norm_sum = 0.0
+    with pq.ParquetWriter(
+        embeddings_path,
+        embeddings_schema,
+        compression='zstd',
+        compression_level=3,
+        use_dictionary=False
+    ) as writer:
+        # At most two encoded shards wait for the writer thread (bounds memory)
+        shard_queue = queue.Queue(maxsize=2)
+        write_errors = []
+        writer_thread = threading.Thread(target=write_shards, args=(writer, shard_queue, write_errors))
+        writer_thread.start()
+        try:
+            for start in tqdm(range(0, total_chunks, ENCODE_CHUNK_SIZE), desc="Encoding shards"):
+                if write_errors:
+                    break
+                # Encode each run of identical texts once, then repeat rows to the shard
+                shard_ids = text_ids[length_order[start:start + ENCODE_CHUNK_SIZE]]
+                run_starts = np.empty(len(shard_ids), dtype=bool)
+                run_starts[0] = True
+                np.not_equal(shard_ids[1:], shard_ids[:-1], out=run_starts[1:])
+                shard_texts = [unique_texts[i] for i in shard_ids[run_starts]]
+
+                if pool is not None:
+                    shard = model.encode_multi_process(
+                        shard_texts,
+                        pool,
+                        batch_size=BATCH_SIZE,
+                        chunk_size=-(-len(shard_texts) // gpu_count),
+                        normalize_embeddings=True
+                    )
+                else:
+                    shard = model.encode(
+                        shard_texts,
+                        batch_size=BATCH_SIZE,
+                        show_progress_bar=False,
+                        convert_to_numpy=True,
+                        normalize_embeddings=True,  # Important for dot-product similarity
+                        device=encode_device
+                    )
+
+                # Validation in one pass: NaN/Inf propagate into the squared norm, so a
+                # finite check on the (rows,) result covers all three conditions.
+                # Accumulated in float32; FP16 inference is accurate to ~1e-3 in norm.
+                assert shard.shape == (len(shard_texts), 768), "Incorrect embedding dimensions!"
+                squared_norms = np.einsum('ij,ij->i', shard, shard, dtype=np.float32)
+                assert np.isfinite(squared_norms).all(), "NaN/Inf values found!"
+                assert np.abs(squared_norms - 1.0).max() < 2e-3, "Embeddings not normalized!"
+                norm_sum += float(np.sqrt(squared_norms).sum())
+                rows_encoded += len(shard)
+
+                shard = shard[np.cumsum(run_starts) - 1]
+                shard_queue.put(shard)
+                rows_written += len(shard)
+        finally:
+            shard_queue.put(None)
+            writer_thread.join()
+
+    if write_errors:
+        raise write_errors[0]
+
+    if pool is not None:
+        model.stop_multi_process_pool(pool)
+    del token_lengths, unique_texts, text_ids
+
+    assert rows_written == total_chunks, "Mismatch in embedding count!"
+
+    print(f"\n[OK] Embeddings generated")
+    print(f"  Shape: ({rows_written:,}, {embedding_dim})")
+    print(f"  Expected: ({total_chunks:,}, 768)")
+    print(f"[OK] Validation passed")
+    print(f"  Texts encoded: {rows_encoded:,} (duplicates reuse their embedding)")
+    print(f"  L2 norm: {norm_sum / rows_encoded:.6f} (should be ~1.0)")
+
+    embeddings_size_mb = embeddings_path.stat().st_size / (1024 * 1024)
+    print(f"[OK] Embeddings saved: {embeddings_path.name}")
+    print(f"  Size: {embeddings_size_mb:,.2f} MB")
+
+    # Step 4: Save metadata and retrieval texts
+    print(f"\n[4/4] Saving to {OUTPUT_DIR}...")
+    row_order = pa.array(length_order)
+
+    # Save metadata as parquet (built straight from the column lists)
+    metadata_table = pa.Table.from_pydict(metadata_columns, schema=METADATA_SCHEMA).take(row_order)
+    metadata_path = OUTPUT_DIR / 'metadata.parquet'
+    pq.write_table(metadata_table, metadata_path, use_dictionary=DICTIONARY_COLUMNS)
+    del metadata_columns
+
+    metadata_size_mb = metadata_path.stat().st_size / (1024 * 1024)
+    print(f"[OK] Metadata saved: {metadata_path.name}")
+    print(f"  Size: {metadata_size_mb:,.2f} MB")
+
+    # Save retrieval texts as parquet (for RAG queries)
+    # large_string: 64-bit offsets, since the whole column can exceed 2 GB of text
+    retrieval_table = pa.table({'text': pa.array(texts_for_retrieval, type=pa.large_string())}).take(row_order)
+    del texts_for_retrieval
+    retrieval_path = OUTPUT_DIR / 'retrieval_texts.parquet'
+    pq.write_table(retrieval_table, retrieval_path, compression='zstd', compression_level=6)
+    del retrieval_table
+
+    retrieval_size_mb = retrieval_path.stat().st_size / (1024 * 1024)
+    print(f"[OK] Retrieval texts saved: {retrieval_path.name}")
+    print(f"  Size: {retrieval_size_mb:,.2f} MB")
+
+    # Summary
+    print("\n" + "=" * 80)
+    print("EMBEDDING COMPLETE")
+    print("=" * 80)
+
+    print(f"\nStatistics:")
+    print(f"  Total filings: {num_filings:,}")
+    print(f"  Total chunks: {total_chunks:,}")
+    print(f"  Embedding dimensions: 768")
+    print(f"  Total size: {embeddings_size_mb + metadata_size_mb + retrieval_size_mb:,.2f} MB")
+    print(f"  Device used: {model.device}")
+
+    print(f"\nOutput files:")
+    print(f"  {OUTPUT_DIR / 'embeddings.parquet'}")
+    print(f"  {OUTPUT_DIR / 'metadata.parquet'}")
+    print(f"  {OUTPUT_DIR / 'retrieval_texts.parquet'}")
+
+    print(f"\nNext steps:")
+    print(f"  1. Test RAG queries with: python -m src.pipeline.rag_query --embeddings /app/data/embeddings/2024")
+    print(f"  2. Run ground truth evaluation")
+    print(f"  3. Compare with baseline results")
+
+    print("\n" + "=" * 80)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,20 +6,36 @@ Usage:
 """
 
 import base64
+import hashlib
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 import requests
 from pathlib import Path
 
-def mermaid_to_png(mermaid_file: Path, output_file: Path):
-    """Convert mermaid file to PNG using mermaid.ink API."""
+# Concurrent kroki.io requests
+MAX_WORKERS = 4
+
+def mermaid_to_png(mermaid_file: Path, output_file: Path, session=None):
+    """
+    Convert mermaid file to PNG using mermaid.ink API.
+
+    Skipped when the PNG was already rendered from identical mermaid source
+    (SHA-256 of the source is stored next to the PNG as <name>.png.sha).
+    """
 
     # Read mermaid code
     with open(mermaid_file, 'r', encoding='utf-8') as f:
         mermaid_code = f.read()
 
+    # Skip unchanged diagrams
+    sha = hashlib.sha256(mermaid_code.encode('utf-8')).hexdigest()
+    sha_file = output_file.with_name(output_file.name + '.sha')
+    if output_file.exists() and sha_file.exists() and sha_file.read_text(encoding='utf-8').strip() == sha:
+        print(f"[SKIP] {output_file.name} is up to date")
+        return
+
     # Create JSON payload for kroki.io (alternative to mermaid.ink)
     # Use kroki.io which is more reliable
-    import json
-    import zlib
 
     # Compress and encode
     compressed = zlib.compress(mermaid_code.encode('utf-8'), 9)
@@ -29,11 +45,12 @@ def mermaid_to_png(mermaid_file: Path, output_file: Path):
     url = f"https://kroki.io/mermaid/png/{encoded}"
 
     print(f"Generating {output_file.name}...")
-    response = requests.get(url)
+    response = (session or requests).get(url)
 
     if response.status_code == 200:
         with open(output_file, 'wb') as f:
             f.write(response.content)
+        sha_file.write_text(sha, encoding='utf-8')
         print(f"[OK] Created {output_file.name}")
     else:
         print(f"[FAIL] Failed to generate {output_file.name}: {response.status_code}")
@@ -48,14 +65,19 @@ def main():
         ('data_processing_workflow.mmd', 'data_processing_workflow.png'),
     ]
 
+    tasks = []
     for mmd_file, png_file in diagrams:
         mermaid_path = diagrams_dir / mmd_file
         output_path = diagrams_dir / png_file
 
         if mermaid_path.exists():
-            mermaid_to_png(mermaid_path, output_path)
+            tasks.append((mermaid_path, output_path))
         else:
             print(f"[WARN] {mmd_file} not found")
 
+    # Render concurrently over one keep-alive session
+    with requests.Session() as session, ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        list(executor.map(lambda task: mermaid_to_png(*task, session=session), tasks))
+
 if __name__ == '__main__':
     main()
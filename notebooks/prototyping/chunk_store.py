@@ -0,0 +1,271 @@
+"""
+Columnar chunk store for the prototyping review tools
+
+Flattens output/processed_samples_{size}tok.json(l) into one parquet dataset
+(one row per chunk, hive-partitioned by size=) so the comparison generators
+can pull a single filing's chunks without parsing a whole JSON file.
+
+Usage: python chunk_store.py   (one-time build; re-run after reprocessing, until
+       then the stale sizes are read from the samples files)
+"""
+
+import json
+import mmap
+import pickle
+import re
+from functools import lru_cache
+from pathlib import Path
+import orjson
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+SAMPLES_DIR = Path('output')
+CHUNK_STORE = SAMPLES_DIR / 'chunk_store'
+SAMPLES_FILE_RE = re.compile(r'processed_samples_(\d+)tok\.jsonl?$')
+# Whitespace and commas between filings in the top-level JSON array
+SEPARATOR_RE = re.compile(r'[\s,]*')
+
+# Rows are written sorted by filing_idx, so row-group statistics let a
+# filing_idx filter skip everything but the row groups holding that filing
+ROW_GROUP_SIZE = 8192
+
+# Interactive review sessions revisit the same files and filings; indexes and
+# parsed filings are memoized per (path, mtime), so edits to a file invalidate them
+INDEX_CACHE_SIZE = 16
+FILING_CACHE_SIZE = 16
+
+CHUNK_STORE_SCHEMA = pa.schema([
+    ('size', pa.int32()),
+    ('filing_idx', pa.int32()),
+    ('chunk_idx', pa.int32()),
+    ('text', pa.large_string()),
+    ('file_name', pa.string()),
+    ('num_chunks', pa.int32()),
+    ('total_tokens', pa.int64()),
+    ('metadata', pa.string()),  # Filing metadata dict, JSON-encoded
+])
+
+
+def samples_path(size):
+    """
+    Path of the processed samples for one chunk size
+
+    Prefers the JSON Lines file (one filing per line) when it exists,
+    otherwise the older single JSON array.
+    """
+    jsonl_path = SAMPLES_DIR / f'processed_samples_{size}tok.jsonl'
+    if jsonl_path.exists():
+        return jsonl_path
+    return SAMPLES_DIR / f'processed_samples_{size}tok.json'
+
+
+def ensure_index(path):
+    """
+    Byte spans of every filing in a processed-samples file (.json or .jsonl)
+
+    Built once by walking the file and saved next to it as a .idx sidecar
+    (a pickled list of (start, end) byte offsets); rebuilt when the JSON is
+    newer than the index.
+
+    Returns:
+        list of (start, end) tuples, one per filing
+    """
+    return _load_index(str(path), path.stat().st_mtime_ns)
+
+
+@lru_cache(maxsize=INDEX_CACHE_SIZE)
+def _load_index(path_str, mtime_ns):
+    """Load or build the offset index of one version (mtime) of a samples file"""
+    path = Path(path_str)
+    idx_path = path.with_suffix('.idx')
+    if idx_path.exists() and idx_path.stat().st_mtime >= path.stat().st_mtime:
+        with open(idx_path, 'rb') as f:
+            return pickle.load(f)
+
+    print(f"[INFO] Indexing {path.name} (one-time)...")
+    if path.suffix == '.jsonl':
+        spans = _index_lines(path)
+    else:
+        spans = _index_array(path)
+
+    with open(idx_path, 'wb') as f:
+        pickle.dump(spans, f)
+    print(f"[OK] Indexed {len(spans):,} filings -> {idx_path.name}")
+    return spans
+
+
+def _index_lines(path):
+    """Byte spans of the non-empty lines of a JSON Lines file"""
+    spans = []
+    start = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                spans.append((start, start + len(line)))
+            start += len(line)
+    return spans
+
+
+def _index_array(path):
+    """Byte spans of the items of a top-level JSON array"""
+    text = path.read_bytes().decode('utf-8')
+    decoder = json.JSONDecoder()
+    spans = []
+
+    # Walk the array with raw_decode, tracking byte offsets alongside str offsets
+    pos = text.index('[') + 1
+    byte_pos = len(text[:pos].encode('utf-8'))
+    while True:
+        next_pos = SEPARATOR_RE.match(text, pos).end()
+        byte_pos += len(text[pos:next_pos].encode('utf-8'))
+        pos = next_pos
+        if pos >= len(text) or text[pos] == ']':
+            break
+
+        _, end = decoder.raw_decode(text, pos)
+        byte_end = byte_pos + len(text[pos:end].encode('utf-8'))
+        spans.append((byte_pos, byte_end))
+        pos, byte_pos = end, byte_end
+
+    return spans
+
+
+def read_filing(path, filing_idx):
+    """
+    Read one filing from a processed-samples file via its byte-offset index
+
+    Only that filing's bytes are read (through mmap) and parsed; repeat
+    reads of the same filing are served from an in-process cache.
+
+    Returns:
+        The filing dict (shared with the cache; do not modify), or None if
+        the file has fewer filings
+    """
+    return _read_filing_cached(str(path), path.stat().st_mtime_ns, filing_idx)
+
+
+@lru_cache(maxsize=FILING_CACHE_SIZE)
+def _read_filing_cached(path_str, mtime_ns, filing_idx):
+    """Parse one filing of one version (mtime) of a samples file"""
+    return next(read_filings(Path(path_str), [filing_idx]))
+
+
+def read_filings(path, filing_indices):
+    """
+    Read several filings through one mmap of a processed-samples file
+
+    The index is loaded and the file mapped once; each filing is a single
+    slice + parse, so sampling k filings costs k seeks, not a full pass.
+
+    Yields:
+        The filing dict for each index, or None past the end of the file
+    """
+    spans = ensure_index(path)
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for filing_idx in filing_indices:
+            if not 0 <= filing_idx < len(spans):
+                yield None
+                continue
+            start, end = spans[filing_idx]
+            yield orjson.loads(mm[start:end])
+
+
+def store_partition(size):
+    """
+    Chunk-store parquet file for one chunk size, or None when it is missing or stale
+
+    A partition older than its processed-samples file (reprocessed since the
+    last build) is not used, like a stale .idx sidecar.
+    """
+    partition_path = CHUNK_STORE / f'size={size}' / 'chunks.parquet'
+    if not partition_path.exists():
+        return None
+    source = samples_path(size)
+    if source.exists() and source.stat().st_mtime > partition_path.stat().st_mtime:
+        return None
+    return partition_path
+
+
+def load_filing(size, filing_idx):
+    """
+    Load one filing at one chunk size
+
+    Reads from the parquet chunk store when it has been built since the
+    processed samples were last written, otherwise reads the filing from the
+    processed-samples JSON via its offset index.
+
+    Returns:
+        dict with file_name, metadata, num_chunks, total_tokens and chunks
+        (each chunk a {'text': ...} dict), or None if the filing does not exist
+    """
+    partition_path = store_partition(size)
+    if partition_path is not None:
+        table = pq.read_table(partition_path, filters=pc.field('filing_idx') == filing_idx)
+        if table.num_rows == 0:
+            return None
+
+        table = table.sort_by('chunk_idx')
+        return {
+            'file_name': table['file_name'][0].as_py(),
+            'metadata': orjson.loads(table['metadata'][0].as_py()),
+            'num_chunks': table['num_chunks'][0].as_py(),
+            'total_tokens': table['total_tokens'][0].as_py(),
+            'chunks': [{'text': text} for text in table['text'].to_pylist()],
+        }
+
+    if not samples_path(size).exists():
+        return None
+    return read_filing(samples_path(size), filing_idx)
+
+
+def build_chunk_store():
+    """Flatten every processed_samples_{size}tok.json(l) into the parquet chunk store"""
+    sizes = sorted({
+        int(match.group(1))
+        for path in SAMPLES_DIR.glob('processed_samples_*tok.json*')
+        if (match := SAMPLES_FILE_RE.search(path.name))
+    })
+    if not sizes:
+        print(f"[ERROR] No processed_samples_*tok.json(l) files found in {SAMPLES_DIR}")
+        return
+
+    for size in sizes:
+        path = samples_path(size)
+        print(f"[INFO] Flattening {path.name}...")
+        columns = {name: [] for name in CHUNK_STORE_SCHEMA.names}
+
+        if path.suffix == '.jsonl':
+            with open(path, 'rb') as f:
+                filings = [orjson.loads(line) for line in f if line.strip()]
+        else:
+            filings = orjson.loads(path.read_bytes())
+
+        for filing_idx, filing in enumerate(filings):
+            metadata = orjson.dumps(filing.get('metadata', {})).decode('utf-8')
+            for chunk_idx, chunk in enumerate(filing['chunks']):
+                columns['size'].append(size)
+                columns['filing_idx'].append(filing_idx)
+                columns['chunk_idx'].append(chunk_idx)
+                columns['text'].append(chunk['text'])
+                columns['file_name'].append(filing['file_name'])
+                columns['num_chunks'].append(filing['num_chunks'])
+                columns['total_tokens'].append(filing['total_tokens'])
+                columns['metadata'].append(metadata)
+
+        table = pa.Table.from_pydict(columns, schema=CHUNK_STORE_SCHEMA)
+        partition_dir = CHUNK_STORE / f'size={size}'
+        partition_dir.mkdir(parents=True, exist_ok=True)
+        pq.write_table(
+            table.drop_columns(['size']),
+            partition_dir / 'chunks.parquet',
+            row_group_size=ROW_GROUP_SIZE,
+            compression='zstd'
+        )
+        print(f"[OK] size={size}: {table.num_rows:,} chunks")
+
+    print(f"\n[OK] Chunk store written to {CHUNK_STORE}")
+
+
+if __name__ == '__main__':
+    build_chunk_store()
@@ -3,8 +3,8 @@ Generate chunk comparison HTML from actual processed data
 NO conclusions - just shows you the chunks so YOU can evaluate
 """
 
-import json
 from pathlib import Path
+from chunk_store import load_filing
 
 def generate_comparison_html(filing_idx=0, chunk_pct=0.4):
     """
@@ -23,21 +23,12 @@ def generate_comparison_html(filing_idx=0, chunk_pct=0.4):
     print(f"[INFO] Loading chunks from filing {filing_idx} at ~{chunk_pct*100:.0f}% through document...\n")
 
     for size in sizes_to_compare:
-        file_path = Path(f'output/processed_samples_{size}tok.json')
+        filing = load_filing(size, filing_idx)
 
-        if not file_path.exists():
-            print(f"[ERROR] File not found: {file_path}")
+        if filing is None:
+            print(f"[ERROR] Filing {filing_idx} not found for {size} tokens (output/processed_samples_{size}tok.json)")
             return
 
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        if filing_idx >= len(data):
-            print(f"[ERROR] Filing index {filing_idx} out of range (max: {len(data)-1})")
-            return
-
-        filing = data[filing_idx]
-
         # Calculate chunk index based on percentage through document
         actual_chunk_idx = int(chunk_pct * filing['num_chunks'])
         # Ensure it's within bounds
@@ -63,7 +54,7 @@ def generate_comparison_html(filing_idx=0, chunk_pct=0.4):
         }
 
     # Generate HTML
-    html = f"""<!DOCTYPE html>
+    parts = [f"""<!DOCTYPE html>
 <html>
 <head>
     <title>Chunk Size Comparison - Real Data</title>
@@ -205,7 +196,7 @@ def generate_comparison_html(filing_idx=0, chunk_pct=0.4):
         <strong>📁 File:</strong> {chunks_by_size[200]['file_name']}<br>
         <strong>📍 Document Position:</strong> ~{chunk_pct*100:.0f}% through filing (comparing same location across sizes)
     </div>
-"""
+"""]
 
     # Add each chunk size
     for size in sizes_to_compare:
@@ -213,19 +204,22 @@ def generate_comparison_html(filing_idx=0, chunk_pct=0.4):
         word_count = len(data['content'].split())
         char_count = len(data['content'])
 
-        html += f"""
+        # Truncate if too long
+        display_content = data['content'][:3000] + "..." if char_count > 3000 else data['content']
+
+        parts.append(f"""
     <div class="chunk-container">
         <div class="chunk-header">🔹 {size} TOKENS</div>
-        <div class="content">{data['content'][:3000]}{"..." if len(data['content']) > 3000 else ""}</div>
+        <div class="content">{display_content}</div>
         <div class="stats">
             📏 <strong>Size:</strong> {size} tokens (~{word_count} words, {char_count:,} characters)<br>
             📊 <strong>Chunk:</strong> {data['chunk_index'] + 1} of {data['total_chunks']}<br>
             📈 <strong>Filing total:</strong> {data['total_tokens']:,} tokens
         </div>
     </div>
-"""
+""")
 
-    html += """
+    parts.append("""
     <div style="background: #f0f0f0; padding: 20px; border-radius: 5px; margin-top: 30px;">
         <h2>🎯 Summary - Which Size Works Best?</h2>
         <textarea id="final_summary" placeholder="After reviewing all 4 sizes, write your conclusion here:&#10;&#10;- Which size felt most complete and coherent?&#10;- Which was too fragmented?&#10;- Which was too broad?&#10;- Your recommended chunk size:&#10;- Why?" style="min-height: 150px;"></textarea>
@@ -267,12 +261,12 @@ def generate_comparison_html(filing_idx=0, chunk_pct=0.4):
     </div>
 </body>
 </html>
-"""
+""")
 
     # Save HTML
     output_path = Path('chunk_comparison_real_data.html')
     with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(html)
+        f.write(''.join(parts))
 
     print(f"[OK] Generated: {output_path.absolute()}")
     print(f"\n[INFO] Open this file in your browser to review chunks")
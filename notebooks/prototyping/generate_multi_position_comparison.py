@@ -3,8 +3,8 @@ Generate chunk comparison HTML with multiple positions (beginning, middle, end)
 Shows you chunks from different parts of the filing for better evaluation
 """
 
-import json
 from pathlib import Path
+from chunk_store import load_filing
 
 
 def generate_multi_position_html(filing_idx=0, positions=[0.2, 0.5, 0.8]):
@@ -19,25 +19,24 @@ def generate_multi_position_html(filing_idx=0, positions=[0.2, 0.5, 0.8]):
 
     sizes_to_compare = [200, 500, 1000, 2000, 3000, 4000]
 
-    # Load metadata from first size
-    first_size = sizes_to_compare[0]
-    file_path = Path(f'output/processed_samples_{first_size}tok.json')
-    with open(file_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    # Load the filing once per size up front; the position loop below reuses them
+    filing_by_size = {size: load_filing(size, filing_idx) for size in sizes_to_compare}
 
-    if filing_idx >= len(data):
-        print(f"[ERROR] Filing index {filing_idx} out of range (max: {len(data)-1})")
+    missing = [size for size, filing in filing_by_size.items() if filing is None]
+    if missing:
+        print(f"[ERROR] Filing index {filing_idx} not found for sizes: {missing}")
         return
 
-    filing_metadata = data[filing_idx]['metadata']
-    filing_name = data[filing_idx]['file_name']
+    # Load metadata from first size
+    filing_metadata = filing_by_size[sizes_to_compare[0]]['metadata']
+    filing_name = filing_by_size[sizes_to_compare[0]]['file_name']
 
     print(f"[INFO] Generating comparison for filing {filing_idx}")
     print(f"       {filing_metadata.get('COMPANY_NAME', 'Unknown')}")
     print(f"       Positions: {', '.join([f'{p*100:.0f}%' for p in positions])}\n")
 
     # Start HTML
-    html = f"""<!DOCTYPE html>
+    parts = [f"""<!DOCTYPE html>
 <html>
 <head>
     <title>Multi-Position Chunk Comparison</title>
@@ -126,7 +125,7 @@ def generate_multi_position_html(filing_idx=0, positions=[0.2, 0.5, 0.8]):
         <strong>🆔 CIK:</strong> {filing_metadata.get('CIK', 'Unknown')}<br>
         <strong>📁 File:</strong> {filing_name}
     </div>
-"""
+"""]
 
     # Generate sections for each position
     for position in positions:
@@ -136,19 +135,14 @@ def generate_multi_position_html(filing_idx=0, positions=[0.2, 0.5, 0.8]):
             0.8: "END"
         }.get(position, f"{position*100:.0f}%")
 
-        html += f"""
+        parts.append(f"""
     <div class="position-section">
         <div class="position-header">📍 {position_name} of Filing (~{position*100:.0f}% through)</div>
-"""
+""")
 
-        # Load chunks for each size at this position
+        # Look up chunks for each size at this position
         for size in sizes_to_compare:
-            file_path = Path(f'output/processed_samples_{size}tok.json')
-
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-
-            filing = data[filing_idx]
+            filing = filing_by_size[size]
 
             # Calculate chunk index based on percentage
             chunk_idx = int(position * filing['num_chunks'])
@@ -166,9 +160,9 @@ def generate_multi_position_html(filing_idx=0, positions=[0.2, 0.5, 0.8]):
             char_count = len(content)
 
             # Truncate if too long
-            display_content = content[:2000] + "..." if len(content) > 2000 else content
+            display_content = content[:2000] + "..." if char_count > 2000 else content
 
-            html += f"""
+            parts.append(f"""
         <div class="chunk-container">
             <div class="chunk-header">🔹 {size} TOKENS</div>
             <div class="content">{display_content}</div>
@@ -177,21 +171,21 @@ def generate_multi_position_html(filing_idx=0, positions=[0.2, 0.5, 0.8]):
                 📊 Chunk {chunk_idx + 1}/{filing['num_chunks']}
             </div>
         </div>
-"""
+""")
 
-        html += """
+        parts.append("""
     </div>
-"""
+""")
 
-    html += """
+    parts.append("""
 </body>
 </html>
-"""
+""")
 
     # Save HTML
     output_path = Path('chunk_comparison_multi_position.html')
     with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(html)
+        f.write(''.join(parts))
 
     print(f"[OK] Generated: {output_path.absolute()}")
     print(f"\n[INFO] Open this file in your browser to review chunks")
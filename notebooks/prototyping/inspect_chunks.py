@@ -3,8 +3,7 @@ Quick script to inspect processed chunks
 Usage: python inspect_chunks.py
 """
 
-import json
-from pathlib import Path
+from chunk_store import read_filing, samples_path
 
 def inspect_chunk_size(chunk_size, filing_idx=0, chunk_idx=5):
     """
@@ -15,28 +14,25 @@ def inspect_chunk_size(chunk_size, filing_idx=0, chunk_idx=5):
         filing_idx: Which filing to look at (0-1374)
         chunk_idx: Which chunk to look at within that filing
     """
-    file_path = Path(f'output/processed_samples_{chunk_size}tok.json')
+    file_path = samples_path(chunk_size)
 
     if not file_path.exists():
         print(f"[ERROR] File not found: {file_path}")
         return
 
-    print(f"[INFO] Loading {file_path.name}...")
-    with open(file_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    # Only the requested filing is parsed out of the file
+    print(f"[INFO] Loading filing {filing_idx} from {file_path.name}...")
+    filing = read_filing(samples_path(chunk_size), filing_idx)
 
-    print(f"[OK] Loaded {len(data)} filings\n")
-
-    # Get the filing
-    if filing_idx >= len(data):
-        print(f"[ERROR] Filing index {filing_idx} out of range (max: {len(data)-1})")
+    if filing is None:
+        print(f"[ERROR] Filing index {filing_idx} out of range")
         return
 
-    filing = data[filing_idx]
+    print(f"[OK] Loaded filing {filing_idx}\n")
 
     # Print filing info
     print("="*80)
-    print(f"FILING {filing_idx + 1} of {len(data)}")
+    print(f"FILING {filing_idx + 1}")
     print("="*80)
     print(f"File name: {filing['file_name']}")
     print(f"Total tokens: {filing['total_tokens']:,}")
@@ -90,12 +86,11 @@ def compare_chunk_sizes(filing_idx=0, chunk_idx=5):
 def show_overlap(chunk_size, filing_idx=0, chunk_idx=5):
     """Show overlap between two consecutive chunks"""
 
-    file_path = Path(f'output/processed_samples_{chunk_size}tok.json')
-
-    with open(file_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    filing = read_filing(samples_path(chunk_size), filing_idx)
 
-    filing = data[filing_idx]
+    if filing is None:
+        print(f"[ERROR] Filing index {filing_idx} not found for {chunk_size} tokens")
+        return
 
     if chunk_idx + 1 >= len(filing['chunks']):
         print(f"[ERROR] Can't show overlap - chunk {chunk_idx} is the last chunk")
@@ -3,9 +3,9 @@ Chunk Review Tool with Text Wrapping
 Makes it easier to manually review chunk quality
 """
 
-import json
+import random
 import textwrap
-from pathlib import Path
+from chunk_store import ensure_index, read_filing, read_filings, samples_path
 
 
 def wrap_text(text, width=80):
@@ -33,16 +33,17 @@ def review_chunk(chunk_size, filing_idx=0, chunk_idx=5):
         filing_idx: Which filing (0-1374)
         chunk_idx: Which chunk within filing
     """
-    file_path = Path(f'output/processed_samples_{chunk_size}tok.json')
+    file_path = samples_path(chunk_size)
 
     if not file_path.exists():
         print(f"[ERROR] File not found: {file_path}")
         return
 
-    with open(file_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    filing = read_filing(samples_path(chunk_size), filing_idx)
 
-    filing = data[filing_idx]
+    if filing is None:
+        print(f"[ERROR] Filing index {filing_idx} out of range")
+        return
 
     if chunk_idx >= len(filing['chunks']):
         chunk_idx = 0
@@ -52,7 +53,7 @@ def review_chunk(chunk_size, filing_idx=0, chunk_idx=5):
 
     # Print header
     print("\n" + "="*80)
-    print(f"CHUNK SIZE: {chunk_size} tokens | Filing {filing_idx + 1}/{len(data)} | Chunk {chunk_idx + 1}/{filing['num_chunks']}")
+    print(f"CHUNK SIZE: {chunk_size} tokens | Filing {filing_idx + 1} | Chunk {chunk_idx + 1}/{filing['num_chunks']}")
     print("="*80)
     print(f"File: {filing['file_name']}")
     print(f"Total tokens: {filing['total_tokens']:,} | Chunks: {filing['num_chunks']}")
@@ -100,24 +101,19 @@ def compare_sizes(filing_idx=0, chunk_idx=5):
 def quick_scan(chunk_size, num_samples=5):
     """Quickly scan multiple chunks from one chunk size"""
 
-    file_path = Path(f'output/processed_samples_{chunk_size}tok.json')
-
-    with open(file_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-
     print("\n" + "="*80)
     print(f"QUICK SCAN: {chunk_size} tokens - Showing {num_samples} random chunks")
     print("="*80)
 
-    import random
     random.seed(42)
 
-    # Pick random filings
-    sample_filings = random.sample(range(len(data)), min(num_samples, len(data)))
-
-    for i, filing_idx in enumerate(sample_filings):
-        filing = data[filing_idx]
+    # Pick random filings; the offset index gives the count without parsing,
+    # and only the sampled filings are read (through one mmap of the file)
+    file_path = samples_path(chunk_size)
+    num_filings = len(ensure_index(file_path))
+    sample_filings = random.sample(range(num_filings), min(num_samples, num_filings))
 
+    for i, (filing_idx, filing) in enumerate(zip(sample_filings, read_filings(file_path, sample_filings))):
         # Pick middle chunk
         chunk_idx = filing['num_chunks'] // 2
 
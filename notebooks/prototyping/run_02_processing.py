@@ -3,13 +3,20 @@ Execute 02_text_processing.ipynb cells
 Process all 26,018 2024 SEC filings with contextual chunking
 """
 
+import mmap
+import multiprocessing
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import re
 import json
+import orjson
 import zipfile
 from collections import defaultdict
 import time
+import numpy as np
+import pyarrow as pa
 
 # Add project root to path
 project_root = Path.cwd().parent.parent
@@ -17,90 +24,77 @@ sys.path.insert(0, str(project_root))
 
 # Data locations
 DATA_ZIP = project_root / 'data' / 'external' / '10-X_C_2024.zip'
+# The zip is extracted once; workers then mmap each filing in place instead of
+# the parent decompressing every member through ZipFile on every run
+EXTRACT_DIR = project_root / 'data' / 'external' / '10-X_C_2024'
+EXTRACT_MARKER = EXTRACT_DIR / '.extracted'
 OUTPUT_DIR = project_root / 'notebooks' / 'prototyping' / 'output'
 OUTPUT_DIR.mkdir(exist_ok=True)
 
-print(f"[INFO] Data source: {DATA_ZIP}")
-print(f"[INFO] Output directory: {OUTPUT_DIR}")
-print(f"[INFO] Zip file exists: {DATA_ZIP.exists()}")
-
-if DATA_ZIP.exists():
-    zip_size_mb = DATA_ZIP.stat().st_size / (1024*1024)
-    print(f"[OK] Zip file size: {zip_size_mb:.2f} MB")
-else:
-    print("[FAIL] Zip file not found!")
-    sys.exit(1)
-
-# Inspect 2024 Data Structure
-print(f"\n{'='*80}")
-print(f"INSPECTING ZIP CONTENTS")
-print(f"{'='*80}\n")
-
-with zipfile.ZipFile(DATA_ZIP, 'r') as z:
-    file_list = z.namelist()
-
-print(f"[OK] Total files in zip: {len(file_list):,}")
-print(f"\n[INFO] First 10 files:")
-for f in file_list[:10]:
-    print(f"  {f}")
-
-# Count by quarter
-quarters = defaultdict(int)
-for f in file_list:
-    if 'QTR' in f:
-        qtr = f.split('/')[1] if '/' in f else 'unknown'
-        quarters[qtr] += 1
-
-print(f"\n[INFO] Files by quarter:")
-for qtr in sorted(quarters.keys()):
-    print(f"  {qtr}: {quarters[qtr]:,} files")
-
-# Filter to .txt files only
-txt_files = [f for f in file_list if f.endswith('.txt')]
-print(f"\n[OK] Text files to process: {len(txt_files):,}")
+# Filings are read and chunked in worker processes; only paths go to the
+# workers and only encoded JSON lines come back
+PROCESS_WORKERS = os.cpu_count() or 1
+PROCESS_CHUNKSIZE = 64
+# Fork where the platform has it: workers inherit the loaded tokenizer instead of
+# rebuilding it. Elsewhere (Windows) workers start fresh and import this module,
+# which defines the worker functions; the script itself only runs under main()
+PROCESS_START_METHOD = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else None
 
 # Text Extraction Functions
+# Patterns are compiled once here rather than on every call for every filing.
+# Header and tag stripping run on the raw filing bytes, so only the header
+# fields and the final clean text are ever decoded to str
+SEC_HEADER_RE = re.compile(rb'<SEC-Header>(.*?)</SEC-Header>', re.DOTALL | re.IGNORECASE)
+
+# SRAF header fields, each with alternative label spellings tried in order
+FIELD_PATTERNS = {
+    field: [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+    for field, patterns in {
+        'COMPANY_NAME': [
+            r'COMPANY CONFORMED NAME:\s*(.+?)(?:\n|$)',
+            r'CONFORMED-NAME:\s*(.+?)(?:\n|$)',
+            r'CONFORMED NAME:\s*(.+?)(?:\n|$)'
+        ],
+        'CIK': [
+            r'CENTRAL INDEX KEY:\s*(.+?)(?:\n|$)',
+            r'CIK:\s*(.+?)(?:\n|$)'
+        ],
+        'FORM_TYPE': [
+            r'FORM TYPE:\s*(.+?)(?:\n|$)',
+            r'FORM-TYPE:\s*(.+?)(?:\n|$)',
+            r'CONFORMED SUBMISSION TYPE:\s*(.+?)(?:\n|$)'
+        ],
+        'FILING_DATE': [
+            r'FILED AS OF DATE:\s*(.+?)(?:\n|$)',
+            r'FILED-AS-OF-DATE:\s*(.+?)(?:\n|$)',
+            r'DATE AS OF CHANGE:\s*(.+?)(?:\n|$)'
+        ],
+        'ACCESSION_NUMBER': [
+            r'ACCESSION NUMBER:\s*(.+?)(?:\n|$)',
+            r'ACCESSION-NUMBER:\s*(.+?)(?:\n|$)'
+        ],
+        'PERIOD_OF_REPORT': [
+            r'CONFORMED PERIOD OF REPORT:\s*(.+?)(?:\n|$)',
+            r'CONFORMED-PERIOD-OF-REPORT:\s*(.+?)(?:\n|$)'
+        ]
+    }.items()
+}
+
+HEADER_RE = re.compile(rb'<Header>.*?</Header>', re.DOTALL | re.IGNORECASE)
+TAG_RE = re.compile(rb'<[^>]+>')
+
+
 def extract_sraf_metadata(content):
-    """Extract metadata from SRAF header"""
+    """Extract metadata from SRAF header (content is the raw filing bytes or mmap)"""
     metadata = {}
 
-    sec_header_match = re.search(r'<SEC-Header>(.*?)</SEC-Header>', content, re.DOTALL | re.IGNORECASE)
+    sec_header_match = SEC_HEADER_RE.search(content)
     if sec_header_match:
-        sec_header = sec_header_match.group(1)
-
-        field_mappings = {
-            'COMPANY_NAME': [
-                r'COMPANY CONFORMED NAME:\s*(.+?)(?:\n|$)',
-                r'CONFORMED-NAME:\s*(.+?)(?:\n|$)',
-                r'CONFORMED NAME:\s*(.+?)(?:\n|$)'
-            ],
-            'CIK': [
-                r'CENTRAL INDEX KEY:\s*(.+?)(?:\n|$)',
-                r'CIK:\s*(.+?)(?:\n|$)'
-            ],
-            'FORM_TYPE': [
-                r'FORM TYPE:\s*(.+?)(?:\n|$)',
-                r'FORM-TYPE:\s*(.+?)(?:\n|$)',
-                r'CONFORMED SUBMISSION TYPE:\s*(.+?)(?:\n|$)'
-            ],
-            'FILING_DATE': [
-                r'FILED AS OF DATE:\s*(.+?)(?:\n|$)',
-                r'FILED-AS-OF-DATE:\s*(.+?)(?:\n|$)',
-                r'DATE AS OF CHANGE:\s*(.+?)(?:\n|$)'
-            ],
-            'ACCESSION_NUMBER': [
-                r'ACCESSION NUMBER:\s*(.+?)(?:\n|$)',
-                r'ACCESSION-NUMBER:\s*(.+?)(?:\n|$)'
-            ],
-            'PERIOD_OF_REPORT': [
-                r'CONFORMED PERIOD OF REPORT:\s*(.+?)(?:\n|$)',
-                r'CONFORMED-PERIOD-OF-REPORT:\s*(.+?)(?:\n|$)'
-            ]
-        }
-
-        for field, patterns in field_mappings.items():
+        sec_header = sec_header_match.group(1).decode('utf-8', errors='ignore')
+
+        for field, patterns in FIELD_PATTERNS.items():
             for pattern in patterns:
-                match = re.search(pattern, sec_header, re.IGNORECASE)
+                match = pattern.search(sec_header)
                 if match:
                     metadata[field] = match.group(1).strip()
                     break
@@ -109,16 +103,14 @@ def extract_sraf_metadata(content):
 
 
 def extract_clean_text(content):
-    """Extract clean text content from SRAF-XML-wrapper"""
-    text = re.sub(r'<Header>.*?</Header>', '', content, flags=re.DOTALL | re.IGNORECASE)
-    text = re.sub(r'<SEC-Header>.*?</SEC-Header>', '', text, flags=re.DOTALL | re.IGNORECASE)
-    text = re.sub(r'<[^>]+>', ' ', text)
-    text = re.sub(r'<[^>]*xbrl[^>]*>.*?</[^>]*xbrl[^>]*>', '', text, flags=re.DOTALL | re.IGNORECASE)
-    text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'\n\s*\n', '\n\n', text)
-    return text.strip()
-
-print(f"\n[OK] Text extraction functions loaded")
+    """Extract clean text content from SRAF-XML-wrapper (content is the raw filing bytes or mmap)"""
+    text = HEADER_RE.sub(b'', content)
+    text = SEC_HEADER_RE.sub(b'', text)
+    text = TAG_RE.sub(b' ', text)
+    # Decode once, then collapse whitespace runs (str.split matches the same
+    # characters as \s); no newlines survive this, so there are no blank lines
+    # left to normalize
+    return ' '.join(text.decode('utf-8', errors='ignore').split())
 
 # Install tiktoken if needed
 try:
@@ -134,155 +126,324 @@ except ImportError:
 # Initialize tokenizer
 tokenizer = tiktoken.get_encoding("cl100k_base")
 
-def count_tokens(text):
-    """Count tokens in text using tiktoken"""
-    return len(tokenizer.encode(text))
-
+# Byte length of every token id (0 for unused ids). The token bytes of an
+# encode_ordinary() result concatenate back to the UTF-8 text, so a running sum
+# of these lengths gives each token's byte offset and chunks can be sliced from
+# the encoded filing instead of decoded token by token
+token_byte_lengths = np.zeros(tokenizer.n_vocab, dtype=np.int64)
+for token in range(tokenizer.n_vocab):
+    try:
+        token_byte_lengths[token] = len(tokenizer.decode_single_token_bytes(token))
+    except KeyError:
+        pass
 
 def contextual_chunk_filing(text, chunk_size=500, context_window=50):
-    """Chunk text with contextual embeddings (Anthropic method)"""
-    tokens = tokenizer.encode(text)
-    chunks = []
+    """
+    Chunk text with contextual embeddings (Anthropic method)
+
+    The text is tokenized once; its token count is returned alongside the
+    chunks so callers don't encode the whole filing a second time.
+
+    Returns:
+        tuple: (chunks, total_tokens)
+            - chunks: dict of columns (core_text, extended_text, core_tokens,
+              extended_tokens), one list entry per chunk
+    """
+    # Filings never contain intended special tokens; encode_ordinary skips
+    # the special-token scan that encode() runs over the text
+    tokens = tokenizer.encode_ordinary(text)
+    chunks = {'core_text': [], 'extended_text': [], 'core_tokens': [], 'extended_tokens': []}
+
+    # Byte offset of each token boundary (offsets[i] = start of token i)
+    text_bytes = text.encode('utf-8')
+    offsets = np.zeros(len(tokens) + 1, dtype=np.int64)
+    np.cumsum(token_byte_lengths[np.array(tokens, dtype=np.int64)], out=offsets[1:])
+    offsets = offsets.tolist()
 
     start = 0
     while start < len(tokens):
         end = min(start + chunk_size, len(tokens))
 
-        # Core chunk
-        core_tokens = tokens[start:end]
-        core_text = tokenizer.decode(core_tokens)
+        # Core chunk (decoded like tokenizer.decode: invalid UTF-8 at a split
+        # character becomes U+FFFD)
+        core_text = text_bytes[offsets[start]:offsets[end]].decode('utf-8', errors='replace')
 
         # Extended chunk for embedding
         extended_start = max(0, start - context_window)
         extended_end = min(len(tokens), end + context_window)
-        extended_tokens = tokens[extended_start:extended_end]
-        extended_text = tokenizer.decode(extended_tokens)
-
-        chunks.append({
-            'core_text': core_text,
-            'extended_text': extended_text,
-            'core_start': start,
-            'core_end': end,
-            'core_tokens': len(core_tokens),
-            'extended_tokens': len(extended_tokens)
-        })
+        extended_text = text_bytes[offsets[extended_start]:offsets[extended_end]].decode('utf-8', errors='replace')
+
+        chunks['core_text'].append(core_text)
+        chunks['extended_text'].append(extended_text)
+        chunks['core_tokens'].append(end - start)
+        chunks['extended_tokens'].append(extended_end - extended_start)
 
         start = end
 
-    return chunks
+    return chunks, len(tokens)
 
 
 def create_contextual_chunks(chunks, metadata):
-    """Add document metadata headers to chunks"""
-    contextual_chunks = []
-
-    company = metadata.get('COMPANY_NAME', 'Unknown Company')
-    form_type = metadata.get('FORM_TYPE', 'Unknown Form')
-    filing_date = metadata.get('FILING_DATE', 'Unknown Date')
-    cik = metadata.get('CIK', 'Unknown CIK')
-
-    context_header = f"Document: {company} ({form_type}) filed {filing_date} [CIK: {cik}]\n\n"
-
-    for i, chunk in enumerate(chunks):
-        contextual_chunks.append({
-            'chunk_id': i,
-            'text': chunk['core_text'],
-            'text_for_embedding': context_header + chunk['extended_text'],
-            'metadata': {
-                'company': company,
-                'form_type': form_type,
-                'filing_date': filing_date,
-                'cik': cik,
-                'chunk_index': i,
-                'total_chunks': len(chunks),
-                'core_tokens': chunk['core_tokens'],
-                'extended_tokens': chunk['extended_tokens']
-            }
-        })
-
-    return contextual_chunks
-
-print(f"[OK] Contextual chunking functions loaded")
-print(f"[INFO] Core chunk size: 500 tokens")
-print(f"[INFO] Context window: 50 tokens before + 50 tokens after = 100 total")
-
-# Test on sample filing first
-print(f"\n{'='*80}")
-print(f"TESTING ON SAMPLE FILING")
-print(f"{'='*80}\n")
-
-with zipfile.ZipFile(DATA_ZIP, 'r') as z:
-    sample_file = txt_files[0]
-    print(f"[INFO] Testing with: {sample_file}")
-
-    with z.open(sample_file) as f:
-        raw_content = f.read().decode('utf-8', errors='ignore')
-
-print(f"[OK] Loaded {len(raw_content):,} characters")
-
-metadata = extract_sraf_metadata(raw_content)
-clean_text = extract_clean_text(raw_content)
-
-print(f"\n[OK] Extracted metadata:")
-for key, value in metadata.items():
-    print(f"  {key}: {value}")
+    """
+    Add document metadata headers to chunks
+
+    Chunks are stored column-wise: one list per field instead of one dict per
+    chunk. The chunk metadata (company, form type, filing date, CIK) and the
+    context header are the same for every chunk of a filing, so they are
+    stored once per filing; a chunk's id/index is its position in the lists.
+    The text to embed is context_header + extended_text, joined by readers.
+
+    Returns:
+        tuple: (chunk_metadata, context_header, contextual_chunks)
+            - contextual_chunks: dict of columns (text, extended_text,
+              core_tokens, extended_tokens)
+    """
+    chunk_metadata = {
+        'company': metadata.get('COMPANY_NAME', 'Unknown Company'),
+        'form_type': metadata.get('FORM_TYPE', 'Unknown Form'),
+        'filing_date': metadata.get('FILING_DATE', 'Unknown Date'),
+        'cik': metadata.get('CIK', 'Unknown CIK'),
+    }
 
-print(f"\n[OK] Clean text length: {len(clean_text):,} characters")
+    context_header = (
+        f"Document: {chunk_metadata['company']} ({chunk_metadata['form_type']}) "
+        f"filed {chunk_metadata['filing_date']} [CIK: {chunk_metadata['cik']}]\n\n"
+    )
 
-token_count = count_tokens(clean_text)
-raw_chunks = contextual_chunk_filing(clean_text, chunk_size=500, context_window=50)
-contextual_chunks = create_contextual_chunks(raw_chunks, metadata)
+    contextual_chunks = {
+        'text': chunks['core_text'],
+        'extended_text': chunks['extended_text'],
+        'core_tokens': chunks['core_tokens'],
+        'extended_tokens': chunks['extended_tokens'],
+    }
 
-print(f"\n[OK] Contextual chunking results:")
-print(f"  Total tokens: {token_count:,}")
-print(f"  Total chunks: {len(contextual_chunks)}")
-print(f"  Avg core tokens/chunk: {sum(c['metadata']['core_tokens'] for c in contextual_chunks) / len(contextual_chunks):.0f}")
-print(f"  Avg extended tokens/chunk: {sum(c['metadata']['extended_tokens'] for c in contextual_chunks) / len(contextual_chunks):.0f}")
+    return chunk_metadata, context_header, contextual_chunks
 
-print(f"\n[Preview] First chunk CORE text (what we store):")
-print(contextual_chunks[0]['text'][:400])
+def process_filing_contextual(file_content, file_name, chunk_size=500, context_window=50):
+    """
+    Complete processing pipeline for a single filing (file_content is the raw bytes or an mmap of them)
 
-print(f"\n[OK] Sample test successful!")
+    Filings whose SEC header yields no CIK are skipped before the text is
+    cleaned and tokenized: they would only produce "Unknown Company" chunks.
 
-# Process all files
-def process_filing_contextual(file_content, file_name, chunk_size=500, context_window=50):
-    """Complete processing pipeline for a single filing"""
+    Returns:
+        The processed filing dict, or None if the filing was skipped
+    """
     metadata = extract_sraf_metadata(file_content)
+    if 'CIK' not in metadata:
+        return None
+
     clean_text = extract_clean_text(file_content)
-    raw_chunks = contextual_chunk_filing(clean_text, chunk_size, context_window)
-    contextual_chunks = create_contextual_chunks(raw_chunks, metadata)
+    raw_chunks, total_tokens = contextual_chunk_filing(clean_text, chunk_size, context_window)
+    chunk_metadata, context_header, contextual_chunks = create_contextual_chunks(raw_chunks, metadata)
 
     return {
         'file_name': file_name,
         'metadata': metadata,
-        'total_tokens': count_tokens(clean_text),
+        'chunk_metadata': chunk_metadata,
+        'context_header': context_header,
+        'total_tokens': total_tokens,
         'chunk_size': chunk_size,
         'context_window': context_window,
-        'num_chunks': len(contextual_chunks),
+        'num_chunks': len(contextual_chunks['text']),
         'chunks': contextual_chunks
     }
 
-print(f"\n{'='*80}")
-print(f"PROCESSING ALL 2024 FILINGS")
-print(f"{'='*80}\n")
-print(f"[INFO] Core chunk: 500 tokens")
-print(f"[INFO] Context window: 50 tokens before + 50 after\n")
-
-results = []
-errors = []
-start_time = time.time()
 
-with zipfile.ZipFile(DATA_ZIP, 'r') as z:
-    total_files = len(txt_files)
-    print(f"[INFO] Total files to process: {total_files:,}\n")
+def prefetch_filing(file_path):
+    """Ask the kernel to start reading an extracted filing into the page cache"""
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        fd = os.open(EXTRACT_DIR / file_path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    finally:
+        os.close(fd)
+
+
+def process_one(file_path, next_path=None):
+    """
+    Chunk one extracted filing and serialize it as a JSON line (runs in a worker process)
+
+    The next filing in the worker's batch (next_path) is prefetched first, so
+    its disk read overlaps this filing's tokenization.
+
+    The filing is memory-mapped and the header/tag regexes scan the mapping
+    directly, so the raw file is never copied into a bytes object. Only the
+    encoded line and a few counts go back to the parent, which writes the
+    line straight to the output file and keeps running totals.
+
+    Returns:
+        tuple: (line, stats, error)
+            - line: None if the filing was skipped (no SEC header / CIK)
+            - stats: (num_chunks, total_tokens, core_tokens, extended_tokens)
+            - error: None on success, otherwise the exception message
+    """
+    if next_path is not None:
+        prefetch_filing(next_path)
+
+    try:
+        with open(EXTRACT_DIR / file_path, 'rb') as f:
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            if os.fstat(f.fileno()).st_size == 0:
+                # mmap cannot map an empty file
+                result = process_filing_contextual(b'', file_path, chunk_size=500, context_window=50)
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    result = process_filing_contextual(mm, file_path, chunk_size=500, context_window=50)
+        if result is None:
+            return None, None, None
+        stats = (
+            result['num_chunks'],
+            result['total_tokens'],
+            sum(result['chunks']['core_tokens']),
+            sum(result['chunks']['extended_tokens']),
+        )
+        return orjson.dumps(result, option=orjson.OPT_APPEND_NEWLINE), stats, None
+    except Exception as e:
+        return None, None, str(e)
+
+
+def main():
+    """Inspect and extract the 2024 zip, then chunk every filing into the zstd JSON Lines corpus"""
+    print(f"[INFO] Data source: {DATA_ZIP}")
+    print(f"[INFO] Output directory: {OUTPUT_DIR}")
+    print(f"[INFO] Zip file exists: {DATA_ZIP.exists()}")
+
+    if DATA_ZIP.exists():
+        zip_size_mb = DATA_ZIP.stat().st_size / (1024*1024)
+        print(f"[OK] Zip file size: {zip_size_mb:.2f} MB")
+    else:
+        print("[FAIL] Zip file not found!")
+        sys.exit(1)
+
+    # Inspect 2024 Data Structure
+    print(f"\n{'='*80}")
+    print(f"INSPECTING ZIP CONTENTS")
+    print(f"{'='*80}\n")
+
+    with zipfile.ZipFile(DATA_ZIP, 'r') as z:
+        file_list = z.namelist()
+
+    print(f"[OK] Total files in zip: {len(file_list):,}")
+    print(f"\n[INFO] First 10 files:")
+    for f in file_list[:10]:
+        print(f"  {f}")
+
+    # Count by quarter
+    quarters = defaultdict(int)
+    for f in file_list:
+        if 'QTR' in f:
+            qtr = f.split('/')[1] if '/' in f else 'unknown'
+            quarters[qtr] += 1
+
+    print(f"\n[INFO] Files by quarter:")
+    for qtr in sorted(quarters.keys()):
+        print(f"  {qtr}: {quarters[qtr]:,} files")
+
+    # Filter to .txt files only
+    txt_files = [f for f in file_list if f.endswith('.txt')]
+    print(f"\n[OK] Text files to process: {len(txt_files):,}")
+
+    # One-time extraction (the marker is written only after a complete extract)
+    if EXTRACT_MARKER.exists():
+        print(f"[OK] Using extracted filings in {EXTRACT_DIR}")
+    else:
+        print(f"[INFO] Extracting {DATA_ZIP.name} to {EXTRACT_DIR} (one-time)...")
+        with zipfile.ZipFile(DATA_ZIP, 'r') as z:
+            z.extractall(EXTRACT_DIR)
+        EXTRACT_MARKER.touch()
+        print(f"[OK] Extracted {len(file_list):,} files")
+
+    print(f"\n[OK] Text extraction functions loaded")
+
+    print(f"[OK] Contextual chunking functions loaded")
+    print(f"[INFO] Core chunk size: 500 tokens")
+    print(f"[INFO] Context window: 50 tokens before + 50 tokens after = 100 total")
+
+    # Test on sample filing first
+    print(f"\n{'='*80}")
+    print(f"TESTING ON SAMPLE FILING")
+    print(f"{'='*80}\n")
 
-    for i, file_path in enumerate(txt_files, 1):
-        try:
-            with z.open(file_path) as f:
-                content = f.read().decode('utf-8', errors='ignore')
+    sample_file = txt_files[0]
+    print(f"[INFO] Testing with: {sample_file}")
 
-            result = process_filing_contextual(content, file_path, chunk_size=500, context_window=50)
-            results.append(result)
+    raw_content = (EXTRACT_DIR / sample_file).read_bytes()
+
+    print(f"[OK] Loaded {len(raw_content):,} bytes")
+
+    metadata = extract_sraf_metadata(raw_content)
+    clean_text = extract_clean_text(raw_content)
+
+    print(f"\n[OK] Extracted metadata:")
+    for key, value in metadata.items():
+        print(f"  {key}: {value}")
+
+    print(f"\n[OK] Clean text length: {len(clean_text):,} characters")
+
+    raw_chunks, token_count = contextual_chunk_filing(clean_text, chunk_size=500, context_window=50)
+    chunk_metadata, context_header, contextual_chunks = create_contextual_chunks(raw_chunks, metadata)
+    num_chunks = len(contextual_chunks['text'])
+
+    print(f"\n[OK] Contextual chunking results:")
+    print(f"  Total tokens: {token_count:,}")
+    print(f"  Total chunks: {num_chunks}")
+    print(f"  Avg core tokens/chunk: {sum(contextual_chunks['core_tokens']) / num_chunks:.0f}")
+    print(f"  Avg extended tokens/chunk: {sum(contextual_chunks['extended_tokens']) / num_chunks:.0f}")
+
+    print(f"\n[Preview] First chunk CORE text (what we store):")
+    print(contextual_chunks['text'][0][:400])
+
+    print(f"\n[OK] Sample test successful!")
+
+    print(f"\n{'='*80}")
+    print(f"PROCESSING ALL 2024 FILINGS")
+    print(f"{'='*80}\n")
+    print(f"[INFO] Core chunk: 500 tokens")
+    print(f"[INFO] Context window: 50 tokens before + 50 after\n")
+
+    # JSON Lines (one compact filing per line), written as each filing completes
+    # so the processed corpus is never held in memory. The stream is zstd-compressed:
+    # JSON text shrinks several-fold and decompresses faster than the disk reads it saves
+    output_file = OUTPUT_DIR / 'processed_2024_500tok_contextual.jsonl.zst'
+    print(f"[INFO] Writing to {output_file} (zstd-compressed JSON Lines, one filing per line)")
+
+    # Per-filing stats (num_chunks, total_tokens, core_tokens, extended_tokens),
+    # preallocated and filled row by row; the summary reduces them with NumPy
+    filing_stats = np.zeros((len(txt_files), 4), dtype=np.int64)
+    num_filings = 0
+
+    errors = []
+    skipped = []  # Filings without a usable SEC header
+    start_time = time.time()
+
+    with pa.output_stream(output_file, compression='zstd') as out, \
+            ProcessPoolExecutor(max_workers=PROCESS_WORKERS, mp_context=multiprocessing.get_context(PROCESS_START_METHOD)) as executor:
+        total_files = len(txt_files)
+        print(f"[INFO] Total files to process: {total_files:,}")
+        print(f"[INFO] Workers: {PROCESS_WORKERS}\n")
+
+        # map (not as_completed) keeps filings in txt_files order; each task also
+        # gets the following path so the worker can prefetch it
+        results = executor.map(process_one, txt_files, txt_files[1:] + [None], chunksize=PROCESS_CHUNKSIZE)
+        for i, (file_path, (line, stats, error)) in enumerate(zip(txt_files, results), 1):
+            if error is not None:
+                errors.append({'file': file_path, 'error': error})
+                if len(errors) <= 10:
+                    print(f"[FAIL] {file_path}: {error}")
+            elif line is None:
+                skipped.append(file_path)
+                if len(skipped) <= 10:
+                    print(f"[SKIP] {file_path}: no CIK in SEC header")
+            else:
+                out.write(line)
+                filing_stats[num_filings] = stats
+                num_filings += 1
 
             if i % 1000 == 0:
                 elapsed = time.time() - start_time
@@ -292,98 +453,81 @@ with zipfile.ZipFile(DATA_ZIP, 'r') as z:
                 eta_minutes = eta_seconds / 60
                 print(f"[Progress] {i:,}/{total_files:,} ({pct:.1f}%) - {rate:.1f} files/sec - ETA: {eta_minutes:.1f} min")
 
-        except Exception as e:
-            errors.append({'file': file_path, 'error': str(e)})
-            if len(errors) <= 10:
-                print(f"[FAIL] {file_path}: {str(e)}")
-
-processing_time = time.time() - start_time
-
-print(f"\n{'='*80}")
-print(f"PROCESSING COMPLETE")
-print(f"{'='*80}")
-print(f"Successfully processed: {len(results):,} filings")
-print(f"Errors encountered: {len(errors)}")
-print(f"Processing time: {processing_time:.1f} seconds ({processing_time/60:.1f} minutes)")
-print(f"Rate: {len(results)/processing_time:.1f} files/second")
-
-# Summary statistics
-import numpy as np
-
-total_chunks = sum(f['num_chunks'] for f in results)
-total_tokens = sum(f['total_tokens'] for f in results)
-avg_chunks = total_chunks / len(results) if results else 0
-avg_tokens = total_tokens / len(results) if results else 0
-
-total_core_tokens = sum(
-    sum(c['metadata']['core_tokens'] for c in f['chunks'])
-    for f in results
-)
-total_extended_tokens = sum(
-    sum(c['metadata']['extended_tokens'] for c in f['chunks'])
-    for f in results
-)
-
-chunks_per_filing = [f['num_chunks'] for f in results]
-tokens_per_filing = [f['total_tokens'] for f in results]
-
-print(f"\n{'='*80}")
-print(f"SUMMARY STATISTICS")
-print(f"{'='*80}")
-print(f"\nDataset:")
-print(f"  Total filings: {len(results):,}")
-print(f"  Time period: 2024 (full year)")
-
-print(f"\nChunking Configuration:")
-print(f"  Core chunk size: 500 tokens")
-print(f"  Context window: 100 tokens (50 before + 50 after)")
-print(f"  Total chunks: {total_chunks:,}")
-print(f"  Avg chunks/filing: {avg_chunks:.1f}")
-
-print(f"\nToken Statistics:")
-print(f"  Total document tokens: {total_tokens:,}")
-print(f"  Total core tokens (stored): {total_core_tokens:,}")
-print(f"  Total extended tokens (embedded): {total_extended_tokens:,}")
-print(f"  Context overhead: {((total_extended_tokens / total_core_tokens) - 1) * 100:.1f}%")
-print(f"  Avg tokens/filing: {avg_tokens:,.0f}")
-print(f"  Min tokens/filing: {min(tokens_per_filing):,}")
-print(f"  Max tokens/filing: {max(tokens_per_filing):,}")
-
-# Export results
-print(f"\n{'='*80}")
-print(f"EXPORTING RESULTS")
-print(f"{'='*80}\n")
-
-output_file = OUTPUT_DIR / 'processed_2024_500tok_contextual.json'
-print(f"[INFO] Saving to {output_file}...")
-
-with open(output_file, 'w', encoding='utf-8') as f:
-    json.dump(results, f, indent=2)
-
-file_size_mb = output_file.stat().st_size / (1024*1024)
-
-print(f"[OK] Saved: {output_file.name}")
-print(f"[OK] File size: {file_size_mb:,.2f} MB")
-
-if errors:
-    error_file = OUTPUT_DIR / 'processing_errors_2024.json'
-    with open(error_file, 'w', encoding='utf-8') as f:
-        json.dump(errors, f, indent=2)
-    print(f"[INFO] Error log saved: {error_file.name}")
-
-print(f"\n{'='*80}")
-print(f"ALL DONE!")
-print(f"{'='*80}")
-print(f"\nOutput files:")
-print(f"  - {output_file.name} ({file_size_mb:,.2f} MB)")
-if errors:
-    print(f"  - processing_errors_2024.json ({len(errors)} errors)")
-
-print(f"\nNext steps:")
-print(f"1. Run 03_embedding_generation.ipynb to generate embeddings")
-print(f"2. Use 'text_for_embedding' field for embedding generation")
-print(f"3. Store only 'text' field (no storage overhead)")
-
-print(f"\nResearch sources:")
-print(f"  - Anthropic: https://www.anthropic.com/news/contextual-retrieval")
-print(f"  - RAPTOR: https://arxiv.org/abs/2401.18059")
+    processing_time = time.time() - start_time
+
+    print(f"\n{'='*80}")
+    print(f"PROCESSING COMPLETE")
+    print(f"{'='*80}")
+    print(f"Successfully processed: {num_filings:,} filings")
+    print(f"Skipped (no SEC header/CIK): {len(skipped):,} filings")
+    print(f"Errors encountered: {len(errors)}")
+    print(f"Processing time: {processing_time:.1f} seconds ({processing_time/60:.1f} minutes)")
+    print(f"Rate: {num_filings/processing_time:.1f} files/second")
+
+    # Summary statistics
+    filing_stats = filing_stats[:num_filings]
+    tokens_per_filing = filing_stats[:, 1]
+    total_chunks, total_tokens, total_core_tokens, total_extended_tokens = (
+        int(total) for total in filing_stats.sum(axis=0)
+    )
+    avg_chunks = total_chunks / num_filings if num_filings else 0
+    avg_tokens = total_tokens / num_filings if num_filings else 0
+
+    print(f"\n{'='*80}")
+    print(f"SUMMARY STATISTICS")
+    print(f"{'='*80}")
+    print(f"\nDataset:")
+    print(f"  Total filings: {num_filings:,}")
+    print(f"  Time period: 2024 (full year)")
+
+    print(f"\nChunking Configuration:")
+    print(f"  Core chunk size: 500 tokens")
+    print(f"  Context window: 100 tokens (50 before + 50 after)")
+    print(f"  Total chunks: {total_chunks:,}")
+    print(f"  Avg chunks/filing: {avg_chunks:.1f}")
+
+    print(f"\nToken Statistics:")
+    print(f"  Total document tokens: {total_tokens:,}")
+    print(f"  Total core tokens (stored): {total_core_tokens:,}")
+    print(f"  Total extended tokens (embedded): {total_extended_tokens:,}")
+    print(f"  Context overhead: {((total_extended_tokens / total_core_tokens) - 1) * 100:.1f}%")
+    print(f"  Avg tokens/filing: {avg_tokens:,.0f}")
+    print(f"  Min tokens/filing: {tokens_per_filing.min():,}")
+    print(f"  Max tokens/filing: {tokens_per_filing.max():,}")
+
+    # Export results
+    print(f"\n{'='*80}")
+    print(f"EXPORTING RESULTS")
+    print(f"{'='*80}\n")
+
+    file_size_mb = output_file.stat().st_size / (1024*1024)
+
+    print(f"[OK] Saved: {output_file.name}")
+    print(f"[OK] File size: {file_size_mb:,.2f} MB")
+
+    if errors:
+        error_file = OUTPUT_DIR / 'processing_errors_2024.json'
+        with open(error_file, 'w', encoding='utf-8') as f:
+            json.dump(errors, f, indent=2)
+        print(f"[INFO] Error log saved: {error_file.name}")
+
+    print(f"\n{'='*80}")
+    print(f"ALL DONE!")
+    print(f"{'='*80}")
+    print(f"\nOutput files:")
+    print(f"  - {output_file.name} ({file_size_mb:,.2f} MB)")
+    if errors:
+        print(f"  - processing_errors_2024.json ({len(errors)} errors)")
+
+    print(f"\nNext steps:")
+    print(f"1. Run 03_embedding_generation.ipynb to generate embeddings")
+    print(f"2. Embed 'context_header' + each 'extended_text' (header stored once per filing)")
+    print(f"3. Store only 'text' field (no storage overhead)")
+
+    print(f"\nResearch sources:")
+    print(f"  - Anthropic: https://www.anthropic.com/news/contextual-retrieval")
+    print(f"  - RAPTOR: https://arxiv.org/abs/2401.18059")
+
+
+if __name__ == '__main__':
+    main()
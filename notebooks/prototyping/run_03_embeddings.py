@@ -1,12 +1,34 @@
 """
 Execute 03_embedding_generation.ipynb cells
 Generate embeddings for all 2.7M contextually-chunked 2024 SEC filings
+
+Usage:
+    python run_03_embeddings.py                       # PyTorch (FP16 on GPU)
+    EMBED_BACKEND=onnx python run_03_embeddings.py    # ONNX Runtime (O4 FP16 on GPU, int8 on CPU)
 """
 
+import io
+import itertools
+import multiprocessing
+import os
 import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# CPU encode threads (torch intra-op + OpenMP/MKL); beyond ~8 cores the
+# per-batch sync costs outweigh the extra threads. Env vars must be set before
+# numpy/torch load their thread pools; values already in the environment win
+CPU_THREADS = int(os.getenv('CPU_THREADS', min(8, os.cpu_count() or 1)))
+os.environ.setdefault('OMP_NUM_THREADS', str(CPU_THREADS))
+os.environ.setdefault('MKL_NUM_THREADS', str(CPU_THREADS))
+# Rust fast tokenizer uses all cores; must be set before tokenizers is imported
+os.environ.setdefault('TOKENIZERS_PARALLELISM', 'true')
+
 from pathlib import Path
-import json
+import orjson
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 import time
 from datetime import datetime
 
@@ -15,226 +37,594 @@ project_root = Path.cwd().parent.parent
 sys.path.insert(0, str(project_root))
 
 # Paths
-INPUT_FILE = project_root / 'notebooks' / 'prototyping' / 'output' / 'processed_2024_500tok_contextual.json'
+INPUT_FILE = project_root / 'notebooks' / 'prototyping' / 'output' / 'processed_2024_500tok_contextual.jsonl.zst'
 OUTPUT_DIR = project_root / 'notebooks' / 'prototyping' / 'output'
-OUTPUT_FILE = OUTPUT_DIR / 'embeddings_2024_500tok_contextual.npy'
-
-print(f"[INFO] Input file: {INPUT_FILE}")
-print(f"[INFO] Input exists: {INPUT_FILE.exists()}")
-print(f"[INFO] Output directory: {OUTPUT_DIR}")
-
-if INPUT_FILE.exists():
-    file_size_mb = INPUT_FILE.stat().st_size / (1024*1024)
-    print(f"[OK] Input file size: {file_size_mb:,.2f} MB")
-else:
-    print("[FAIL] Input file not found!")
-    sys.exit(1)
-
-# Install sentence-transformers if needed
-try:
-    from sentence_transformers import SentenceTransformer
-    print("[OK] sentence-transformers already installed")
-except ImportError:
-    print("[INFO] Installing sentence-transformers...")
-    import subprocess
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "sentence-transformers", "-q"])
-    from sentence_transformers import SentenceTransformer
-    print("[OK] sentence-transformers installed")
-
-# Load Sentence Transformer Model
-print(f"\n{'='*80}")
-print(f"LOADING EMBEDDING MODEL")
-print(f"{'='*80}\n")
-print("[INFO] Loading sentence-transformers/all-MiniLM-L6-v2...")
-print("[INFO] This will download ~80 MB on first run\n")
-
-start_time = time.time()
-model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
-load_time = time.time() - start_time
-
-print(f"\n[OK] Model loaded in {load_time:.2f} seconds")
-print(f"[INFO] Model details:")
-print(f"  - Model name: all-MiniLM-L6-v2")
-print(f"  - Embedding dimensions: {model.get_sentence_embedding_dimension()}")
-print(f"  - Max sequence length: {model.max_seq_length} tokens")
-print(f"  - Device: {model.device}")
-
-# Load Processed Chunks
-print(f"\n{'='*80}")
-print(f"LOADING PROCESSED CHUNKS")
-print(f"{'='*80}\n")
-print(f"[INFO] Loading processed chunks from {INPUT_FILE.name}...")
-
-with open(INPUT_FILE, 'r', encoding='utf-8') as f:
-    data = json.load(f)
-
-print(f"[OK] Loaded {len(data):,} filings")
-
-# Extract texts for embedding
-embedding_texts = []
-chunk_metadata = []
-
-for filing in data:
-    for chunk in filing['chunks']:
-        # Use 'text_for_embedding' - the extended version with context!
-        embedding_texts.append(chunk['text_for_embedding'])
-
-        # Store metadata for later (ChromaDB step)
-        chunk_metadata.append({
-            'file_name': filing['file_name'],
-            'company': chunk['metadata']['company'],
-            'form_type': chunk['metadata']['form_type'],
-            'filing_date': chunk['metadata']['filing_date'],
-            'cik': chunk['metadata']['cik'],
-            'chunk_id': chunk['chunk_id'],
-            'chunk_index': chunk['metadata']['chunk_index'],
-            'core_tokens': chunk['metadata']['core_tokens'],
-            'extended_tokens': chunk['metadata']['extended_tokens']
-        })
-
-print(f"\n[OK] Extracted {len(embedding_texts):,} chunks for embedding")
-print(f"[INFO] Using 'text_for_embedding' field (extended with approximately 700 tokens)")
-
-# Preview first chunk
-print(f"\n[Preview] First chunk text (first 400 chars):")
-print(embedding_texts[0][:400])
-
-# Generate Embeddings
-print(f"\n{'='*80}")
-print(f"EMBEDDING GENERATION")
-print(f"{'='*80}")
-print(f"\nStarting embedding generation...")
-print(f"  Total chunks: {len(embedding_texts):,}")
-print(f"  Batch size: 32")
-print(f"  Device: {model.device}")
-print(f"  Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-print(f"\nThis will take approximately 1-2 hours...\n")
-
-start_time = time.time()
-
-# Generate embeddings
-embeddings = model.encode(
-    embedding_texts,
-    batch_size=32,
-    show_progress_bar=True,
-    convert_to_numpy=True,
-    normalize_embeddings=True,  # Important for cosine similarity!
-    device=None  # Auto-detect (use GPU if available)
-)
-
-embedding_time = time.time() - start_time
-
-print(f"\n{'='*80}")
-print(f"EMBEDDING GENERATION COMPLETE")
-print(f"{'='*80}")
-print(f"\nGeneration time: {embedding_time:.2f} seconds ({embedding_time/60:.2f} minutes)")
-print(f"Speed: {len(embedding_texts) / embedding_time:.2f} chunks/second")
-print(f"\nEmbeddings shape: {embeddings.shape}")
-print(f"Expected: [{len(embedding_texts):,}, 384]")
-print(f"\nEmbedding statistics:")
-print(f"  Min value: {embeddings.min():.6f}")
-print(f"  Max value: {embeddings.max():.6f}")
-print(f"  Mean: {embeddings.mean():.6f}")
-print(f"  Std: {embeddings.std():.6f}")
-
-# Validate Embeddings
-print(f"\n{'='*80}")
-print(f"VALIDATION")
-print(f"{'='*80}\n")
-print(f"[INFO] Running validation checks...\n")
-
-# Check 1: Correct shape
-assert embeddings.shape == (len(embedding_texts), 384), "Incorrect embedding shape!"
-print("[OK] Shape check passed")
-
-# Check 2: No NaN or Inf values
-assert not np.isnan(embeddings).any(), "NaN values found in embeddings!"
-assert not np.isinf(embeddings).any(), "Inf values found in embeddings!"
-print("[OK] No NaN/Inf values")
-
-# Check 3: Embeddings are normalized (L2 norm ≈ 1)
-norms = np.linalg.norm(embeddings, axis=1)
-assert np.allclose(norms, 1.0, atol=1e-6), "Embeddings not properly normalized!"
-print(f"[OK] Embeddings normalized (L2 norm = {norms.mean():.6f})")
-
-# Check 4: Test similarity between similar chunks
-similarity = np.dot(embeddings[0], embeddings[0])
-print(f"[OK] Self-similarity check: {similarity:.6f} (should be ~1.0)")
-
-similarity_adjacent = np.dot(embeddings[0], embeddings[1])
-print(f"[INFO] Adjacent chunk similarity: {similarity_adjacent:.6f}")
-
-print(f"\n[SUCCESS] All validation checks passed!")
-
-# Save Embeddings
-print(f"\n{'='*80}")
-print(f"SAVING OUTPUTS")
-print(f"{'='*80}\n")
-print(f"[INFO] Saving embeddings to {OUTPUT_FILE}...")
-
-np.save(OUTPUT_FILE, embeddings)
-
-file_size_mb = OUTPUT_FILE.stat().st_size / (1024*1024)
-
-print(f"[OK] Embeddings saved!")
-print(f"  File: {OUTPUT_FILE.name}")
-print(f"  Size: {file_size_mb:,.2f} MB")
-
-# Save metadata
-metadata_file = OUTPUT_DIR / 'chunk_metadata_2024.json'
-with open(metadata_file, 'w', encoding='utf-8') as f:
-    json.dump(chunk_metadata, f, indent=2)
-
-metadata_size_mb = metadata_file.stat().st_size / (1024*1024)
-print(f"\n[OK] Metadata saved!")
-print(f"  File: {metadata_file.name}")
-print(f"  Size: {metadata_size_mb:,.2f} MB")
-
-# Summary Statistics
-print(f"\n{'='*80}")
-print(f"EMBEDDING GENERATION SUMMARY")
-print(f"{'='*80}")
-
-print(f"\nModel:")
-print(f"  Name: sentence-transformers/all-MiniLM-L6-v2")
-print(f"  Dimensions: 384")
-print(f"  Parameters: 22.7M")
-print(f"  Device: {model.device}")
-
-print(f"\nData:")
-print(f"  Input file: {INPUT_FILE.name}")
-print(f"  Total filings: {len(data):,}")
-print(f"  Total chunks: {len(embedding_texts):,}")
-print(f"  Avg chunks/filing: {len(embedding_texts) / len(data):.1f}")
-
-print(f"\nPerformance:")
-print(f"  Generation time: {embedding_time:.2f} seconds ({embedding_time/60:.2f} minutes)")
-print(f"  Speed: {len(embedding_texts) / embedding_time:.2f} chunks/second")
-print(f"  Speed: {len(embedding_texts) / embedding_time * 60:.0f} chunks/minute")
-
-print(f"\nOutput:")
-print(f"  Embeddings file: {OUTPUT_FILE.name}")
-print(f"  Embeddings size: {file_size_mb:,.2f} MB")
-print(f"  Embeddings shape: {embeddings.shape}")
-print(f"  Metadata file: {metadata_file.name}")
-print(f"  Metadata size: {metadata_size_mb:,.2f} MB")
-
-print(f"\nStorage breakdown:")
-print(f"  Per-chunk embedding: {384 * 4 / 1024:.2f} KB (384 dims × 4 bytes)")
-print(f"  Total embeddings: {file_size_mb:,.2f} MB")
-
-print(f"\nNext steps:")
-print(f"  1. Option A: Simple RAG - Load into ChromaDB for basic retrieval testing")
-print(f"  2. Option B: RAPTOR - Implement clustering (UMAP + GMM) and summarization")
-print(f"  3. Run experimental comparison: Baseline vs Simple RAG vs RAPTOR RAG")
-print(f"  4. Evaluate with RAGAS framework")
-
-print(f"\nResearch citations:")
-print(f"  - Sentence-BERT: https://arxiv.org/abs/1908.10084")
-print(f"  - MTEB Benchmark: https://arxiv.org/abs/2210.07316")
-print(f"  - RAPTOR Paper: https://arxiv.org/abs/2401.18059")
-print(f"  - MTEB Leaderboard: https://huggingface.co/spaces/mteb/leaderboard")
-
-print(f"\n{'='*80}")
-print(f"ALL DONE!")
-print(f"{'='*80}")
+MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+# Saved as float16: vectors are L2-normalized, so half precision costs no retrieval quality
+OUTPUT_FILE = OUTPUT_DIR / 'embeddings_2024_500tok_contextual.f16.npy'
+BATCH_SIZE = 256  # Large GPU batches keep tensor cores busy; tune 128/256/512 via nvidia-smi
+TOKENIZE_BATCH = 10_000  # Texts tokenized per call when measuring lengths
+ENCODE_CHUNK_SIZE = 50_000  # Texts encoded per slab written into the embeddings array
+# Sequence cap: the model's max_seq_length is lowered to this percentile of the
+# measured chunk lengths when that is shorter (attention cost is quadratic in length)
+MAX_SEQ_PERCENTILE = 95
+VALIDATE_BLOCK_ROWS = 8192  # 8192 x 384 float16 = 6 MB, stays in cache across the per-block reductions
+METADATA_FILE = OUTPUT_DIR / 'chunk_metadata_2024.parquet'
+
+# Chunk metadata, stored column-wise; repeated per-filing strings are dictionary-encoded
+METADATA_SCHEMA = pa.schema([
+    ('file_name', pa.string()),
+    ('company', pa.string()),
+    ('form_type', pa.string()),
+    ('filing_date', pa.string()),
+    ('cik', pa.string()),
+    ('chunk_id', pa.int32()),
+    ('chunk_index', pa.int32()),
+    ('core_tokens', pa.int32()),
+    ('extended_tokens', pa.int32()),
+])
+DICTIONARY_COLUMNS = ['file_name', 'company', 'form_type', 'filing_date', 'cik']
+
+# Filing parsing/flattening runs in worker processes, PREP_BATCH_FILINGS lines per task
+PREP_WORKERS = os.cpu_count() or 1
+PREP_BATCH_FILINGS = 256
+# Fork where the platform has it; elsewhere (Windows) workers start fresh and
+# import flatten_filings and the schema from this module
+PREP_START_METHOD = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else None
+
+# Inference backend: 'torch' (FP16 on GPU) or 'onnx' (ONNX Runtime: O4 fused FP16
+# graph on CUDA, int8 dynamic quantization on CPU). Exports are cached in ONNX_MODEL_DIR
+EMBED_BACKEND = os.getenv('EMBED_BACKEND', 'torch')
+ONNX_MODEL_DIR = project_root / 'models' / 'all-MiniLM-L6-v2-onnx'
+ONNX_OPTIMIZATION = 'O4'
+ONNX_QUANTIZATION = 'avx512_vnni'
+
+# torch.compile the transformer on a single GPU (Inductor fuses attention/MLP
+# kernels). TORCH_COMPILE=0 disables it, e.g. to skip the one-time compile warm-up
+TORCH_COMPILE = os.getenv('TORCH_COMPILE', '1') == '1'
+# Batches are padded to a multiple of this many tokens, so the compiled model
+# records one CUDA graph per bucket instead of one per distinct sequence length
+SEQ_BUCKET = 64
+
+
+def flatten_filings(lines):
+    """
+    Parse a batch of JSON Lines filings into embedding texts and chunk metadata
+
+    Args:
+        lines: list of raw filing lines (bytes)
+
+    Returns:
+        tuple: (embedding texts, metadata RecordBatch, number of filings)
+    """
+    texts = []
+    columns = {column: [] for column in METADATA_SCHEMA.names}
+    for line in lines:
+        filing = orjson.loads(line)
+        chunks = filing['chunks']  # One list per field
+        shared = filing['chunk_metadata']  # Shared by every chunk of the filing
+        filing_chunks = len(chunks['extended_text'])
+
+        # Embed the extended version with context, behind the filing's document header
+        context_header = filing['context_header']
+        texts.extend(context_header + text for text in chunks['extended_text'])
+
+        columns['file_name'].extend([filing['file_name']] * filing_chunks)
+        for column in ('company', 'form_type', 'filing_date', 'cik'):
+            columns[column].extend([shared[column]] * filing_chunks)
+        columns['chunk_id'].extend(range(filing_chunks))
+        columns['chunk_index'].extend(range(filing_chunks))
+        columns['core_tokens'].extend(chunks['core_tokens'])
+        columns['extended_tokens'].extend(chunks['extended_tokens'])
+
+    # A RecordBatch pickles as flat Arrow buffers, far cheaper than lists of objects
+    return texts, pa.RecordBatch.from_pydict(columns, schema=METADATA_SCHEMA), len(lines)
+
+
+def read_filing_batches(f):
+    """Yield lists of up to PREP_BATCH_FILINGS non-empty lines from a JSON Lines stream"""
+    batch = []
+    for line in f:
+        if line.strip():
+            batch.append(line)
+            if len(batch) == PREP_BATCH_FILINGS:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def main():
+    """Load the processed chunks, embed them, and validate and save the embeddings"""
+    print(f"[INFO] Input file: {INPUT_FILE}")
+    print(f"[INFO] Input exists: {INPUT_FILE.exists()}")
+    print(f"[INFO] Output directory: {OUTPUT_DIR}")
+
+    if INPUT_FILE.exists():
+        file_size_mb = INPUT_FILE.stat().st_size / (1024*1024)
+        print(f"[OK] Input file size: {file_size_mb:,.2f} MB")
+    else:
+        print("[FAIL] Input file not found!")
+        sys.exit(1)
+
+    # Install sentence-transformers if needed
+    try:
+        from sentence_transformers import SentenceTransformer, models
+        print("[OK] sentence-transformers already installed")
+    except ImportError:
+        print("[INFO] Installing sentence-transformers...")
+        import subprocess
+        subprocess.check_call([sys.executable, "-m", "pip", "install", "sentence-transformers", "-q"])
+        from sentence_transformers import SentenceTransformer, models
+        print("[OK] sentence-transformers installed")
+    import torch
+
+    # Probe the device once; reused for model placement and encode
+    HAS_CUDA = torch.cuda.is_available()
+    DEVICE = 'cuda' if HAS_CUDA else 'cpu'
+    if not HAS_CUDA:
+        torch.set_num_threads(CPU_THREADS)
+        torch.set_num_interop_threads(2)
+
+
+    def load_onnx_model():
+        """
+        Load the model on ONNX Runtime, exporting it on first use.
+
+        On CUDA the graph is O4-optimized (fused kernels, FP16 weights); on CPU it
+        is int8 dynamically quantized for VNNI. The export runs once and is cached
+        in ONNX_MODEL_DIR.
+
+        Returns:
+            tuple: (model, precision label)
+        """
+        from sentence_transformers import export_dynamic_quantized_onnx_model, export_optimized_onnx_model
+
+        if HAS_CUDA:
+            model_kwargs = {'provider': 'CUDAExecutionProvider'}
+            model_file = f'onnx/model_{ONNX_OPTIMIZATION}.onnx'
+            precision = f'fp16 (onnx {ONNX_OPTIMIZATION})'
+        else:
+            model_kwargs = {}
+            model_file = f'onnx/model_qint8_{ONNX_QUANTIZATION}.onnx'
+            precision = 'int8 (onnx)'
+
+        if not (ONNX_MODEL_DIR / model_file).exists():
+            print(f"[INFO] Exporting {MODEL_NAME} to ONNX ({precision})...")
+            onnx_model = SentenceTransformer(MODEL_NAME, backend='onnx', model_kwargs=model_kwargs)
+            onnx_model.save_pretrained(str(ONNX_MODEL_DIR))
+            if HAS_CUDA:
+                export_optimized_onnx_model(onnx_model, ONNX_OPTIMIZATION, str(ONNX_MODEL_DIR))
+            else:
+                export_dynamic_quantized_onnx_model(onnx_model, ONNX_QUANTIZATION, str(ONNX_MODEL_DIR))
+            print(f"[OK] ONNX model cached: {ONNX_MODEL_DIR / model_file}")
+
+        model = SentenceTransformer(
+            str(ONNX_MODEL_DIR),
+            backend='onnx',
+            model_kwargs={**model_kwargs, 'file_name': model_file}
+        )
+        return model, precision
+
+    # Load Processed Chunks
+    print(f"\n{'='*80}")
+    print(f"LOADING PROCESSED CHUNKS")
+    print(f"{'='*80}\n")
+    print(f"[INFO] Loading processed chunks from {INPUT_FILE.name}...")
+
+    # Filings are streamed from the zstd-compressed JSON Lines file in batches and
+    # parsed/flattened by worker processes; chunk metadata comes back one Arrow
+    # batch per task (for the ChromaDB step). At most 2 tasks per worker are in
+    # flight, so the decompressed corpus is never held in memory whole.
+    num_filings = 0
+    embedding_texts = []
+    metadata_batches = []
+
+
+    def collect(future):
+        """Append one finished batch's texts and metadata, in input order"""
+        nonlocal num_filings
+        texts, metadata_batch, batch_filings = future.result()
+        embedding_texts.extend(texts)
+        metadata_batches.append(metadata_batch)
+        num_filings += batch_filings
+
+
+    # The pool starts before the model is loaded, so no CUDA context or torch
+    # thread pool exists yet to be forked into the workers
+    with io.BufferedReader(pa.input_stream(INPUT_FILE, compression='zstd')) as f, \
+            ProcessPoolExecutor(max_workers=PREP_WORKERS, mp_context=multiprocessing.get_context(PREP_START_METHOD)) as executor:
+        in_flight = deque()
+        for batch in read_filing_batches(f):
+            in_flight.append(executor.submit(flatten_filings, batch))
+            if len(in_flight) >= 2 * PREP_WORKERS:
+                collect(in_flight.popleft())
+        while in_flight:
+            collect(in_flight.popleft())
+
+    print(f"[OK] Loaded {num_filings:,} filings")
+
+    # Save metadata as parquet now, so the batches are freed before encoding
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    metadata_table = pa.Table.from_batches(metadata_batches, schema=METADATA_SCHEMA)
+    pq.write_table(metadata_table, METADATA_FILE, compression='zstd', use_dictionary=DICTIONARY_COLUMNS)
+    del metadata_batches, metadata_table
+    print(f"[OK] Chunk metadata written to {METADATA_FILE.name}")
+
+    print(f"\n[OK] Extracted {len(embedding_texts):,} chunks for embedding")
+    print(f"[INFO] Using 'context_header' + 'extended_text' (extended with approximately 700 tokens)")
+
+    # Preview first chunk
+    print(f"\n[Preview] First chunk text (first 400 chars):")
+    print(embedding_texts[0][:400])
+
+    # Load Sentence Transformer Model
+    print(f"\n{'='*80}")
+    print(f"LOADING EMBEDDING MODEL")
+    print(f"{'='*80}\n")
+    print("[INFO] Loading sentence-transformers/all-MiniLM-L6-v2...")
+    print("[INFO] This will download ~80 MB on first run\n")
+
+    start_time = time.time()
+    if EMBED_BACKEND == 'onnx':
+        model, precision = load_onnx_model()
+    else:
+        if HAS_CUDA:
+            # FP16 weights run on tensor cores at half the memory traffic; normalized
+            # cosine retrieval is insensitive to the lost precision. Loading them as
+            # FP16 directly (low_cpu_mem_usage skips the FP32 init copy) halves the
+            # load and host-to-GPU transfer, per process for multi-GPU pools too
+            model = SentenceTransformer(
+                MODEL_NAME,
+                device=DEVICE,
+                model_kwargs={'torch_dtype': torch.float16, 'low_cpu_mem_usage': True}
+            )
+            precision = 'fp16'
+        else:
+            model = SentenceTransformer(MODEL_NAME, device=DEVICE)
+            precision = 'fp32'
+        if TORCH_COMPILE and torch.cuda.device_count() == 1:
+            # dynamic=True: length-sorted batches step through the SEQ_BUCKET lengths as
+            # encoding progresses. Multi-GPU pools copy the model to workers, so stay eager there
+            model[0].auto_model = torch.compile(model[0].auto_model, mode='reduce-overhead', dynamic=True)
+            precision += ' (torch.compile)'
+    # Normalize as the last module, on the model device: the pooled output comes back
+    # unit-norm, so neither the encode loops nor encode_multi_process renormalize
+    if not isinstance(model[-1], models.Normalize):
+        model.append(models.Normalize())
+    model.eval()
+    load_time = time.time() - start_time
+
+    print(f"\n[OK] Model loaded in {load_time:.2f} seconds")
+    print(f"[INFO] Model details:")
+    print(f"  - Model name: all-MiniLM-L6-v2")
+    print(f"  - Embedding dimensions: {model.get_sentence_embedding_dimension()}")
+    print(f"  - Max sequence length: {model.max_seq_length} tokens")
+    print(f"  - Device: {model.device}")
+    print(f"  - Backend: {EMBED_BACKEND}")
+    print(f"  - Precision: {precision}")
+
+    # Generate Embeddings
+    print(f"\n{'='*80}")
+    print(f"EMBEDDING GENERATION")
+    print(f"{'='*80}")
+    print(f"\nStarting embedding generation...")
+    print(f"  Total chunks: {len(embedding_texts):,}")
+    print(f"  Batch size: {BATCH_SIZE}")
+    print(f"  Device: {model.device}")
+    print(f"  Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"\nThis will take approximately 1-2 hours...\n")
+
+    start_time = time.time()
+    num_chunks = len(embedding_texts)
+
+    # Deduplicate identical texts (boilerplate repeated across filings): map every
+    # chunk to the id of its first identical text so each unique text is encoded once
+    unique_ids = {}
+    text_ids = np.fromiter(
+        (unique_ids.setdefault(text, len(unique_ids)) for text in embedding_texts),
+        dtype=np.int64,
+        count=num_chunks
+    )
+    unique_texts = list(unique_ids)
+    del unique_ids, embedding_texts
+    num_unique = len(unique_texts)
+    print(f"[INFO] Unique chunk texts: {num_unique:,} of {num_chunks:,} ({(1 - num_unique / num_chunks) * 100:.1f}% duplicates skipped)")
+
+    # Tokenize every unique text once: the ids are kept (flat array + offsets) for
+    # the in-process encode below, and their lengths drive the length sort so each
+    # batch pads to a similar sequence length
+    print(f"[INFO] Tokenizing unique chunks...")
+    token_dtype = np.uint16 if len(model.tokenizer) <= np.iinfo(np.uint16).max + 1 else np.int32
+    token_lengths = np.empty(num_unique, dtype=np.int32)
+    token_blocks = []
+    for start in range(0, num_unique, TOKENIZE_BATCH):
+        batch_ids = model.tokenizer(
+            unique_texts[start:start + TOKENIZE_BATCH],
+            padding=False,
+            truncation=True,
+            max_length=model.max_seq_length,
+            return_attention_mask=False,
+            return_token_type_ids=False
+        )['input_ids']
+        batch_lengths = np.fromiter(map(len, batch_ids), dtype=np.int32, count=len(batch_ids))
+        token_lengths[start:start + TOKENIZE_BATCH] = batch_lengths
+        token_blocks.append(np.fromiter(
+            itertools.chain.from_iterable(batch_ids), dtype=token_dtype, count=int(batch_lengths.sum())
+        ))
+    token_ids = np.concatenate(token_blocks)
+    token_offsets = np.zeros(num_unique + 1, dtype=np.int64)
+    np.cumsum(token_lengths, out=token_offsets[1:])
+    del token_blocks
+    # Primary key token length, secondary key text id: duplicates end up adjacent
+    length_order = np.lexsort((text_ids, token_lengths[text_ids]))
+    print(f"  Mean tokens per unique chunk: {token_lengths.mean():.0f}")
+
+    seq_cap = int(np.percentile(token_lengths[text_ids], MAX_SEQ_PERCENTILE))
+    if seq_cap < model.max_seq_length:
+        print(f"  Max sequence length: {model.max_seq_length} -> {seq_cap} (p{MAX_SEQ_PERCENTILE} of chunk lengths)")
+        model.max_seq_length = seq_cap
+    else:
+        print(f"  Max sequence length: {model.max_seq_length} (p{MAX_SEQ_PERCENTILE} of chunk lengths is {seq_cap})")
+    print()
+
+    # The output .npy is memory-mapped up front; each slab of length-sorted rows has
+    # its distinct texts encoded once, then expanded and scattered straight into its
+    # rows, so rows stay in chunk order (aligned with the metadata file). Pages spill
+    # to disk instead of holding the whole matrix in RAM, and every slab is flushed
+    # so finished work survives a crash.
+    embedding_dim = model.get_sentence_embedding_dimension()
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    embeddings = np.lib.format.open_memmap(
+        OUTPUT_FILE, mode='w+', dtype=np.float16, shape=(num_chunks, embedding_dim)
+    )
+
+    # The ONNX backend keeps the in-process encode path
+    gpu_count = torch.cuda.device_count() if EMBED_BACKEND != 'onnx' else 0
+    pool = None
+    if gpu_count > 1:
+        # One worker process per GPU; each slab is split evenly across them
+        target_devices = [f'cuda:{i}' for i in range(gpu_count)]
+        print(f"[INFO] Multi-GPU encoding on {gpu_count} devices: {', '.join(target_devices)}")
+        pool = model.start_multi_process_pool(target_devices=target_devices)
+
+    # Single GPU: each slab stays on the device as one tensor and is copied to a
+    # pinned host buffer asynchronously (one transfer per slab instead of one sync
+    # per batch). Two buffers alternate so slab k's copy overlaps slab k+1's encode.
+    pinned_slabs = None
+    if pool is None and HAS_CUDA and EMBED_BACKEND != 'onnx':
+        pinned_slabs = [
+            torch.empty((ENCODE_CHUNK_SIZE, embedding_dim), dtype=torch.float32, pin_memory=True)
+            for _ in range(2)
+        ]
+
+
+    def pad_batch(batch_unique_ids):
+        """
+        Build model features for a batch of pre-tokenized unique texts
+
+        Pads to the longest text in the batch, rounded up to a multiple of
+        SEQ_BUCKET (at most max_seq_length). Texts longer than the (possibly
+        lowered) max_seq_length are cut, keeping their closing special token.
+
+        Returns:
+            dict of input_ids / attention_mask (/ token_type_ids) tensors on the model device
+        """
+        lengths = np.minimum(token_lengths[batch_unique_ids], model.max_seq_length)
+        width = min(-(-int(lengths.max()) // SEQ_BUCKET) * SEQ_BUCKET, model.max_seq_length)
+        input_ids = np.full((len(lengths), width), model.tokenizer.pad_token_id, dtype=np.int64)
+        attention_mask = np.zeros(input_ids.shape, dtype=np.int64)
+        for row, (unique_id, length) in enumerate(zip(batch_unique_ids, lengths)):
+            ids = token_ids[token_offsets[unique_id]:token_offsets[unique_id + 1]]
+            if len(ids) > length:
+                input_ids[row, :length - 1] = ids[:length - 1]
+                input_ids[row, length - 1] = ids[-1]
+            else:
+                input_ids[row, :length] = ids
+            attention_mask[row, :length] = 1
+
+        features = {'input_ids': input_ids, 'attention_mask': attention_mask}
+        if 'token_type_ids' in model.tokenizer.model_input_names:
+            features['token_type_ids'] = np.zeros_like(input_ids)
+        return {name: torch.from_numpy(values).to(model.device) for name, values in features.items()}
+
+
+    def encode_tokenized(unique_ids):
+        """
+        Embed pre-tokenized unique texts (already in length order), skipping encode()'s re-tokenization
+
+        Returns:
+            L2-normalized (len(unique_ids), dim) tensor on the model device
+            (the model's Normalize module runs inside the forward pass)
+        """
+        batches = []
+        with torch.inference_mode():
+            for start in range(0, len(unique_ids), BATCH_SIZE):
+                features = pad_batch(unique_ids[start:start + BATCH_SIZE])
+                batches.append(model(features)['sentence_embedding'])
+        return torch.cat(batches)
+
+
+    def finish_slab(buffer, slab_rows, run_index, copied):
+        """Wait for a slab's device-to-host copy, then expand and scatter it into its rows"""
+        copied.synchronize()
+        embeddings[slab_rows] = buffer[:run_index[-1] + 1].numpy()[run_index]
+
+
+    pending = None  # (buffer, slab_rows, run_index, copy event) of the slab still in flight
+    try:
+        for start in range(0, num_chunks, ENCODE_CHUNK_SIZE):
+            # Encode each run of identical texts once; run_index maps rows to runs
+            slab_rows = length_order[start:start + ENCODE_CHUNK_SIZE]
+            slab_ids = text_ids[slab_rows]
+            run_starts = np.empty(len(slab_ids), dtype=bool)
+            run_starts[0] = True
+            np.not_equal(slab_ids[1:], slab_ids[:-1], out=run_starts[1:])
+            run_index = np.cumsum(run_starts) - 1
+            slab_unique_ids = slab_ids[run_starts]
+
+            if pool is not None:
+                # Pool workers tokenize their share of texts themselves
+                embeddings[slab_rows] = model.encode_multi_process(
+                    [unique_texts[i] for i in slab_unique_ids],
+                    pool,
+                    batch_size=BATCH_SIZE,
+                    chunk_size=-(-len(slab_unique_ids) // gpu_count)
+                )[run_index]
+            elif pinned_slabs is not None:
+                slab = encode_tokenized(slab_unique_ids)
+                buffer = pinned_slabs[(start // ENCODE_CHUNK_SIZE) % 2]
+                buffer[:len(slab_unique_ids)].copy_(slab, non_blocking=True)
+                copied = torch.cuda.Event()
+                copied.record()
+                if pending is not None:
+                    finish_slab(*pending)
+                pending = (buffer, slab_rows, run_index, copied)
+            else:
+                embeddings[slab_rows] = encode_tokenized(slab_unique_ids).float().cpu().numpy()[run_index]
+
+            embeddings.flush()
+            done = start + len(slab_rows)
+            elapsed = time.time() - start_time
+            rate = done / elapsed if elapsed > 0 else 0
+            eta_minutes = (num_chunks - done) / rate / 60 if rate > 0 else 0
+            print(f"[Progress] {done:,}/{num_chunks:,} ({done / num_chunks * 100:.1f}%) - {rate:.1f} chunks/sec - ETA: {eta_minutes:.1f} min")
+
+        if pending is not None:
+            finish_slab(*pending)
+        embeddings.flush()
+    finally:
+        if pool is not None:
+            model.stop_multi_process_pool(pool)
+    del token_lengths, token_ids, token_offsets, length_order, text_ids, unique_texts, pinned_slabs, pending
+
+    embedding_time = time.time() - start_time
+
+    print(f"\n{'='*80}")
+    print(f"EMBEDDING GENERATION COMPLETE")
+    print(f"{'='*80}")
+    print(f"\nGeneration time: {embedding_time:.2f} seconds ({embedding_time/60:.2f} minutes)")
+    print(f"Speed: {num_chunks / embedding_time:.2f} chunks/second")
+    print(f"\nEmbeddings shape: {embeddings.shape}")
+    print(f"Expected: [{num_chunks:,}, 384]")
+    # Statistics and validation inputs in one blocked pass: each block is read from
+    # memory once, and its min/max/sum/row norms are all reduced while it is in cache.
+    # NaN/Inf propagate into the squared norms, so one finite check covers both.
+    value_min, value_max, value_sum = np.inf, -np.inf, 0.0
+    squared_norms = np.empty(len(embeddings), dtype=np.float64)
+    for start in range(0, len(embeddings), VALIDATE_BLOCK_ROWS):
+        block = embeddings[start:start + VALIDATE_BLOCK_ROWS]
+        value_min = min(value_min, block.min())
+        value_max = max(value_max, block.max())
+        value_sum += block.sum(dtype=np.float64)
+        squared_norms[start:start + VALIDATE_BLOCK_ROWS] = np.einsum('ij,ij->i', block, block, dtype=np.float64)
+    value_mean = value_sum / embeddings.size
+    value_std = np.sqrt(max(squared_norms.sum() / embeddings.size - value_mean ** 2, 0.0))
+
+    print(f"\nEmbedding statistics:")
+    print(f"  Min value: {value_min:.6f}")
+    print(f"  Max value: {value_max:.6f}")
+    print(f"  Mean: {value_mean:.6f}")
+    print(f"  Std: {value_std:.6f}")
+
+    # Validate Embeddings
+    print(f"\n{'='*80}")
+    print(f"VALIDATION")
+    print(f"{'='*80}\n")
+    print(f"[INFO] Running validation checks...\n")
+
+    # Check 1: Correct shape
+    assert embeddings.shape == (num_chunks, 384), "Incorrect embedding shape!"
+    print("[OK] Shape check passed")
+
+    # Check 2: No NaN or Inf values
+    assert np.isfinite(squared_norms).all(), "NaN/Inf values found in embeddings!"
+    print("[OK] No NaN/Inf values")
+
+    # Check 3: Embeddings are normalized (L2 norm ≈ 1)
+    norms = np.sqrt(squared_norms)
+    # Stored in float16, accurate to ~1e-3 in norm
+    assert np.allclose(norms, 1.0, atol=2e-3), "Embeddings not properly normalized!"
+    print(f"[OK] Embeddings normalized (L2 norm = {norms.mean():.6f})")
+
+    # Check 4: Test similarity between similar chunks
+    # Same float32 matrix-vector product the RAG retriever uses (one SGEMV call)
+    similarity, similarity_adjacent = (
+        np.ascontiguousarray(embeddings[:2], dtype=np.float32) @ np.ascontiguousarray(embeddings[0], dtype=np.float32)
+    )
+    print(f"[OK] Self-similarity check: {similarity:.6f} (should be ~1.0)")
+    print(f"[INFO] Adjacent chunk similarity: {similarity_adjacent:.6f}")
+
+    print(f"\n[SUCCESS] All validation checks passed!")
+
+    # Save Embeddings
+    print(f"\n{'='*80}")
+    print(f"SAVING OUTPUTS")
+    print(f"{'='*80}\n")
+    # Embeddings were written in place to the memory-mapped .npy during encoding
+    file_size_mb = OUTPUT_FILE.stat().st_size / (1024*1024)
+
+    print(f"[OK] Embeddings saved!")
+    print(f"  File: {OUTPUT_FILE.name}")
+    print(f"  Size: {file_size_mb:,.2f} MB")
+
+    # Metadata was written right after loading
+    metadata_size_mb = METADATA_FILE.stat().st_size / (1024*1024)
+    print(f"\n[OK] Metadata saved!")
+    print(f"  File: {METADATA_FILE.name}")
+    print(f"  Size: {metadata_size_mb:,.2f} MB")
+
+    # Summary Statistics
+    print(f"\n{'='*80}")
+    print(f"EMBEDDING GENERATION SUMMARY")
+    print(f"{'='*80}")
+
+    print(f"\nModel:")
+    print(f"  Name: sentence-transformers/all-MiniLM-L6-v2")
+    print(f"  Dimensions: 384")
+    print(f"  Parameters: 22.7M")
+    print(f"  Device: {model.device}")
+    print(f"  Precision: {precision}")
+
+    print(f"\nData:")
+    print(f"  Input file: {INPUT_FILE.name}")
+    print(f"  Total filings: {num_filings:,}")
+    print(f"  Total chunks: {num_chunks:,}")
+    print(f"  Unique chunk texts encoded: {num_unique:,}")
+    print(f"  Avg chunks/filing: {num_chunks / num_filings:.1f}")
+
+    print(f"\nPerformance:")
+    print(f"  Generation time: {embedding_time:.2f} seconds ({embedding_time/60:.2f} minutes)")
+    print(f"  Speed: {num_chunks / embedding_time:.2f} chunks/second")
+    print(f"  Speed: {num_chunks / embedding_time * 60:.0f} chunks/minute")
+
+    print(f"\nOutput:")
+    print(f"  Embeddings file: {OUTPUT_FILE.name}")
+    print(f"  Embeddings size: {file_size_mb:,.2f} MB")
+    print(f"  Embeddings shape: {embeddings.shape}")
+    print(f"  Metadata file: {METADATA_FILE.name}")
+    print(f"  Metadata size: {metadata_size_mb:,.2f} MB")
+
+    print(f"\nStorage breakdown:")
+    print(f"  Per-chunk embedding: {384 * 2 / 1024:.2f} KB (384 dims × 2 bytes, float16)")
+    print(f"  Total embeddings: {file_size_mb:,.2f} MB")
+
+    print(f"\nNext steps:")
+    print(f"  1. Option A: Simple RAG - Load into ChromaDB for basic retrieval testing")
+    print(f"  2. Option B: RAPTOR - Implement clustering (UMAP + GMM) and summarization")
+    print(f"  3. Run experimental comparison: Baseline vs Simple RAG vs RAPTOR RAG")
+    print(f"  4. Evaluate with RAGAS framework")
+
+    print(f"\nResearch citations:")
+    print(f"  - Sentence-BERT: https://arxiv.org/abs/1908.10084")
+    print(f"  - MTEB Benchmark: https://arxiv.org/abs/2210.07316")
+    print(f"  - RAPTOR Paper: https://arxiv.org/abs/2401.18059")
+    print(f"  - MTEB Leaderboard: https://huggingface.co/spaces/mteb/leaderboard")
+
+    print(f"\n{'='*80}")
+    print(f"ALL DONE!")
+    print(f"{'='*80}")
+
+
+if __name__ == '__main__':
+    main()
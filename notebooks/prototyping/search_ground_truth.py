@@ -40,8 +40,10 @@ The RAG system uses dot-product similarity to measure how close a query is to ea
    - 0.50-0.60: Weak match (likely tangentially related)
    - <0.50  : Poor match (probably not relevant)
 
-See: src/pipeline/rag_query.py line 115
-     similarities = np.dot(self.embeddings, query_embedding)
+See: src/pipeline/rag_query.py SimpleRAG.retrieve
+     similarities = block @ query_embedding  (full scan)
+     With a FAISS IVF-PQ index (--build-index), only the probed inverted lists
+     are searched and the candidates are re-scored with the same dot product.
 """
 
 GROUND_TRUTH_TESTS = [
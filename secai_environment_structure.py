@@ -10,24 +10,134 @@ import os
 import sys
 from pathlib import Path
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import shutil
 
-def run_command(cmd, shell=True):
-    """Run a shell command and return output."""
+# Commands are I/O-bound and independent, so they run concurrently on a small
+# thread pool; the checks still print their results in section order
+COMMAND_WORKERS = 8
+_executor = ThreadPoolExecutor(max_workers=COMMAND_WORKERS)
+_pending = {}
+
+# Every command whose arguments are known at import time, as (title, argv).
+# main() starts them all up front; the checks only print the results.
+IS_WINDOWS = platform.system() == "Windows"
+MEMORY_COMMAND = ("wmic", "computersystem", "get", "TotalPhysicalMemory")
+DOCKER_COMMANDS = (
+    ("Running Containers", ("docker", "ps")),
+    ("All Containers (including stopped)", ("docker", "ps", "-a")),
+    ("Docker System Usage", ("docker", "system", "df")),
+)
+DOCKER_VERSION_COMMAND = ("docker", "--version")
+CONTAINER_NAMES_COMMAND = ("docker", "ps", "-a", "--format", "{{.Names}}")
+OLLAMA_COMMANDS = (
+    ("Ollama Version", ("ollama", "--version")),
+    ("Ollama Models", ("ollama", "list")),
+)
+PROCESS_LIST_COMMAND = ("tasklist",) if IS_WINDOWS else ("ps", "aux")
+NETSTAT_COMMAND = ("netstat", "-an") if IS_WINDOWS else ("netstat", "-tlnp")
+PIP_LIST_COMMAND = (sys.executable, "-m", "pip", "list")
+GIT_COMMANDS = (
+    ("Git Version", ("git", "--version")),
+    ("Git Status", ("git", "status")),
+    ("Current Branch", ("git", "branch", "--show-current")),
+    ("Recent Commits (last 5)", ("git", "log", "--oneline", "-5")),
+    ("Remote URL", ("git", "remote", "-v")),
+)
+STATIC_COMMANDS = (
+    ((MEMORY_COMMAND,) if IS_WINDOWS else ())
+    + (DOCKER_VERSION_COMMAND, CONTAINER_NAMES_COMMAND)
+    + tuple(args for _, args in DOCKER_COMMANDS + OLLAMA_COMMANDS + GIT_COMMANDS)
+    + (PROCESS_LIST_COMMAND, NETSTAT_COMMAND, PIP_LIST_COMMAND)
+)
+
+def prefetch_commands(commands):
+    """Start commands in the background; run_command picks up their results."""
+    for args in commands:
+        key = tuple(args)
+        if key not in _pending:
+            _pending[key] = _executor.submit(_run_command, args)
+
+def run_command(args):
+    """
+    Run a command (argument list, no shell) and return its output.
+
+    Uses the prefetched result when the command was started by prefetch_commands.
+    """
+    future = _pending.get(tuple(args))
+    return future.result() if future is not None else _run_command(args)
+
+def _run_command(args):
+    """
+    Run a command (argument list, no shell) and return its output.
+
+    Missing executables are reported without spawning anything; pipes and
+    findstr/grep filtering are done in Python by the callers.
+    """
+    if shutil.which(args[0]) is None:
+        return f"Error: {args[0]} not found"
     try:
-        result = subprocess.run(cmd, shell=shell, capture_output=True, text=True, timeout=30)
+        result = subprocess.run(args, capture_output=True, text=True, timeout=30)
         return result.stdout.strip() if result.returncode == 0 else f"Error: {result.stderr.strip()}"
     except subprocess.TimeoutExpired:
         return "Command timed out"
     except Exception as e:
         return f"Error: {str(e)}"
 
+def filter_lines(output, *needles):
+    """Keep the lines of a command's output that contain any of the needles."""
+    if output.startswith("Error:"):
+        return output
+    return "\n".join(line for line in output.splitlines() if any(n in line for n in needles))
+
+def scan_tree(root):
+    """
+    Walk a directory tree once with os.scandir.
+
+    Sizes come from the directory entries (no extra stat per is_file check),
+    and symlinks are not followed.
+
+    Returns:
+        tuple: (total bytes, file count, {immediate subdirectory name: bytes})
+    """
+    total_size = 0
+    file_count = 0
+    subdir_sizes = {}
+    # Each stack item: (directory, name of the immediate subdirectory it lies under)
+    stack = [(root, None)]
+    while stack:
+        dir_path, top = stack.pop()
+        try:
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append((entry.path, top if top is not None else entry.name))
+                        if top is None:
+                            subdir_sizes.setdefault(entry.name, 0)
+                    elif entry.is_file(follow_symlinks=False):
+                        size = entry.stat(follow_symlinks=False).st_size
+                        total_size += size
+                        file_count += 1
+                        if top is not None:
+                            subdir_sizes[top] += size
+        except OSError:
+            continue
+    return total_size, file_count, subdir_sizes
+
 def print_section(title):
     """Print a formatted section header."""
     print("\n" + "=" * 60)
     print(title)
     print("=" * 60)
 
+def print_commands(commands):
+    """Print each (title, argv) command's output under its title."""
+    for i, (title, args) in enumerate(commands):
+        if i:
+            print()
+        print(f"{title}:")
+        print(run_command(args))
+
 def check_system_info():
     """Check basic system information."""
     print_section("1. SYSTEM INFORMATION")
@@ -38,8 +148,8 @@ def check_system_info():
     print(f"Hostname: {platform.node()}")
 
     # Memory info (Windows-specific)
-    if platform.system() == "Windows":
-        mem_info = run_command("wmic computersystem get TotalPhysicalMemory")
+    if IS_WINDOWS:
+        mem_info = run_command(MEMORY_COMMAND)
         print(f"\nMemory Info:\n{mem_info}")
 
     # Disk info
@@ -57,82 +167,63 @@ def check_docker():
     print_section("2. DOCKER CONTAINERS (Local)")
 
     # Check if Docker is installed
-    docker_version = run_command("docker --version")
+    docker_version = run_command(DOCKER_VERSION_COMMAND)
     print(f"Docker Version: {docker_version}")
-
-    # Running containers
-    print("\nRunning Containers:")
-    print(run_command("docker ps"))
-
-    # All containers
-    print("\nAll Containers (including stopped):")
-    print(run_command("docker ps -a"))
-
-    # Docker system info
-    print("\nDocker System Usage:")
-    print(run_command("docker system df"))
+    print()
+    print_commands(DOCKER_COMMANDS)
 
 def check_docker_details():
     """Check specific Docker container details."""
     print_section("3. DOCKER CONTAINER DETAILS")
 
-    # Check for ChromaDB container
-    print("Checking for ChromaDB container...")
-    chromadb_check = run_command('docker ps -a --filter "name=chroma" --format "{{.Names}}"')
-    if chromadb_check and "Error" not in chromadb_check:
-        print(f"ChromaDB Container: {chromadb_check}")
-        print("\nStatus:")
-        print(run_command(f'docker ps -a --filter "name={chromadb_check}"'))
-        print("\nPort Mappings:")
-        print(run_command(f'docker port {chromadb_check}'))
-        print("\nMounts:")
-        print(run_command(f'docker inspect -f "{{{{ .Mounts }}}}" {chromadb_check}'))
-    else:
-        print("No ChromaDB container found")
-
-    # Check for Open WebUI container
-    print("\nChecking for Open WebUI container...")
-    webui_check = run_command('docker ps -a --filter "name=webui" --format "{{.Names}}"')
-    if not webui_check or "Error" in webui_check:
-        webui_check = run_command('docker ps -a --filter "name=open-webui" --format "{{.Names}}"')
-
-    if webui_check and "Error" not in webui_check:
-        print(f"Open WebUI Container: {webui_check}")
-        print("\nStatus:")
-        print(run_command(f'docker ps -a --filter "name={webui_check}"'))
-        print("\nPort Mappings:")
-        print(run_command(f'docker port {webui_check}'))
-        print("\nMounts:")
-        print(run_command(f'docker inspect -f "{{{{ .Mounts }}}}" {webui_check}'))
-    else:
-        print("No Open WebUI container found")
+    # List container names once and match both services against it
+    names = run_command(CONTAINER_NAMES_COMMAND)
+    container_names = [] if names.startswith("Error:") else names.splitlines()
+
+    # "webui" also matches "open-webui"
+    services = [("ChromaDB", "chroma"), ("Open WebUI", "webui")]
+    matches = {label: [name for name in container_names if needle in name] for label, needle in services}
+
+    def container_commands(container):
+        return [
+            ("Status", ["docker", "ps", "-a", "--filter", f"name={container}"]),
+            ("Port Mappings", ["docker", "port", container]),
+            ("Mounts", ["docker", "inspect", "-f", "{{ .Mounts }}", container]),
+        ]
+
+    # Start every per-container lookup before printing the first one
+    prefetch_commands(args for containers in matches.values()
+                      for container in containers
+                      for _, args in container_commands(container))
+
+    for i, (label, _) in enumerate(services):
+        if i:
+            print()
+        print(f"Checking for {label} container...")
+        if not matches[label]:
+            print(f"No {label} container found")
+            continue
+        for container in matches[label]:
+            print(f"{label} Container: {container}")
+            for title, args in container_commands(container):
+                print(f"\n{title}:")
+                print(run_command(args))
 
 def check_ollama():
     """Check Ollama installation."""
     print_section("4. OLLAMA INSTALLATION")
 
-    # Ollama version
-    print("Ollama Version:")
-    print(run_command("ollama --version"))
+    print_commands(OLLAMA_COMMANDS)
 
-    # Ollama models
-    print("\nOllama Models:")
-    print(run_command("ollama list"))
-
-    # Ollama process (Windows)
-    if platform.system() == "Windows":
-        print("\nOllama Process:")
-        print(run_command('tasklist | findstr "ollama"'))
-    else:
-        print("\nOllama Process:")
-        print(run_command("ps aux | grep ollama | grep -v grep"))
+    print("\nOllama Process:")
+    print(filter_lines(run_command(PROCESS_LIST_COMMAND), "ollama"))
 
     # Check Ollama directory
     ollama_home = Path.home() / ".ollama"
     if ollama_home.exists():
         print(f"\nOllama Home Directory ({ollama_home}):")
         for item in ollama_home.iterdir():
-            size = sum(f.stat().st_size for f in item.rglob('*') if f.is_file()) if item.is_dir() else item.stat().st_size
+            size = scan_tree(item)[0] if item.is_dir() else item.stat().st_size
             size_gb = size / (1024**3)
             print(f"  {item.name}: {size_gb:.2f} GB")
     else:
@@ -151,19 +242,16 @@ def check_filesystem():
         dir_path = project_root / dirname
         if dir_path.exists():
             if dir_path.is_dir():
-                size = sum(f.stat().st_size for f in dir_path.rglob('*') if f.is_file())
+                size, file_count, subdir_sizes = scan_tree(dir_path)
                 size_mb = size / (1024**2)
-                file_count = sum(1 for _ in dir_path.rglob('*') if _.is_file())
                 print(f"\n{dirname}/: {size_mb:.1f} MB ({file_count} files)")
 
-                # Show structure for important directories
+                # Show structure for important directories (sizes from the same walk)
                 if dirname == "data":
                     print("  Data structure:")
-                    for subdir in sorted(dir_path.iterdir()):
-                        if subdir.is_dir():
-                            sub_size = sum(f.stat().st_size for f in subdir.rglob('*') if f.is_file())
-                            sub_size_mb = sub_size / (1024**2)
-                            print(f"    {subdir.name}/: {sub_size_mb:.1f} MB")
+                    for subdir_name in sorted(subdir_sizes):
+                        sub_size_mb = subdir_sizes[subdir_name] / (1024**2)
+                        print(f"    {subdir_name}/: {sub_size_mb:.1f} MB")
             else:
                 print(f"\n{dirname}: (file, not directory)")
         else:
@@ -182,22 +270,24 @@ def check_network():
 
     print("Checking listening ports...")
 
-    if platform.system() == "Windows":
+    if IS_WINDOWS:
+        # One netstat run, filtered per section
+        netstat = run_command(NETSTAT_COMMAND)
         print("\nListening TCP Ports:")
-        print(run_command("netstat -an | findstr LISTENING"))
+        print(filter_lines(netstat, "LISTENING"))
 
         # Check specific ports
         print("\nPort 8000 (ChromaDB):")
-        print(run_command("netstat -an | findstr :8000"))
+        print(filter_lines(netstat, ":8000"))
 
         print("\nPort 8080 (Open WebUI):")
-        print(run_command("netstat -an | findstr :8080"))
+        print(filter_lines(netstat, ":8080"))
 
         print("\nPort 11434 (Ollama):")
-        print(run_command("netstat -an | findstr :11434"))
+        print(filter_lines(netstat, ":11434"))
     else:
         print("\nListening Ports:")
-        print(run_command("netstat -tlnp"))
+        print(run_command(NETSTAT_COMMAND))
 
 def check_python_env():
     """Check Python environment."""
@@ -213,7 +303,7 @@ def check_python_env():
 
     # List installed packages
     print("\nInstalled Packages:")
-    print(run_command("pip list"))
+    print(run_command(PIP_LIST_COMMAND))
 
     # Check requirements.txt
     req_file = Path.cwd() / "requirements.txt"
@@ -228,20 +318,7 @@ def check_git():
     """Check Git status."""
     print_section("8. GIT REPOSITORY")
 
-    print("Git Version:")
-    print(run_command("git --version"))
-
-    print("\nGit Status:")
-    print(run_command("git status"))
-
-    print("\nCurrent Branch:")
-    print(run_command("git branch --show-current"))
-
-    print("\nRecent Commits (last 5):")
-    print(run_command('git log --oneline -5'))
-
-    print("\nRemote URL:")
-    print(run_command("git remote -v"))
+    print_commands(GIT_COMMANDS)
 
 def check_project_files():
     """Check key project files."""
@@ -290,6 +367,7 @@ def main():
     print(f"Working Directory: {Path.cwd()}")
     print("=" * 60)
 
+    prefetch_commands(STATIC_COMMANDS)
     try:
         check_system_info()
         check_docker()
@@ -303,6 +381,7 @@ def main():
         check_notebooks()
     except KeyboardInterrupt:
         print("\n\nDiagnostics interrupted by user")
+        _executor.shutdown(wait=False, cancel_futures=True)
         sys.exit(1)
     except Exception as e:
         print(f"\n\nError during diagnostics: {e}")
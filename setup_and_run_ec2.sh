@@ -15,7 +15,7 @@ sudo chown -R kabe:kabe /app/data
 # Step 2: Move files into place
 echo ""
 echo "[2/6] Moving files into Docker-accessible locations..."
-sudo cp ~/processed_2024_500tok_contextual.json /app/data/processed/2024_filings/
+sudo cp ~/processed_2024_500tok_contextual.jsonl.zst /app/data/processed/2024_filings/
 sudo cp ~/embed_all_2024_ec2.py /app/
 sudo chown -R kabe:kabe /app
 
@@ -0,0 +1,245 @@
+"""
+Minimal SEC EDGAR client shared by the 10-K and 8-K scrapers.
+
+Lists a company's filings from the submissions API
+(https://data.sec.gov/submissions/CIK##########.json) and downloads them from
+the EDGAR archive. Safe to share between threads: every request goes through
+one rate limiter that keeps the whole process within SEC's fair-access limit,
+and over one keep-alive connection pool, so the TLS handshake to each SEC host
+is paid once per pooled connection rather than once per file.
+
+Submissions JSON can be cached on disk per CIK and revalidated with a
+conditional GET (ETag / Last-Modified): unchanged indexes come back as a
+bodiless 304 on reruns.
+
+Each filing is stored as one zstd-compressed tar ({accession}.tar.zst holding
+full-submission.txt and primary-document.<ext>) instead of a directory of
+loose files: SEC text/HTML compresses several-fold, and readers open one file
+per filing.
+"""
+
+import io
+import json
+import tarfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pyarrow as pa
+import requests
+from requests.adapters import HTTPAdapter
+
+SUBMISSIONS_URL = "https://data.sec.gov/submissions/CIK{cik:010d}.json"
+# Older filings beyond the ~1000 in filings.recent are split into these pages
+SUBMISSIONS_PAGE_URL = "https://data.sec.gov/submissions/{name}"
+ARCHIVES_URL = "https://www.sec.gov/Archives/edgar/data/{cik}/{accession_nodash}/{name}"
+
+# SEC fair-access policy: at most 10 requests per second
+MAX_REQUESTS_PER_SECOND = 10
+REQUEST_TIMEOUT = 60
+# 429/503 responses are retried with exponential backoff
+MAX_RETRIES = 3
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# Kept-alive connections per host (data.sec.gov, www.sec.gov); one per
+# concurrent download thread so no request waits for or reopens a connection
+POOL_SIZE = MAX_REQUESTS_PER_SECOND
+
+ARCHIVE_SUFFIX = ".tar.zst"
+# Tar records are only 10 KB; buffering ahead of the compressor means each
+# archive is compressed and written in a few large writes instead of dozens
+ARCHIVE_WRITE_BUFFER = 8 * 1024 * 1024
+
+
+def write_filing_archive(archive_path: Path, members: Dict[str, bytes]) -> Path:
+    """
+    Write a filing's files as one zstd-compressed tar.
+
+    Written to a temporary name and renamed, so an archive that exists is complete;
+    the temporary file is removed if the write fails.
+
+    Args:
+        archive_path: Destination .tar.zst path
+        members: {file name: contents}
+
+    Returns:
+        archive_path
+    """
+    archive_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = archive_path.with_name(archive_path.name + ".tmp")
+    mtime = time.time()
+    try:
+        with pa.output_stream(str(tmp_path), compression="zstd", buffer_size=ARCHIVE_WRITE_BUFFER) as stream:
+            with tarfile.open(fileobj=stream, mode="w|") as tar:
+                for name, data in members.items():
+                    info = tarfile.TarInfo(name)
+                    info.size = len(data)
+                    info.mtime = mtime
+                    tar.addfile(info, io.BytesIO(data))
+        tmp_path.replace(archive_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return archive_path
+
+
+def read_filing_archive(archive_path: Path) -> Dict[str, bytes]:
+    """
+    Read a filing archive written by write_filing_archive in one sequential pass.
+
+    Returns:
+        {file name: contents}
+    """
+    with pa.input_stream(str(archive_path), compression="zstd") as stream:
+        with tarfile.open(fileobj=stream, mode="r|") as tar:
+            return {member.name: tar.extractfile(member).read() for member in tar}
+
+
+class EdgarClient:
+    """Thread-safe EDGAR client with a process-wide request rate limit."""
+
+    def __init__(self, user_agent: str, cache_dir: Optional[Path] = None):
+        """
+        Initialize the client.
+
+        Args:
+            user_agent: SEC-required User-Agent ("Name email@domain.com")
+            cache_dir: Directory for cached submissions JSON (None disables caching)
+        """
+        self.user_agent = user_agent
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.session = requests.Session()
+        self.session.headers.update({"User-Agent": user_agent})
+        self.session.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=POOL_SIZE))
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def _wait_for_slot(self):
+        """Block until the next request fits within MAX_REQUESTS_PER_SECOND."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1 / MAX_REQUESTS_PER_SECOND
+        if slot > now:
+            time.sleep(slot - now)
+
+    def _get(self, url: str, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        """Rate-limited GET; raises requests.HTTPError on a non-retryable failure."""
+        for attempt in range(MAX_RETRIES + 1):
+            self._wait_for_slot()
+            response = self.session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+            if response.status_code not in RETRY_STATUS or attempt == MAX_RETRIES:
+                break
+            time.sleep(2 ** attempt)
+        response.raise_for_status()
+        return response
+
+    def close(self):
+        """Close the pooled connections."""
+        self.session.close()
+
+    def get_submissions(self, cik: str) -> Dict:
+        """
+        Fetch a company's submissions JSON, revalidating the on-disk copy if cached.
+
+        Args:
+            cik: CIK (leading zeros optional)
+
+        Returns:
+            Parsed submissions JSON
+        """
+        return self._get_json(SUBMISSIONS_URL.format(cik=int(cik)), f"CIK{int(cik):010d}.json")
+
+    def _get_json(self, url: str, cache_name: str) -> Dict:
+        """
+        GET a JSON document, cached under cache_dir/cache_name and revalidated
+        with a conditional GET when caching is enabled.
+        """
+        if self.cache_dir is None:
+            return self._get(url).json()
+
+        cache_path = self.cache_dir / cache_name
+        validators_path = cache_path.with_suffix(".validators.json")
+        headers = {}
+        if cache_path.exists() and validators_path.exists():
+            with open(validators_path, "r", encoding="utf-8") as f:
+                validators = json.load(f)
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"):
+                headers["If-Modified-Since"] = validators["last_modified"]
+
+        response = self._get(url, headers=headers)
+        if response.status_code == 304:
+            return json.loads(cache_path.read_bytes())
+
+        # Validators are written last, so they only ever describe a complete cache file
+        validators_path.unlink(missing_ok=True)
+        cache_path.write_bytes(response.content)
+        with open(validators_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }, f)
+        return response.json()
+
+    def list_filings(self, cik: str, form: str, after: str, before: str) -> List[Dict[str, str]]:
+        """
+        List a company's filings of one form type within a filing-date range.
+
+        Args:
+            cik: CIK (leading zeros optional)
+            form: Form type, matched exactly (amendments such as 10-K/A are excluded)
+            after: Earliest filing date, YYYY-MM-DD (inclusive)
+            before: Latest filing date, YYYY-MM-DD (inclusive)
+
+        Returns:
+            List of {"accession", "primary_doc", "filing_date"} dicts
+        """
+        filings = self.get_submissions(cik)["filings"]
+        # Same column layout in filings.recent and in every older page; only pages
+        # whose filing dates overlap the range are fetched
+        blocks = [filings["recent"]] + [
+            self._get_json(SUBMISSIONS_PAGE_URL.format(name=page["name"]), page["name"])
+            for page in filings.get("files", [])
+            if page["filingFrom"] <= before and page["filingTo"] >= after
+        ]
+        return [
+            {"accession": accession, "primary_doc": primary_doc, "filing_date": filing_date}
+            for block in blocks
+            for accession, filing_form, primary_doc, filing_date in zip(
+                block["accessionNumber"], block["form"], block["primaryDocument"], block["filingDate"]
+            )
+            if filing_form == form and after <= filing_date <= before
+        ]
+
+    def download_filing(self, cik: str, accession: str, primary_doc: str, archive_path: Path) -> Path:
+        """
+        Download a filing's full submission text and primary document into one archive.
+
+        Member names keep the file names sec-edgar-downloader used:
+        full-submission.txt and primary-document.<ext>
+
+        Args:
+            cik: CIK (leading zeros optional)
+            accession: Accession number (0000320193-24-000123)
+            primary_doc: Primary document file name from the submissions API
+            archive_path: Destination .tar.zst path for this filing
+
+        Returns:
+            archive_path
+        """
+        accession_nodash = accession.replace("-", "")
+        full_submission = self._get(ARCHIVES_URL.format(
+            cik=int(cik), accession_nodash=accession_nodash, name=f"{accession}.txt"
+        ))
+        document = self._get(ARCHIVES_URL.format(
+            cik=int(cik), accession_nodash=accession_nodash, name=primary_doc
+        ))
+
+        return write_filing_archive(archive_path, {
+            "full-submission.txt": full_submission.content,
+            f"primary-document{Path(primary_doc).suffix}": document.content,
+        })
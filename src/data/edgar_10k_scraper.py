@@ -2,26 +2,37 @@
 SEC EDGAR 10-K Scraper
 
 Downloads 10-K filings from SEC EDGAR for specified companies and fiscal years.
-Uses sec-edgar-downloader library which handles rate limiting and filing lookup.
+Filings are listed from the EDGAR submissions API and downloaded concurrently
+across all companies, within SEC's 10 requests/second limit (see _edgar_client).
 
 Usage:
     scraper = Edgar10KScraper()
     scraper.download_all_companies()
+
+    python -m src.data.edgar_10k_scraper
 """
 
 import os
+import sys
 import json
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Tuple
+import orjson
 from dotenv import load_dotenv
-from sec_edgar_downloader import Downloader
+from src.data._edgar_client import ARCHIVE_SUFFIX, EdgarClient, MAX_REQUESTS_PER_SECOND
 
 # Load environment variables
 load_dotenv()
 
+FORM_TYPE = "10-K"
+# Enough concurrent downloads to keep the shared rate limit saturated
+DOWNLOAD_WORKERS = MAX_REQUESTS_PER_SECOND
+
 
 class Edgar10KScraper:
-    """Scraper for downloading 10-K filings from SEC EDGAR using sec-edgar-downloader library."""
+    """Scraper for downloading 10-K filings from SEC EDGAR."""
 
     def __init__(self, data_dir: str = "data/raw"):
         """
@@ -41,16 +52,71 @@ class Edgar10KScraper:
                 "SEC_USER_AGENT='YourName your.email@company.com'"
             )
 
-        # Initialize downloader with user agent and output directory
-        self.downloader = Downloader(
-            company_name="EDGAR_Analytics",
-            email_address=self.user_agent.split()[-1],  # Extract email from user agent
-            download_folder=str(self.data_dir)
+        # One client (and rate limiter) shared by every download thread; each
+        # CIK's submissions index is cached and revalidated with conditional GETs
+        self.index_cache_dir = self.data_dir / ".cik_index_cache"
+        self.client = EdgarClient(self.user_agent, cache_dir=self.index_cache_dir)
+        # One archive per filing: {CIK}/{form}/{accession}.tar.zst
+        self.filings_dir = self.data_dir / "sec-edgar-filings"
+        # (cik, accession) of filings already on disk, scanned once; archives are
+        # renamed into place when complete, so every match is a full download
+        self.have = {
+            (path.parent.parent.name, path.name[:-len(ARCHIVE_SUFFIX)])
+            for path in self.filings_dir.glob(f"*/{FORM_TYPE}/*{ARCHIVE_SUFFIX}")
+        }
+        # Filings from earlier runs in the old {accession}/ directory layout count
+        # too (the primary document was written last there)
+        self.have.update(
+            (path.parent.parent.parent.name, path.parent.name)
+            for path in self.filings_dir.glob(f"*/{FORM_TYPE}/*/primary-document.*")
         )
 
-    def download_company_filings(self, ticker: str, cik: str, years: List[int]) -> int:
+    def _download_filings(self, tasks: List[Tuple[str, str, Dict[str, str]]]) -> Dict[str, int]:
         """
-        Download 10-K filings for a company across multiple years.
+        Download filings concurrently through the shared rate-limited client.
+
+        Filings already on disk are not fetched again.
+
+        Args:
+            tasks: (ticker, cik, filing) tuples from list_company_filings
+
+        Returns:
+            Dictionary mapping ticker to number of filings on disk (new or existing)
+        """
+        def download(task):
+            ticker, cik, filing = task
+            try:
+                self.client.download_filing(
+                    cik, filing["accession"], filing["primary_doc"],
+                    self.filings_dir / cik / FORM_TYPE / f"{filing['accession']}{ARCHIVE_SUFFIX}"
+                )
+                self.have.add((cik, filing["accession"]))
+                return ticker, 1
+            except Exception as e:
+                print(f"  Error downloading {ticker} {filing['accession']}: {e}")
+                return ticker, 0
+
+        counts = {}
+        missing = []
+        for task in tasks:
+            ticker, cik, filing = task
+            if (cik, filing["accession"]) in self.have:
+                counts[ticker] = counts.get(ticker, 0) + 1
+            else:
+                missing.append(task)
+        if len(missing) < len(tasks):
+            print(f"[SKIP] {len(tasks) - len(missing)} filings already downloaded")
+        if not missing:
+            return counts
+
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+            for ticker, downloaded in executor.map(download, missing):
+                counts[ticker] = counts.get(ticker, 0) + downloaded
+        return counts
+
+    def list_company_filings(self, ticker: str, cik: str, years: List[int]) -> List[Tuple[str, str, Dict[str, str]]]:
+        """
+        List 10-K filings for a company across multiple years.
 
         Args:
             ticker: Company ticker symbol (e.g., "AAPL")
@@ -58,7 +124,7 @@ class Edgar10KScraper:
             years: List of fiscal years (e.g., [2020, 2021, 2022, 2023, 2024])
 
         Returns:
-            Number of filings downloaded
+            (ticker, cik, filing) tuples for _download_filings
         """
         print(f"Fetching 10-K filings for {ticker} (CIK: {cik})...")
 
@@ -69,22 +135,29 @@ class Edgar10KScraper:
         before_date = f"{max(years)+1}-12-31"
 
         try:
-            # Download 10-K filings for this company
-            # The library will download all 10-Ks in the date range
-            num_downloaded = self.downloader.get(
-                "10-K",
-                cik,
-                after=after_date,
-                before=before_date,
-                download_details=True
-            )
+            filings = self.client.list_filings(cik, FORM_TYPE, after_date, before_date)
+        except Exception as e:
+            print(f"  Error listing {ticker}: {e}")
+            return []
 
-            print(f"  Downloaded {num_downloaded} filings for {ticker}")
-            return num_downloaded
+        print(f"  Found {len(filings)} filings for {ticker}")
+        return [(ticker, cik, filing) for filing in filings]
 
-        except Exception as e:
-            print(f"  Error downloading {ticker}: {e}")
-            return 0
+    def download_company_filings(self, ticker: str, cik: str, years: List[int]) -> int:
+        """
+        Download 10-K filings for a company across multiple years.
+
+        Args:
+            ticker: Company ticker symbol (e.g., "AAPL")
+            cik: 10-digit CIK
+            years: List of fiscal years (e.g., [2020, 2021, 2022, 2023, 2024])
+
+        Returns:
+            Number of filings on disk (newly downloaded or already present)
+        """
+        num_downloaded = self._download_filings(self.list_company_filings(ticker, cik, years)).get(ticker, 0)
+        print(f"  Downloaded {num_downloaded} filings for {ticker}")
+        return num_downloaded
 
     def download_all_companies(
         self,
@@ -99,13 +172,15 @@ class Edgar10KScraper:
             years: List of fiscal years to download
 
         Returns:
-            Dictionary mapping ticker to number of filings downloaded
+            Dictionary mapping ticker to number of filings on disk
         """
         with open(companies_json_path, "r") as f:
             config = json.load(f)
 
         companies = config["companies"]
-        download_counts = {}
+        # Every company's filings are listed first, then downloaded through one
+        # pool, so the rate limit stays saturated across company boundaries
+        tasks = []
 
         print(f"Starting download for {len(companies)} companies")
         print(f"Target fiscal years: {years}")
@@ -117,26 +192,34 @@ class Edgar10KScraper:
             name = company["name"]
 
             print(f"\n[{ticker}] {name}")
-            count = self.download_company_filings(ticker, cik, years)
-            download_counts[ticker] = count
+            tasks += self.list_company_filings(ticker, cik, years)
+
+        print(f"\nDownloading {len(tasks)} filings ({DOWNLOAD_WORKERS} concurrent)...")
+        counts = self._download_filings(tasks)
+        download_counts = {company["ticker"]: counts.get(company["ticker"], 0) for company in companies}
 
+        total_filings = sum(download_counts.values())
         print("\n" + "=" * 60)
-        print(f"Download complete. Total filings: {sum(download_counts.values())}")
+        print(f"Download complete. Total filings: {total_filings}")
         print("\nFilings by company:")
-        for ticker, count in download_counts.items():
-            print(f"  {ticker}: {count} filings")
+        # One write for the whole per-company table
+        sys.stdout.write("".join(f"  {ticker}: {count} filings\n" for ticker, count in download_counts.items()))
+        sys.stdout.flush()
 
         # Save summary
         summary = {
             "companies": len(companies),
             "target_years": years,
-            "total_filings": sum(download_counts.values()),
+            "total_filings": total_filings,
             "by_company": download_counts
         }
 
         summary_path = self.data_dir / "download_summary.json"
-        with open(summary_path, "w") as f:
-            json.dump(summary, f, indent=2)
+        # Written to a temp file in the same directory and swapped in, so an
+        # interrupted run never leaves a partial summary behind
+        with tempfile.NamedTemporaryFile("wb", dir=self.data_dir, suffix=".tmp", delete=False) as f:
+            f.write(orjson.dumps(summary, option=orjson.OPT_INDENT_2))
+        os.replace(f.name, summary_path)
         print(f"\nDownload summary saved to: {summary_path}")
 
         return download_counts
@@ -12,12 +12,12 @@ Input: /app/data/edgar/extracted/{year}/QTR{n}/*.txt
 Output: /app/data/processed/{year}/QTR{n}/*.json
 """
 
-import json
 import os
 import re
 from pathlib import Path
 from typing import Dict, List, Optional
 from dataclasses import dataclass, asdict
+import orjson
 import tiktoken
 from tqdm import tqdm
 import requests
@@ -337,10 +337,11 @@ Provide a brief, factual summary (50-100 tokens) explaining what this chunk disc
             "chunks": [asdict(c) for c in chunks]
         }
 
-        # Write to JSON
+        # Write to compact JSON (UTF-8, no indentation: the chunk lists are
+        # read back by the embedding/RAG scripts, not by people)
         output_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(output_data, f, indent=2, ensure_ascii=False)
+        with open(output_path, 'wb') as f:
+            f.write(orjson.dumps(output_data))
 
         return {
             "filename": metadata.filename,
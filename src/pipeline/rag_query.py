@@ -7,17 +7,127 @@ Usage:
     python -m src.pipeline.rag_query \
         --embeddings /app/data/embeddings/test_q1 \
         --query "What was Tesla's revenue in fiscal year 2023?"
+
+    Add --build-index once to build a FAISS IVF-PQ index next to the embeddings;
+    later queries search it instead of scanning every vector (requires faiss-cpu).
 """
 
 import argparse
 import sys
 from pathlib import Path
+from typing import Optional
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from sentence_transformers import SentenceTransformer
 import requests
 
 
+# Rows of the embedding matrix scored per block during retrieval
+SCORE_BLOCK_ROWS = 65536
+
+# Approximate-search index (optional, needs faiss): inverted lists prune the
+# scan to NPROBE of the IVF cells, and PQ codes shrink each vector to 48 bytes.
+# PQ scores are approximate, so RERANK_FACTOR * top_k candidates are re-scored
+# exactly against the embedding matrix.
+FAISS_INDEX_FILE = "embeddings.ivfpq.faiss"
+FAISS_PQ = "PQ48x8"
+# IVF cells scale as ~4 * sqrt(rows), capped, with at least FAISS_MIN_ROWS_PER_LIST
+# training vectors per cell (k-means degrades below ~39 per centroid)
+FAISS_MAX_LISTS = 4096
+FAISS_MIN_ROWS_PER_LIST = 39
+# Below this the full scan is already fast, and PQ48x8 training needs
+# ~39 * 256 vectors per sub-quantizer anyway
+FAISS_MIN_ROWS = 10000
+FAISS_TRAIN_ROWS = 262144  # Sample size for k-means / PQ training (64 per cell at the cap)
+FAISS_NPROBE = 32
+RERANK_FACTOR = 10
+
+
+def _read_embeddings_parquet(path: Path) -> np.ndarray:
+    """
+    Read an embeddings parquet file as a dense (rows, dims) matrix.
+
+    Supports both layouts: a single FixedSizeList column (one vector per row)
+    and the older wide layout with one float column per dimension. The result
+    is cast once to C-contiguous float32 (the wide layout comes back
+    column-major from pandas) so scoring slices go straight to BLAS.
+    """
+    table = pq.read_table(path)
+    if table.num_columns == 1 and pa.types.is_fixed_size_list(table.schema.field(0).type):
+        vectors = table.column(0).combine_chunks()
+        matrix = vectors.flatten().to_numpy().reshape(-1, vectors.type.list_size)
+    else:
+        matrix = table.to_pandas().values
+    return np.ascontiguousarray(matrix, dtype=np.float32)
+
+
+def _embeddings_file(embeddings_path: Path) -> Path:
+    """Path of the embedding matrix file (float16 .npy if present, else parquet)."""
+    npy_path = embeddings_path / "embeddings.f16.npy"
+    return npy_path if npy_path.exists() else embeddings_path / "embeddings.parquet"
+
+
+def _load_embeddings(embeddings_path: Path) -> np.ndarray:
+    """Load the embedding matrix (memory-mapped float16 .npy, else parquet)."""
+    path = _embeddings_file(embeddings_path)
+    if path.suffix == ".npy":
+        # Dense float16 matrix: memory-mapped, pages load from the OS cache on demand
+        return np.load(path, mmap_mode='r')
+    return _read_embeddings_parquet(path)
+
+
+def _faiss_num_lists(num_rows: int) -> int:
+    """Number of IVF cells for a corpus: ~4 * sqrt(rows), capped by FAISS_MAX_LISTS and rows per cell."""
+    return max(1, min(FAISS_MAX_LISTS, int(4 * np.sqrt(num_rows)), num_rows // FAISS_MIN_ROWS_PER_LIST))
+
+
+def build_faiss_index(embeddings_path: Path) -> Optional[Path]:
+    """
+    Build an IVF-PQ inner-product index over an embeddings directory.
+
+    The number of IVF cells is sized to the corpus (_faiss_num_lists); corpora
+    under FAISS_MIN_ROWS get no index and keep using the full scan. Trains on
+    a random sample of FAISS_TRAIN_ROWS vectors, then adds every vector in
+    SCORE_BLOCK_ROWS float32 blocks so a float16 memmap is never copied whole.
+
+    Args:
+        embeddings_path: Path to embeddings directory
+
+    Returns:
+        Path of the written index file, or None if the corpus is too small
+    """
+    import faiss
+
+    embeddings_path = Path(embeddings_path)
+    embeddings = _load_embeddings(embeddings_path)
+    num_rows, dims = embeddings.shape
+    index_path = embeddings_path / FAISS_INDEX_FILE
+
+    if num_rows < FAISS_MIN_ROWS:
+        print(f"[SKIP] {num_rows:,} vectors is below {FAISS_MIN_ROWS:,} - no FAISS index, queries use the full scan")
+        if index_path.exists():
+            index_path.unlink()
+            print(f"[INFO] Removed old {index_path.name}")
+        return None
+
+    factory = f"IVF{_faiss_num_lists(num_rows)},{FAISS_PQ}"
+    print(f"[INFO] Building FAISS index ({factory}) over {num_rows:,} vectors...")
+    index = faiss.index_factory(dims, factory, faiss.METRIC_INNER_PRODUCT)
+
+    rng = np.random.default_rng(0)
+    train_ids = np.sort(rng.choice(num_rows, size=min(num_rows, FAISS_TRAIN_ROWS), replace=False))
+    index.train(np.asarray(embeddings[train_ids], dtype=np.float32))
+
+    for start in range(0, num_rows, SCORE_BLOCK_ROWS):
+        index.add(np.asarray(embeddings[start:start + SCORE_BLOCK_ROWS], dtype=np.float32))
+
+    faiss.write_index(index, str(index_path))
+    print(f"[OK] FAISS index saved: {index_path}")
+    return index_path
+
+
 class SimpleRAG:
     """Simple RAG system for SEC filings."""
 
@@ -32,7 +142,8 @@ class SimpleRAG:
         Initialize RAG system.
 
         Args:
-            embeddings_path: Path to embeddings directory (contains embeddings.parquet + metadata.parquet)
+            embeddings_path: Path to embeddings directory (contains embeddings.f16.npy or
+                embeddings.parquet, plus metadata.parquet)
             embedding_model: Sentence transformer model name
             ollama_host: Ollama API endpoint
             ollama_model: Ollama model name
@@ -53,13 +164,33 @@ class SimpleRAG:
 
         # Load embeddings and metadata
         print(f"\n[INFO] Loading embeddings and metadata...")
-        self.embeddings = pd.read_parquet(self.embeddings_path / "embeddings.parquet").values
+        self.embeddings = _load_embeddings(self.embeddings_path)
         self.metadata = pd.read_parquet(self.embeddings_path / "metadata.parquet")
 
         print(f"[OK] Loaded {len(self.embeddings)} chunks")
         print(f"  Shape: {self.embeddings.shape}")
         print(f"  Files: {self.metadata['file_name'].nunique()}")
 
+        # Approximate-search index, if one was built (falls back to a full scan)
+        self.index = None
+        index_path = self.embeddings_path / FAISS_INDEX_FILE
+        if index_path.exists():
+            try:
+                import faiss
+            except ImportError:
+                print(f"[WARN] {index_path.name} found but faiss is not installed - using full scan")
+            else:
+                index = faiss.read_index(str(index_path))
+                # An index older than the embeddings (or of another size) maps to the wrong rows
+                if (index.ntotal != len(self.embeddings)
+                        or index_path.stat().st_mtime < _embeddings_file(self.embeddings_path).stat().st_mtime):
+                    print(f"[WARN] {index_path.name} is stale ({index.ntotal:,} vectors, embeddings have "
+                          f"{len(self.embeddings):,} or are newer) - using full scan; rebuild with --build-index")
+                else:
+                    self.index = index
+                    faiss.extract_index_ivf(self.index).nprobe = FAISS_NPROBE
+                    print(f"[OK] FAISS index loaded ({self.index.ntotal:,} vectors, nprobe={FAISS_NPROBE})")
+
         # Load original chunk texts from JSON files
         print(f"\n[INFO] Loading chunk texts from source JSON files...")
         self._load_chunk_texts()
@@ -110,12 +241,29 @@ class SimpleRAG:
 
         # Encode query
         query_embedding = self.encoder.encode([query], normalize_embeddings=True)[0]
+        # Contiguous float32 so every `block @ query_embedding` is a single SGEMV call
+        query_embedding = np.ascontiguousarray(query_embedding, dtype=np.float32)
 
-        # Compute dot-product similarity (embeddings are already normalized)
-        similarities = np.dot(self.embeddings, query_embedding)
-
-        # Get top-k indices
-        top_indices = np.argsort(similarities)[-top_k:][::-1]
+        if self.index is not None:
+            # IVF-PQ candidates, re-scored exactly (embeddings are already normalized)
+            _, candidates = self.index.search(
+                np.asarray(query_embedding[None], dtype=np.float32), top_k * RERANK_FACTOR
+            )
+            candidates = np.sort(candidates[0][candidates[0] >= 0])
+            scores = np.ascontiguousarray(self.embeddings[candidates], dtype=np.float32) @ query_embedding
+            order = np.argsort(scores)[-top_k:][::-1]
+            top_indices = candidates[order]
+            similarities = dict(zip(top_indices, scores[order]))
+        else:
+            # Compute dot-product similarity (embeddings are already normalized).
+            # Scored in float32 blocks so a float16 memmap never needs a full float32 copy
+            similarities = np.empty(len(self.embeddings), dtype=np.float32)
+            for start in range(0, len(self.embeddings), SCORE_BLOCK_ROWS):
+                block = np.ascontiguousarray(self.embeddings[start:start + SCORE_BLOCK_ROWS], dtype=np.float32)
+                similarities[start:start + SCORE_BLOCK_ROWS] = block @ query_embedding
+
+            # Get top-k indices
+            top_indices = np.argsort(similarities)[-top_k:][::-1]
 
         # Retrieve chunks
         results = []
@@ -250,6 +398,11 @@ def main():
         default='llama3',
         help='Ollama model name'
     )
+    parser.add_argument(
+        '--build-index',
+        action='store_true',
+        help='Build the FAISS IVF-PQ index for the embeddings before querying (requires faiss-cpu)'
+    )
 
     args = parser.parse_args()
 
@@ -257,6 +410,9 @@ def main():
     print("SEC FILING RAG QUERY SYSTEM")
     print("=" * 80)
 
+    if args.build_index:
+        build_faiss_index(Path(args.embeddings))
+
     # Initialize RAG
     rag = SimpleRAG(
         embeddings_path=args.embeddings,